@@ -1,115 +1,106 @@
 # agent_app.py
-import os, streamlit as st, pandas as pd
-from dotenv import load_dotenv
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-
-# Import shared tools + dispatcher
-from travel_tools import (
-    geocode_place,
-    search_hotels,
-    search_attractions,
-    get_walk_info,
-    show_route_map,
-    get_weather,
-)
-from multiagent_dispatcher import run_multiagent_dispatcher
-from function_dispatcher import run_gemini_dispatcher
-
-# --- PDF Export ---
-def export_pdf(reply, hotels, attractions, weather, query, days):
-    file_path = "travel_plan.pdf"
-    c = canvas.Canvas(file_path, pagesize=A4)
-    width, height = A4
-
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(50, height - 50, "Smart Travel AI Assistant")
-
-    c.setFont("Helvetica", 12)
-    c.drawString(50, height - 80, f"Query: {query}")
-    c.drawString(50, height - 100, f"Days: {days}")
-
-    # Hotels
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, height - 140, "Hotels Nearby")
-    c.setFont("Helvetica", 11)
-    y = height - 160
-    for h in hotels:
-        text = f"- {h['name']} | Rating: {h.get('rating','N/A')}"
-        c.drawString(60, y, text[:100])
-        y -= 20
-
-    # Attractions
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y - 20, "Attractions Nearby")
-    c.setFont("Helvetica", 11)
-    y -= 40
-    for a in attractions:
-        text = f"- {a['name']} | Rating: {a.get('rating','N/A')}"
-        c.drawString(60, y, text[:100])
-        y -= 20
-
-    # Weather
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y - 20, "Weather Forecast")
-    c.setFont("Helvetica", 11)
-    y -= 40
-    for w in weather:
-        text = f"{w['day']}: {w['min_temp']}°C - {w['max_temp']}°C, Rain: {w['rain']}"
-        c.drawString(60, y, text)
-        y -= 20
-
-    # AI Plan
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y - 20, "AI Suggested Itinerary")
-    c.setFont("Helvetica", 11)
-    y -= 40
-    for line in reply.split("\n"):
-        if line.strip():
-            c.drawString(60, y, line[:100])
-            y -= 20
-            if y < 50:  
-                c.showPage()
-                y = height - 50
-                c.setFont("Helvetica", 11)
-
-    c.save()
-    return file_path
-
-
-# --- Agent Logic ---
-def travel_agent(query, days=3, hotel_limit=5, attraction_limit=5, use_multiagent=False):
-    loc = geocode_place(query)
-    if not loc:
-        return "❌ Could not find destination.", [], [], [], loc
-
-    lat, lng = loc['lat'], loc['lng']
-
-    # --- AI Dispatcher ---
-    try:
-        if use_multiagent:
-            ai_plan = run_multiagent_dispatcher(
-                f"Plan a {days}-day trip to {query} with hotels, attractions, and weather.",
-                lat=lat, lng=lng, days=days
-            )
-        else:
-            ai_plan = run_gemini_dispatcher(
-                f"Plan a {days}-day trip to {query} with hotels, attractions, and weather.",
-                lat=lat, lng=lng, days=days
-            )
-    except Exception as e:
-        ai_plan = f"⚠️ Dispatcher failed: {e}\n\nFallback: basic plan for {query}."
-
-    # Fallback calls
-    hotels = search_hotels(lat, lng, limit=hotel_limit)
-    attractions = search_attractions(lat, lng, limit=attraction_limit)
-    weather = get_weather(lat, lng, days)
-
-    return ai_plan, hotels, attractions, weather, loc
+import streamlit as st
+from functools import partial
+
+# Import shared tools + agent logic (headless, see trip_planner.py)
+from travel_tools import get_walk_matrix, show_route_map
+from trip_planner import travel_agent_events
+from pipeline import plan_events, plan_key, plan_mode
+from pdf_export import cached_pdf
+import config
+import gazetteer
+import http_transport
+import poi_store
+import rate_limiter
+import resilience
+import tool_cache
+
+# pandas is only needed once a plan renders; it is imported in the renderers
+# (and ahead of time by the warm-up below).
+
+
+# --- Tab renderers ---
+MAP_COLORS = {"destination": "#e63946", "hotel": "#1d4ed8", "attraction": "#2a9d8f"}
+
+
+def render_overview_map(loc, hotels, attractions):
+    """One map with the destination and every hotel and attraction (no per-place iframes)."""
+    import pandas as pd
+
+    rows = [{"lat": loc["lat"], "lng": loc["lng"], "kind": "destination", "size": 60}]
+    rows += [{"lat": h["lat"], "lng": h["lng"], "kind": "hotel", "size": 30} for h in hotels]
+    rows += [{"lat": a["lat"], "lng": a["lng"], "kind": "attraction", "size": 30} for a in attractions]
+    df = pd.DataFrame(rows)
+    df["color"] = df["kind"].map(MAP_COLORS)
+    st.map(df, latitude="lat", longitude="lng", color="color", size="size")
+    st.caption("🔴 Destination · 🔵 Hotels · 🟢 Attractions")
+
+
+def render_walk_times(hotels, attractions):
+    """Walking minutes from every hotel to every attraction, fetched as one batched matrix."""
+    import pandas as pd
+
+    rows = get_walk_matrix(hotels, attractions)
+    df = pd.DataFrame(
+        [[round(w["seconds"] / 60) if w else None for w in row] for row in rows],
+        index=[h["name"] for h in hotels], columns=[a["name"] for a in attractions],
+    )
+    st.caption("🚶 Walking minutes from each hotel (blank: too far to walk)")
+    st.dataframe(df)
+
+
+def render_places(places, loc, kind="place"):
+    for p in places:
+        st.write(f"**{p['name']} (⭐ {p.get('rating','N/A')})**")
+        st.markdown(f"[📍 Open in Google Maps](https://www.google.com/maps?q={p['lat']},{p['lng']})")
+
+    # Walking directions only for the item the user picks, as one lazy iframe.
+    names = [p["name"] for p in places]
+    choice = st.selectbox(
+        "🚶 Walking route from the destination to…", ["—"] + names, key=f"{kind}_route"
+    )
+    if choice != "—":
+        p = places[names.index(choice)]
+        st.markdown(show_route_map(p["lat"], p["lng"], loc["lat"], loc["lng"]), unsafe_allow_html=True)
+
+
+def render_weather(weather, loc=None):
+    import pandas as pd
+
+    df = pd.DataFrame(weather)
+    st.dataframe(df)
+
+    # 🌈 Line graph for temperature
+    chart_data = pd.DataFrame({
+        "Day": [w["day"] for w in weather],
+        "Max Temp (°C)": [w["max_temp"] for w in weather],
+        "Min Temp (°C)": [w["min_temp"] for w in weather]
+    }).set_index("Day")
+
+    st.line_chart(chart_data)
+
+    # 🌧️ Rain probability as bar chart
+    rain_data = pd.DataFrame({
+        "Day": [w["day"] for w in weather],
+        "Rain Probability (%)": [w["rain"] for w in weather]
+    }).set_index("Day")
+
+    st.bar_chart(rain_data)
+
+
+def pick_destination(label):
+    st.session_state["destination_input"] = label
+
+
+@st.cache_resource
+def warm_up():
+    """Once per server process: build the API clients and open connections in the background."""
+    return config.warm_up_in_background(preload=("pandas", "reportlab.pdfgen.canvas"))
 
 
 # --- Streamlit UI ---
 st.set_page_config(page_title="Smart Travel AI Assistant", layout="wide")
+warm_up()
 st.title("🧳 Smart Travel AI Assistant")
 
 # Sidebar
@@ -124,69 +115,120 @@ st.sidebar.write("👤 Built by **Haron**")
 
 # Toggle Dispatcher
 use_multiagent = st.sidebar.toggle("Use Multi-Agent Mode", value=True)
+single_shot = st.sidebar.toggle(
+    "Single-Shot Mode", value=False,
+    help="Fetch hotels, attractions and weather directly and write the plan in one Gemini call.",
+)
+stream_itinerary = st.sidebar.toggle("Stream itinerary", value=True)
 
 # Filters
 query = st.text_input("Where do you want to go?", key="destination_input")
+# Suggestions from the local gazetteer for a partly typed name; picking one fills the input.
+suggestions = gazetteer.complete(query) if query and gazetteer.lookup(query) is None else []
+for col, label in zip(st.columns(max(len(suggestions), 1)), suggestions):
+    col.button(label, key=f"suggest_{label}", on_click=pick_destination, args=(label,))
 trip_days = st.sidebar.slider("Number of days", 1, 14, 3, key="days_slider")
 hotel_limit = st.sidebar.slider("Number of hotels to show", 1, 10, 5, key="hotels_slider")
 attraction_limit = st.sidebar.slider("Number of attractions to show", 1, 10, 5, key="attractions_slider")
 
+# A finished plan is kept in the session, so slider changes and other reruns
+# re-render it (sliced to the current limits) without any network call.
+current_key = plan_key(query, trip_days, plan_mode(use_multiagent, single_shot))
+stored = st.session_state.get("plan")
+
+events = None
 if st.button("Plan My Trip", key="plan_button"):
+    timings = {}
+    events = travel_agent_events(
+        query, trip_days, use_multiagent,
+        stream=stream_itinerary, timings=timings, single_shot=single_shot,
+    )
+elif stored and stored["key"] == current_key:
+    timings = stored["timings"]
+    events = plan_events(stored["plan"])
+elif stored:
+    st.info("Trip settings changed — click **Plan My Trip** to update the plan.")
+
+if events is not None:
+    tab1, tab2, tab3, tab_map, tab4, tab5 = st.tabs(
+        ["📝 Itinerary", "🏨 Hotels", "📍 Attractions", "🗺 Map", "🌦 Weather", "✈ Flights"]
+    )
+
+    with tab1:
+        st.subheader("AI Travel Itinerary")
+        itinerary_box = st.empty()
+    with tab2:
+        st.subheader("Hotels Nearby")
+    with tab3:
+        st.subheader("Attractions Nearby")
+    with tab4:
+        st.subheader("Weather Forecast")
+    with tab5:
+        st.subheader("Flight Search Links")
+        st.markdown(f"[Google Flights](https://www.google.com/travel/flights)")
+        st.markdown(f"[Skyscanner](https://www.skyscanner.net/)")
+
+    # Each tab renders as soon as its data arrives; the itinerary streams in last.
+    renderers = {
+        "hotels": (tab2, partial(render_places, kind="hotel")),
+        "attractions": (tab3, partial(render_places, kind="attraction")),
+        "weather": (tab4, render_weather),
+    }
+    limits = {"hotels": hotel_limit, "attractions": attraction_limit, "weather": trip_days}
+    plan = {"hotels": [], "attractions": [], "weather": [], "location": None}
+    reply, streamed = "", ""
+    received, map_drawn = set(), False
+
     with st.spinner("Generating your travel plan..."):
-        reply, hotels, attractions, weather, loc = travel_agent(
-            query, trip_days, hotel_limit, attraction_limit, use_multiagent
-        )
-
-        tab1, tab2, tab3, tab4, tab5 = st.tabs(
-            ["📝 Itinerary", "🏨 Hotels", "📍 Attractions", "🌦 Weather", "✈ Flights"]
-        )
-
-        with tab1:
-            st.subheader("AI Travel Itinerary")
-            st.write(reply)
-
-        with tab2:
-            st.subheader("Hotels Nearby")
-            for h in hotels:
-                st.write(f"**{h['name']} (⭐ {h.get('rating','N/A')})**")
-                st.markdown(show_route_map(h["lat"], h["lng"], loc["lat"], loc["lng"]), unsafe_allow_html=True)
-                st.markdown(f"[📍 Open in Google Maps](https://www.google.com/maps?q={h['lat']},{h['lng']})")
-
-        with tab3:
-            st.subheader("Attractions Nearby")
-            for a in attractions:
-                st.write(f"**{a['name']} (⭐ {a.get('rating','N/A')})**")
-                st.markdown(show_route_map(a["lat"], a["lng"], loc["lat"], loc["lng"]), unsafe_allow_html=True)
-                st.markdown(f"[📍 Open in Google Maps](https://www.google.com/maps?q={a['lat']},{a['lng']})")
-
-        with tab4:
-            st.subheader("Weather Forecast")
-            df = pd.DataFrame(weather)
-            st.dataframe(df)
-
-            # 🌈 Line graph for temperature
-            chart_data = pd.DataFrame({
-                "Day": [w["day"] for w in weather],
-                "Max Temp (°C)": [w["max_temp"] for w in weather],
-                "Min Temp (°C)": [w["min_temp"] for w in weather]
-            }).set_index("Day")
-
-            st.line_chart(chart_data)
-
-            # 🌧️ Rain probability as bar chart
-            rain_data = pd.DataFrame({
-                "Day": [w["day"] for w in weather],
-                "Rain Probability (%)": [int(w["rain"].replace("%", "")) for w in weather]
-            }).set_index("Day")
-
-            st.bar_chart(rain_data)
-
-        with tab5:
-            st.subheader("Flight Search Links")
-            st.markdown(f"[Google Flights](https://www.google.com/travel/flights)")
-            st.markdown(f"[Skyscanner](https://www.skyscanner.net/)")
-
-        # PDF Export
-        pdf_path = export_pdf(reply, hotels, attractions, weather, query, trip_days)
-        with open(pdf_path, "rb") as f:
-            st.download_button("📥 Download PDF", f, file_name="travel_plan.pdf")
+        for kind, payload in events:
+            if kind == "token":
+                streamed += payload
+                itinerary_box.markdown(streamed + " ▌")
+            elif kind in ("itinerary", "error"):
+                reply = payload
+                itinerary_box.write(reply)
+            else:
+                plan[kind] = payload
+                if kind in renderers:
+                    tab, render = renderers[kind]
+                    with tab:
+                        render(payload[:limits[kind]], plan["location"])
+                    received.add(kind)
+                if {"hotels", "attractions"} <= received and not map_drawn:
+                    with tab_map:
+                        render_overview_map(
+                            plan["location"], plan["hotels"][:hotel_limit], plan["attractions"][:attraction_limit]
+                        )
+                        if st.toggle("Show walking times", key="walk_times"):
+                            render_walk_times(plan["hotels"][:hotel_limit], plan["attractions"][:attraction_limit])
+                    map_drawn = True
+
+    # Fallback plans ("⚠️ Quick plan") are kept for this session's reruns too;
+    # only the cross-session plan memo skips them.
+    if not reply.startswith("❌"):
+        plan["itinerary"] = reply
+        st.session_state["plan"] = {"key": current_key, "plan": plan, "timings": timings}
+
+    st.sidebar.caption("⏱ " + " · ".join(f"{k}: {v:.2f}s" for k, v in timings.items()))
+    st.sidebar.caption("🗄 Cache " + " · ".join(f"{k}: {v}" for k, v in tool_cache.stats().items()))
+    st.sidebar.caption("📍 POI store " + " · ".join(f"{k}: {v}" for k, v in poi_store.stats().items()))
+    st.sidebar.caption("🧭 Gazetteer " + " · ".join(f"{k}: {v}" for k, v in gazetteer.stats().items()))
+    st.sidebar.caption("🚦 Upstream queues " + " · ".join(
+        f"{name}: depth {q['queue_depth']}, p95 wait {q['wait_p95']:.2f}s" for name, q in rate_limiter.stats().items()
+    ))
+    st.sidebar.caption("🔌 Connection reuse " + " · ".join(
+        f"{host}: {p['reuse']:.0%}" for host, p in http_transport.connection_stats().items()
+    ))
+    st.sidebar.caption("🛡 Circuits " + " · ".join(
+        f"{name}: {c['state']}" for name, c in resilience.stats().items()
+    ))
+
+    # PDF Export: rendered in memory, only when the button is clicked, once per plan.
+    pdf_args = (
+        reply, plan["hotels"][:hotel_limit], plan["attractions"][:attraction_limit],
+        plan["weather"][:trip_days], query, trip_days,
+    )
+    st.download_button(
+        "📥 Download PDF", lambda: cached_pdf(*pdf_args),
+        file_name="travel_plan.pdf", mime="application/pdf",
+    )
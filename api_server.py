@@ -0,0 +1,311 @@
+# api_server.py
+"""
+Headless JSON API around the planner, for other services and for scaling
+planning separately from the Streamlit UI.
+
+    python api_server.py --port 8080 --workers 8
+
+    POST /v1/plan          {"destination": "Paris", "days": 3, "mode": "single_shot",
+                            "hotel_limit": 5, "attraction_limit": 5}
+    POST /v1/plan/pdf      same body, returns the plan as application/pdf
+    POST /v1/tools/<name>  {"lat": 41.9, "lng": 12.5, ...} keyword arguments of the tool
+    GET  /v1/complete?q=   destination suggestions from the gazetteer
+    GET  /healthz          200 while serving, 503 once draining
+    GET  /metrics          Prometheus text (see telemetry.py)
+
+Plans run on a bounded worker pool. Identical plans in flight (same
+normalized destination, days and mode) are coalesced: a burst of users
+asking for "Paris, 3 days" shares one pipeline run. On SIGTERM the server
+reports unhealthy, refuses new work and waits for running plans before it
+exits.
+
+    PORT=8080  API_WORKERS=8  API_QUEUE=64  DRAIN_TIMEOUT=25
+"""
+import argparse
+import inspect
+import json
+import logging
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from batch_plan import MODES
+import config
+import gazetteer
+from pdf_export import cached_pdf
+from pipeline import PLACES_PAGE_SIZE, plan_key
+import rate_limiter
+import telemetry
+import travel_tools
+from trip_planner import travel_agent
+
+log = logging.getLogger(__name__)
+
+PORT = int(os.getenv("PORT", "8080"))
+WORKERS = int(os.getenv("API_WORKERS", "8"))
+# Plans accepted (running or waiting for a worker) before new ones get 503.
+QUEUE = int(os.getenv("API_QUEUE", "64"))
+# Seconds a SIGTERM waits for running plans (Cloud Run allows 10 by default, up to 60 if configured).
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "25"))
+# Seconds one HTTP request waits for its plan or tool result.
+REQUEST_TIMEOUT = 120
+MAX_BODY = 64 * 1024
+MAX_DAYS = 14
+JSON = "application/json"
+
+TOOLS = {
+    "locate": gazetteer.locate,
+    "geocode_place": travel_tools.geocode_place,
+    "search_hotels": travel_tools.search_hotels,
+    "search_attractions": travel_tools.search_attractions,
+    "get_weather": travel_tools.get_weather,
+    "get_weather_many": travel_tools.get_weather_many,
+    "get_walk_info": travel_tools.get_walk_info,
+    "get_walk_matrix": travel_tools.get_walk_matrix,
+}
+
+
+class ApiError(Exception):
+    """An error answered with `status` and a JSON {"error": message} body."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- Planning service ---
+class PlanService:
+    """Worker pool with single-flight plans, admission control and draining."""
+
+    def __init__(self, workers=WORKERS, queue=QUEUE):
+        self.queue = queue
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-worker")
+        # Re-entrant: a done-callback runs inline when its future has already finished.
+        self._lock = threading.RLock()
+        self._inflight = {}        # plan key -> future
+        self._running = 0          # plans and tool calls accepted and not finished
+        self._idle = threading.Condition(self._lock)
+        self.draining = False
+        self.counters = {"plans": 0, "coalesced": 0, "rejected": 0, "tool_calls": 0}
+
+    def _submit(self, fn, *args, **kwargs):
+        """Accept a job, or raise 503 when draining or full. Call with the lock held."""
+        if self.draining:
+            raise ApiError(503, "server is draining")
+        if self._running >= self.queue:
+            self.counters["rejected"] += 1
+            raise ApiError(503, "too many requests in progress")
+        self._running += 1
+        fut = rate_limiter.submit(self._pool, fn, *args, **kwargs)
+        fut.add_done_callback(self._finished)
+        return fut
+
+    def _finished(self, fut):
+        with self._lock:
+            self._running -= 1
+            self._idle.notify_all()
+
+    def plan(self, destination, days, mode):
+        """(future of the full plan, coalesced) for a plan request."""
+        key = plan_key(destination, days, mode)
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.counters["coalesced"] += 1
+                return fut, True
+            fut = self._submit(self._run_plan, destination, days, mode)
+            self.counters["plans"] += 1
+            self._inflight[key] = fut
+        fut.add_done_callback(lambda f: self._forget(key, f))
+        return fut, False
+
+    def _forget(self, key, fut):
+        with self._lock:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    @staticmethod
+    def _run_plan(destination, days, mode):
+        # Full pages: coalesced callers may ask for different list sizes.
+        timings = {}
+        reply, hotels, attractions, weather, loc = travel_agent(
+            destination, days, hotel_limit=PLACES_PAGE_SIZE, attraction_limit=PLACES_PAGE_SIZE,
+            timings=timings, **MODES[mode],
+        )
+        return {"itinerary": reply, "location": loc, "hotels": hotels, "attractions": attractions,
+                "weather": weather, "timings": timings}
+
+    def tool(self, fn, kwargs):
+        with self._lock:
+            self.counters["tool_calls"] += 1
+            return self._submit(fn, **kwargs)
+
+    def drain(self, timeout=DRAIN_TIMEOUT):
+        """Refuse new work and wait up to `timeout` seconds for accepted work; True if all finished."""
+        with self._lock:
+            self.draining = True
+            finished = self._idle.wait_for(lambda: self._running == 0, timeout)
+        self._pool.shutdown(wait=False)
+        return finished
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, running=self._running, inflight_plans=len(self._inflight),
+                        draining=self.draining)
+
+
+# --- Request parsing ---
+def parse_plan_request(body):
+    destination = str(body.get("destination") or "").strip()
+    if not destination:
+        raise ApiError(400, "destination is required")
+    mode = str(body.get("mode") or "single_shot")
+    if mode not in MODES:
+        raise ApiError(400, f"mode must be one of {', '.join(sorted(MODES))}")
+    try:
+        days = int(body.get("days") or 3)
+        hotel_limit = int(body.get("hotel_limit") or 5)
+        attraction_limit = int(body.get("attraction_limit") or 5)
+    except (TypeError, ValueError):
+        raise ApiError(400, "days, hotel_limit and attraction_limit must be integers")
+    if not 1 <= days <= MAX_DAYS:
+        raise ApiError(400, f"days must be between 1 and {MAX_DAYS}")
+    if not (1 <= hotel_limit <= PLACES_PAGE_SIZE and 1 <= attraction_limit <= PLACES_PAGE_SIZE):
+        raise ApiError(400, f"limits must be between 1 and {PLACES_PAGE_SIZE}")
+    return destination, days, mode, hotel_limit, attraction_limit
+
+
+# --- HTTP ---
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        server_version = "TravelPlanner/1.0"
+
+        def _send(self, status, body, content_type=JSON):
+            if content_type == JSON:
+                body = json.dumps(body, ensure_ascii=False, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if status == 503:
+                self.send_header("Retry-After", "5")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY:
+                raise ApiError(413, "request body too large")
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                raise ApiError(400, "body must be JSON")
+            if not isinstance(body, dict):
+                raise ApiError(400, "body must be a JSON object")
+            return body
+
+        def _handle(self, route):
+            content_type = JSON
+            try:
+                status, body, content_type = route()
+            except ApiError as e:
+                status, body = e.status, {"error": str(e)}
+            except FutureTimeout:
+                status, body = 504, {"error": "timed out"}
+            except Exception as e:
+                log.exception("request failed")
+                status, body = 500, {"error": telemetry.redact(f"{type(e).__name__}: {e}")}
+            self._send(status, body, content_type)
+
+        def do_GET(self):
+            self._handle(self._get)
+
+        def do_POST(self):
+            self._handle(self._post)
+
+        def _get(self):
+            url = urlsplit(self.path)
+            if url.path == "/healthz":
+                stats = service.stats()
+                if stats["draining"]:
+                    return 503, dict(stats, status="draining"), JSON
+                return 200, dict(stats, status="ok"), JSON
+            if url.path == "/metrics":
+                return 200, telemetry.prometheus_text().encode(), "text/plain; version=0.0.4"
+            if url.path == "/v1/complete":
+                q = parse_qs(url.query).get("q", [""])[0]
+                return 200, {"suggestions": gazetteer.complete(q)}, JSON
+            raise ApiError(404, f"no route for GET {url.path}")
+
+        def _post(self):
+            path = urlsplit(self.path).path
+            if path in ("/v1/plan", "/v1/plan/pdf"):
+                destination, days, mode, hotel_limit, attraction_limit = parse_plan_request(self._body())
+                fut, coalesced = service.plan(destination, days, mode)
+                plan = fut.result(timeout=REQUEST_TIMEOUT)
+                if plan["location"] is None:
+                    raise ApiError(404, plan["itinerary"])
+                hotels, attractions = plan["hotels"][:hotel_limit], plan["attractions"][:attraction_limit]
+                if path.endswith("/pdf"):
+                    pdf = cached_pdf(plan["itinerary"], hotels, attractions, plan["weather"], destination, days)
+                    return 200, pdf, "application/pdf"
+                return 200, dict(plan, hotels=hotels, attractions=attractions, coalesced=coalesced,
+                                 fallback=plan["itinerary"].startswith("⚠️")), JSON
+            if path.startswith("/v1/tools/"):
+                fn = TOOLS.get(path[len("/v1/tools/"):])
+                if fn is None:
+                    raise ApiError(404, f"unknown tool; available: {', '.join(TOOLS)}")
+                kwargs = self._body()
+                try:
+                    inspect.signature(fn).bind(**kwargs)
+                except TypeError as e:
+                    raise ApiError(400, str(e))
+                result = service.tool(fn, kwargs).result(timeout=REQUEST_TIMEOUT)
+                return 200, {"result": result}, JSON
+            raise ApiError(404, f"no route for POST {path}")
+
+        def log_message(self, fmt, *args):
+            log.info("%s %s", self.address_string(), telemetry.redact(fmt % args))
+
+    return Handler
+
+
+def serve(port=PORT, workers=WORKERS, queue=QUEUE, drain_timeout=DRAIN_TIMEOUT):
+    """Serve until SIGTERM / SIGINT, then drain and stop."""
+    service = PlanService(workers, queue)
+    server = ThreadingHTTPServer(("0.0.0.0", port), make_handler(service))
+    server.daemon_threads = True
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    config.warm_up_in_background(preload=("reportlab.pdfgen.canvas",))
+    threading.Thread(target=server.serve_forever, name="api-http", daemon=True).start()
+    log.info("serving on :%s with %s workers", port, workers)
+    stop.wait()
+
+    # Health checks now fail and new plans get 503; requests already accepted finish.
+    log.info("draining (up to %ss)", drain_timeout)
+    if not service.drain(drain_timeout):
+        log.warning("drain timed out with %s job(s) still running", service.stats()["running"])
+    server.shutdown()
+    server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless JSON planning API.")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--queue", type=int, default=QUEUE, help="accepted jobs before answering 503")
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT)
+    args = parser.parse_args(argv)
+    telemetry.configure_logging()
+    serve(args.port, args.workers, args.queue, args.drain_timeout)
+
+
+if __name__ == "__main__":
+    main()
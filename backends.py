@@ -0,0 +1,88 @@
+# backends.py
+"""
+Selects where upstream traffic goes: the real services ("live"), local
+stand-ins replaying recorded cassettes ("replay"), or the real services with
+every response recorded to cassettes ("record").
+
+    TRAVEL_BACKEND=replay FAKE_LATENCY="maps=120,open-meteo=80,gemini=900" streamlit run agent_app.py
+
+or at runtime: backends.configure(mode="replay", latency={"gemini": 0.5}).
+The stand-ins themselves live in fake_backends.py and are only imported when
+a non-live mode is selected.
+"""
+import os
+
+import config
+
+MODES = ("live", "replay", "record")
+
+
+def parse_map(text, scale=1.0):
+    """"maps=100,gemini=800" -> {"maps": 0.1, "gemini": 0.8} (with scale=0.001)."""
+    out = {}
+    for part in (text or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip()] = float(v) * scale
+    return out
+
+
+_config = {
+    "mode": os.getenv("TRAVEL_BACKEND", "live"),
+    "cassette_dir": os.getenv("FAKE_CASSETTE_DIR", "cassettes"),
+    # Per-upstream simulated latency (seconds), jitter (+/- fraction) and error rate.
+    "latency": parse_map(os.getenv("FAKE_LATENCY"), scale=0.001),
+    "jitter": float(os.getenv("FAKE_JITTER", "0.2")),
+    "error_rate": parse_map(os.getenv("FAKE_ERROR_RATE")),
+    # Per-upstream fraction of calls that stall for fake_backends.STALL_FACTOR x their latency.
+    "stall_rate": parse_map(os.getenv("FAKE_STALL_RATE")),
+    # Replay only: fail on cassette misses instead of synthesizing a response.
+    "strict": os.getenv("FAKE_STRICT", "") == "1",
+    "seed": int(os.getenv("FAKE_SEED", "0")),
+}
+
+
+def mode():
+    return _config["mode"]
+
+
+def settings():
+    """A copy of the current backend / fake settings (see configure)."""
+    return dict(_config)
+
+
+def configure(**changes):
+    """Switch backend / fake settings at runtime and re-wire the HTTP transport."""
+    if "mode" in changes and changes["mode"] not in MODES:
+        raise ValueError(f"Unknown backend mode {changes['mode']!r}; use one of {MODES}")
+    _config.update(changes)
+    if _config["mode"] != "live":
+        import fake_backends
+        fake_backends.reset()
+
+    import http_transport
+    http_transport.reset_backend()
+
+
+# --- Factories used by the transport and the dispatchers ---
+def http_adapter(live_adapter):
+    """The requests adapter to mount for outbound HTTPS."""
+    if _config["mode"] == "live":
+        return live_adapter
+    import fake_backends
+    return fake_backends.http_adapter(live_adapter, _config)
+
+
+def async_transport():
+    """httpx transport for the async client, or None for httpx's default."""
+    if _config["mode"] == "live":
+        return None
+    import fake_backends
+    return fake_backends.async_transport(_config)
+
+
+def gemini_model(name="gemini-2.0-flash", generation_config=None):
+    if _config["mode"] == "live":
+        return config.genai().GenerativeModel(name, generation_config=generation_config)
+    import fake_backends
+    return fake_backends.gemini_model(name, _config, generation_config)
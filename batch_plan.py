@@ -0,0 +1,192 @@
+# batch_plan.py
+"""
+Headless batch planning over many destinations.
+
+    python batch_plan.py destinations.csv -o plans.jsonl --workers 4 --pdf-dir pdfs
+
+Input is CSV (columns: destination, days, mode) or JSONL with the same keys;
+`days` and `mode` fall back to --days / --mode. Each finished plan is appended
+to the output JSONL as soon as it completes. Re-running with the same output
+file skips jobs that already succeeded, so an interrupted run resumes where it
+stopped. Throughput and per-stage latency percentiles are printed at the end.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import gazetteer
+from pdf_export import export_pdf
+from pipeline import latency_summary, weather_days
+import rate_limiter
+import telemetry
+from travel_tools import get_weather_many
+from trip_planner import travel_agent
+
+MODES = {
+    "gemini": {"use_multiagent": False, "single_shot": False},
+    "multiagent": {"use_multiagent": True, "single_shot": False},
+    "single_shot": {"use_multiagent": False, "single_shot": True},
+}
+
+
+# --- Input / checkpoint ---
+def read_jobs(path, default_days, default_mode):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    for row in rows:
+        destination = (row.get("destination") or "").strip()
+        if not destination:
+            continue
+        mode = (row.get("mode") or default_mode).strip()
+        if mode not in MODES:
+            raise SystemExit(f"❌ Unknown mode {mode!r} for {destination} (use one of {', '.join(MODES)})")
+        days = int(row.get("days") or default_days)
+        yield {"id": job_id(destination, days, mode), "destination": destination, "days": days, "mode": mode}
+
+
+def job_id(destination, days, mode):
+    return f"{' '.join(destination.lower().split())}|{days}|{mode}"
+
+
+def finished_ids(output_path):
+    """Jobs already written successfully by a previous run."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted run
+            if not rec.get("error"):
+                done.add(rec["id"])
+    return done
+
+
+# --- Weather prefetch ---
+def _geocode(destination):
+    try:
+        return gazetteer.locate(destination)
+    except Exception:
+        return None  # the job itself reports the failure
+
+
+def prefetch_weather(jobs, workers):
+    """
+    Geocode every destination, then fetch all their forecasts in a few
+    multi-location requests; the plans find them in the tool cache.
+    """
+    with rate_limiter.priority(rate_limiter.BATCH), ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [rate_limiter.submit(pool, _geocode, job["destination"]) for job in jobs]
+        points = [loc for loc in (f.result() for f in futures) if loc]
+        if points:
+            get_weather_many(points, max(weather_days(job["days"]) for job in jobs))
+    return len(points)
+
+
+# --- Worker ---
+def run_job(job, pdf_dir=None):
+    timings = {}
+    started = time.perf_counter()
+    rec = dict(job)
+    try:
+        # Interactive users sharing these upstream budgets are served first.
+        with rate_limiter.priority(rate_limiter.BATCH):
+            reply, hotels, attractions, weather, loc = travel_agent(
+                job["destination"], job["days"], hotel_limit=10, attraction_limit=10,
+                timings=timings, **MODES[job["mode"]],
+            )
+        rec.update(itinerary=reply, hotels=hotels, attractions=attractions, weather=weather, location=loc)
+        if loc is None or reply.startswith("❌"):
+            rec["error"] = reply
+        elif reply.startswith("⚠️"):
+            # The template itinerary is kept, but the job is retried on the next run.
+            rec["error"] = reply.splitlines()[0]
+        elif pdf_dir:
+            name = re.sub(r"[^a-z0-9]+", "_", job["id"].lower()).strip("_") + ".pdf"
+            pdf_path = os.path.join(pdf_dir, name)
+            timings["pdf"] = _timed(export_pdf, reply, hotels, attractions, weather,
+                                    job["destination"], job["days"], file_path=pdf_path)
+            rec["pdf"] = pdf_path
+    except Exception as e:
+        rec["error"] = telemetry.redact(f"{type(e).__name__}: {e}")
+    timings.setdefault("total", round(time.perf_counter() - started, 3))
+    rec["timings"] = timings
+    return rec
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    fn(*args, **kwargs)
+    return round(time.perf_counter() - t0, 3)
+
+
+# --- Main ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan trips for many destinations.")
+    parser.add_argument("input", help="CSV or JSONL with destination[, days, mode]")
+    parser.add_argument("-o", "--output", default="plans.jsonl")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--mode", choices=sorted(MODES), default="single_shot")
+    parser.add_argument("--pdf-dir", help="also write one PDF per plan here")
+    parser.add_argument("--no-prefetch", action="store_true", help="skip the batched weather prefetch")
+    args = parser.parse_args(argv)
+
+    if args.pdf_dir:
+        os.makedirs(args.pdf_dir, exist_ok=True)
+
+    done = finished_ids(args.output)
+    jobs, seen = [], set(done)
+    for job in read_jobs(args.input, args.days, args.mode):
+        if job["id"] not in seen:
+            seen.add(job["id"])
+            jobs.append(job)
+    print(f"{len(jobs)} to plan, {len(done)} already done", file=sys.stderr)
+    if jobs and not args.no_prefetch:
+        try:
+            print(f"weather prefetched for {prefetch_weather(jobs, args.workers)} destinations", file=sys.stderr)
+        except Exception as e:
+            print(f"⚠️ weather prefetch failed: {telemetry.redact(str(e))}", file=sys.stderr)
+
+    samples, failed = [], 0
+    started = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_job, job, args.pdf_dir) for job in jobs]
+        for n, fut in enumerate(as_completed(futures), 1):
+            rec = fut.result()
+            # One line per finished plan, synced so a crash loses at most the line in flight.
+            out.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            if rec.get("error"):
+                failed += 1
+            else:
+                samples.append(rec["timings"])
+            print(f"[{n}/{len(jobs)}] {'❌' if rec.get('error') else '✅'} {rec['id']}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "plans": len(jobs),
+        "failed": failed,
+        "elapsed_s": round(elapsed, 2),
+        "plans_per_minute": round(len(jobs) / elapsed * 60, 2) if elapsed and jobs else 0.0,
+        "stages": latency_summary(samples),
+        "upstream_queues": rate_limiter.stats(),
+    }
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end plan latency against the local stand-ins (see backends.py).
+
+    python -m benchmarks.bench_e2e --plans 30 --users 1,4,16 -o bench/after.json
+    python -m benchmarks.bench_e2e --compare bench/before.json bench/after.json
+
+Each plan goes through travel_agent (geocode, tools, dispatcher) and export_pdf
+for every mode, using a fresh destination so nothing is served from cache;
+the tool functions are also timed on their own. Reported per scenario: wall
+time p50/p95/p99, per-stage percentiles (geocode, hotels, attractions,
+weather, each LLM step, pdf), LLM steps and prompt tokens per plan, and
+plans/minute at each concurrency level. --compare exits 1 when the second
+run regressed beyond --threshold.
+"""
+import argparse
+import contextvars
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import backends
+import rate_limiter
+import tool_cache
+from dispatch_history import estimate_tokens
+from pdf_export import export_pdf
+
+QUANTILES = (50, 95, 99)
+DEFAULT_LATENCY = "maps=120,open-meteo=80,gemini=900"
+
+# Differences smaller than this are noise, whatever the ratio.
+MIN_ABS_REGRESSION_S = 0.005
+
+
+# --- LLM metering ---
+_llm_calls = contextvars.ContextVar("bench_llm_calls", default=None)
+
+
+class _MeteredModel:
+    """Records (seconds, prompt tokens) for every Gemini call of the current plan."""
+
+    def __init__(self, model):
+        self.model = model
+
+    def _record(self, prompt, t0):
+        calls = _llm_calls.get()
+        if calls is not None:
+            calls.append({"seconds": time.perf_counter() - t0, "prompt_tokens": estimate_tokens(prompt)})
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        t0 = time.perf_counter()
+        reply = self.model.generate_content(prompt, stream=stream, request_options=request_options)
+        self._record(prompt, t0)
+        return reply
+
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        t0 = time.perf_counter()
+        reply = await self.model.generate_content_async(prompt, stream=stream,
+                                                         request_options=request_options)
+        self._record(prompt, t0)
+        return reply
+
+
+def _unthrottle():
+    """The stand-ins have no quotas; keep the upstream schedulers out of the measurement."""
+    for scheduler in rate_limiter.schedulers.values():
+        for bucket in scheduler.buckets.values():
+            bucket.rate = bucket.capacity = bucket.tokens = float("inf")
+
+
+def _install_metering():
+    make = backends.gemini_model
+    backends.gemini_model = lambda *args, **kwargs: _MeteredModel(make(*args, **kwargs))
+
+
+# --- Scenarios ---
+# Project modules that build clients at import (travel_tools and everything on
+# top of it) are imported inside the functions, after the stand-ins are selected.
+def run_plan(destination, days, mode):
+    from batch_plan import MODES
+    from trip_planner import travel_agent
+
+    calls = []
+    _llm_calls.set(calls)
+    timings = {}
+    started = time.perf_counter()
+    reply, hotels, attractions, weather, loc = travel_agent(
+        destination, days, hotel_limit=10, attraction_limit=10, timings=timings, **MODES[mode]
+    )
+    t0 = time.perf_counter()
+    export_pdf(reply, hotels, attractions, weather, destination, days)
+    timings["pdf"] = time.perf_counter() - t0
+    for i, call in enumerate(calls, 1):
+        timings[f"llm_step_{i}"] = call["seconds"]
+    timings["total"] = time.perf_counter() - started
+    return {
+        "timings": timings,
+        "llm_steps": len(calls),
+        "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+        "error": reply if loc is None or reply.startswith(("❌", "⚠️")) else None,
+    }
+
+
+def _summary(values):
+    from pipeline import percentile
+
+    return {f"p{q}": round(percentile(values, q), 4) for q in QUANTILES} if values else {}
+
+
+def bench_plans(mode, plans, users, days, run_id):
+    from pipeline import latency_summary
+
+    destinations = [f"Bench City {run_id}-{mode}-{users}-{i}" for i in range(plans)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        results = list(pool.map(lambda d: run_plan(d, days, mode), destinations))
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if not r["error"]]
+    return {
+        "plans": plans,
+        "users": users,
+        "errors": len(results) - len(ok),
+        "wall": _summary([r["timings"]["total"] for r in ok]),
+        "stages": latency_summary([r["timings"] for r in ok], quantiles=QUANTILES),
+        "llm_steps": {"mean": round(statistics.mean(r["llm_steps"] for r in ok), 2)} if ok else {},
+        "prompt_tokens": dict(
+            {"mean": round(statistics.mean(r["prompt_tokens"] for r in ok), 1)},
+            **_summary([r["prompt_tokens"] for r in ok]),
+        ) if ok else {},
+        "plans_per_minute": round(len(ok) / elapsed * 60, 2) if elapsed else 0.0,
+    }
+
+
+def bench_tools(samples):
+    import travel_tools
+
+    tools = {
+        "geocode_place": lambda i: travel_tools.geocode_place(f"Bench Tool City {i}"),
+        "search_hotels": lambda i: travel_tools.search_hotels(10 + i * 0.01, 20),
+        "search_attractions": lambda i: travel_tools.search_attractions(10 + i * 0.01, 20),
+        "get_weather": lambda i: travel_tools.get_weather(10 + i * 0.01, 20),
+        "get_walk_info": lambda i: travel_tools.get_walk_info((10 + i * 0.01, 20), (10.01 + i * 0.01, 20.01)),
+        "get_walk_matrix": lambda i: travel_tools.get_walk_matrix(
+            [(10 + i * 0.01 + k * 0.002, 20) for k in range(10)],
+            [(10 + i * 0.01, 20 + k * 0.002) for k in range(10)],
+        ),
+    }
+    out = {}
+    for name, call in tools.items():
+        seconds = []
+        for i in range(samples):
+            t0 = time.perf_counter()
+            call(i)
+            seconds.append(time.perf_counter() - t0)
+        out[name] = _summary(seconds)
+    return out
+
+
+# --- Comparison ---
+def _lower_is_better(base, new, path, threshold, flagged):
+    if not isinstance(base, (int, float)) or not isinstance(new, (int, float)):
+        return
+    if new > base * (1 + threshold) and new - base > MIN_ABS_REGRESSION_S:
+        flagged.append({"metric": path, "before": base, "after": new,
+                        "change": f"+{(new / base - 1) * 100:.0f}%" if base else "new"})
+
+
+def compare(before, after, threshold):
+    """Metrics of `after` that are worse than `before` by more than `threshold` (a fraction)."""
+    flagged = []
+    for name, b in before["scenarios"].items():
+        a = after["scenarios"].get(name)
+        if a is None:
+            continue
+        if "wall" not in b:   # tool micro-benchmarks
+            for tool, qs in b.items():
+                for q, v in qs.items():
+                    _lower_is_better(v, a.get(tool, {}).get(q), f"{name}.{tool}.{q}", threshold, flagged)
+            continue
+        for q, v in b["wall"].items():
+            _lower_is_better(v, a["wall"].get(q), f"{name}.wall.{q}", threshold, flagged)
+        for stage, qs in b["stages"].items():
+            for q, v in qs.items():
+                if q != "count":
+                    _lower_is_better(v, a["stages"].get(stage, {}).get(q), f"{name}.{stage}.{q}",
+                                     threshold, flagged)
+        for metric in ("llm_steps", "prompt_tokens"):
+            _lower_is_better(b[metric].get("mean"), a[metric].get("mean"), f"{name}.{metric}.mean",
+                             threshold, flagged)
+        tp_b, tp_a = b["plans_per_minute"], a["plans_per_minute"]
+        if tp_a < tp_b * (1 - threshold):
+            flagged.append({"metric": f"{name}.plans_per_minute", "before": tp_b, "after": tp_a,
+                            "change": f"{(tp_a / tp_b - 1) * 100:.0f}%"})
+    return flagged
+
+
+# --- Main ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end planning latency against local stand-ins.")
+    parser.add_argument("--plans", type=int, default=20, help="plans per mode and concurrency level")
+    parser.add_argument("--users", default="1,8", help="comma-separated concurrency levels")
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--modes", help="comma-separated plan modes (default: all of batch_plan.MODES)")
+    parser.add_argument("--tool-samples", type=int, default=20)
+    parser.add_argument("--latency", default=DEFAULT_LATENCY, help="simulated upstream latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", default="", help='e.g. "maps=0.01,gemini=0.02"')
+    parser.add_argument("--keep-quotas", action="store_true", help="apply the real upstream rate limits")
+    parser.add_argument("-o", "--output", help="write the results JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two result files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown (fraction)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            before = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            after = json.load(f)
+        flagged = compare(before, after, args.threshold)
+        for r in flagged:
+            print(f"❌ {r['metric']}: {r['before']} -> {r['after']} ({r['change']})")
+        print(f"{len(flagged)} regression(s) beyond {args.threshold:.0%}")
+        return 1 if flagged else 0
+
+    backends.configure(
+        mode="replay",
+        latency=backends.parse_map(args.latency, scale=0.001),
+        jitter=args.jitter,
+        error_rate=backends.parse_map(args.error_rate),
+    )
+    if not args.keep_quotas:
+        _unthrottle()
+    _install_metering()
+    tool_cache.cache.clear()
+
+    run_id = str(int(time.time()))
+    results = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "latency_ms": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "days": args.days,
+        },
+        "scenarios": {},
+    }
+    # First plan pays for imports and client setup; keep it out of the numbers.
+    run_plan(f"Bench Warmup {run_id}", args.days, "single_shot")
+    from batch_plan import MODES
+
+    for mode in args.modes.split(",") if args.modes else MODES:
+        for users in (int(u) for u in args.users.split(",")):
+            name = f"plan:{mode}:users={users}"
+            results["scenarios"][name] = r = bench_plans(mode, args.plans, users, args.days, run_id)
+            print(f"{name:<32} p50 {r['wall'].get('p50', 0):.3f}s  p95 {r['wall'].get('p95', 0):.3f}s  "
+                  f"{r['plans_per_minute']:.1f} plans/min  steps {r['llm_steps'].get('mean', 0)}  "
+                  f"errors {r['errors']}", file=sys.stderr)
+    results["scenarios"]["tools"] = bench_tools(args.tool_samples)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+# benchmarks/bench_pdf.py
+"""
+Render time of export_pdf versus itinerary length.
+
+    python -m benchmarks.bench_pdf
+"""
+import time
+
+from pdf_export import export_pdf
+
+PARAGRAPH = (
+    "Morning: start early at the old town square, wander the narrow lanes and stop for coffee "
+    "at a local cafe before the crowds arrive. Afternoon: visit the museum and the cathedral. "
+    "Evening: dinner by the river."
+)
+
+
+def sample_plan(days):
+    hotels = [{"name": f"Hotel {i}", "rating": 4.2} for i in range(10)]
+    attractions = [{"name": f"Attraction {i}", "rating": 4.6} for i in range(10)]
+    weather = [{"day": f"Day {i+1}", "min_temp": 12, "max_temp": 21, "rain": 10} for i in range(days)]
+    reply = "\n".join(f"Day {d+1}\n{PARAGRAPH}\n{PARAGRAPH}" for d in range(days))
+    return reply, hotels, attractions, weather
+
+
+def bench(days, repeat=5):
+    args = sample_plan(days)
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        pdf = export_pdf(*args, query="Rome", days=days)
+        best = min(best, time.perf_counter() - t0)
+    return len(args[0]), len(pdf), best
+
+
+if __name__ == "__main__":
+    print(f"{'days':>5} {'chars':>8} {'pdf bytes':>10} {'best ms':>9}")
+    for days in (1, 3, 7, 14, 30, 60):
+        chars, size, best = bench(days)
+        print(f"{days:>5} {chars:>8} {size:>10} {best * 1000:>9.1f}")
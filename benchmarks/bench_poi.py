@@ -0,0 +1,76 @@
+# benchmarks/bench_poi.py
+"""
+Local nearby-search latency versus POI store size.
+
+    python -m benchmarks.bench_poi
+
+The store is filled with places spread over one ~30 km city, fetched as
+overlapping 1.5 km search areas (as repeated plans would), then queried at
+random points inside it. A linear scan over the same places is timed as the
+baseline the grid index replaces.
+"""
+import random
+import time
+
+from pipeline import percentile
+from poi_store import PoiStore, haversine_m
+
+CITY = (41.9, 12.5)
+CITY_SPAN_DEG = 0.27          # ~30 km
+SEARCH_RADIUS = 1500
+AREA_STEP_DEG = 0.01          # search areas every ~1 km, so they overlap
+
+
+def fill(store, places, rng):
+    lat0, lng0 = CITY
+    steps = int(CITY_SPAN_DEG / AREA_STEP_DEG)
+    per_area = max(1, places // (steps * steps))
+    n = 0
+    for i in range(steps):
+        for j in range(steps):
+            lat, lng = lat0 + i * AREA_STEP_DEG, lng0 + j * AREA_STEP_DEG
+            results = [{
+                "place_id": f"p{n + k}",
+                "name": f"Place {n + k}",
+                "rating": round(rng.uniform(3, 5), 1),
+                "geometry": {"location": {"lat": lat + rng.uniform(-0.012, 0.012),
+                                          "lng": lng + rng.uniform(-0.016, 0.016)}},
+            } for k in range(per_area)]
+            n += per_area
+            store.add_area("lodging", lat, lng, SEARCH_RADIUS, results, complete=True)
+    return n
+
+
+def bench(places, queries=300, seed=0):
+    rng = random.Random(seed)
+    store = PoiStore(path=None)
+    t0 = time.perf_counter()
+    size = fill(store, places, rng)
+    build = time.perf_counter() - t0
+
+    lat0, lng0 = CITY
+    margin = 0.03
+    points = [(rng.uniform(lat0 + margin, lat0 + CITY_SPAN_DEG - margin),
+               rng.uniform(lng0 + margin, lng0 + CITY_SPAN_DEG - margin)) for _ in range(queries)]
+
+    indexed, hits = [], 0
+    for lat, lng in points:
+        t = time.perf_counter()
+        hits += store.nearby("lodging", lat, lng, SEARCH_RADIUS, limit=5) is not None
+        indexed.append(time.perf_counter() - t)
+
+    everything = list(store._places.values())
+    scan = []
+    for lat, lng in points[:30]:
+        t = time.perf_counter()
+        [p for p in everything if haversine_m(lat, lng, p["lat"], p["lng"]) <= SEARCH_RADIUS]
+        scan.append(time.perf_counter() - t)
+    return size, build, indexed, hits / queries, scan
+
+
+if __name__ == "__main__":
+    print(f"{'places':>8} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'local':>6} {'scan p50 ms':>12}")
+    for places in (1_000, 10_000, 100_000, 300_000):
+        size, build, indexed, local, scan = bench(places)
+        print(f"{size:>8} {build:>8.2f} {percentile(indexed, 50) * 1000:>8.3f} "
+              f"{percentile(indexed, 95) * 1000:>8.3f} {local:>6.0%} {percentile(scan, 50) * 1000:>12.2f}")
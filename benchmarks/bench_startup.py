@@ -0,0 +1,122 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of the app, each sample in a fresh interpreter.
+
+    python -m benchmarks.bench_startup --samples 10 -o bench/startup.json
+    python -m benchmarks.bench_startup --compare bench/before.json bench/startup.json
+
+Reported: `import` (the app's project modules, without streamlit itself),
+`first_page` (streamlit import plus the first script run of agent_app.py,
+as AppTest renders it) and `process` (interpreter start to first page), with
+the heavy third-party modules that were loaded before any plan was made.
+Runs against the local stand-ins (see backends.py) unless --backend live.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_e2e import compare
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_MODULES = ("config", "trip_planner", "pipeline", "pdf_export", "http_transport", "rate_limiter", "tool_cache")
+HEAVY_MODULES = ("pandas", "reportlab", "google.generativeai", "googlemaps", "httpx", "numpy")
+
+_IMPORT_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{"import": time.perf_counter() - t0, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_PAGE_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("agent_app.py", default_timeout=120).run()
+assert not at.exception, at.exception
+print(json.dumps({{"first_page": time.perf_counter() - t0, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _child(snippet, env):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", snippet], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - started
+    return result
+
+
+def _summary(values):
+    from pipeline import percentile
+
+    return dict({f"p{q}": round(percentile(values, q), 4) for q in (50, 95)}, min=round(min(values), 4))
+
+
+def bench(samples, env):
+    imports, pages = [], []
+    for _ in range(samples):
+        imports.append(_child(_IMPORT_SNIPPET.format(modules=APP_MODULES, heavy=HEAVY_MODULES), env))
+        pages.append(_child(_PAGE_SNIPPET.format(heavy=HEAVY_MODULES), env))
+    return {
+        "import": _summary([r["import"] for r in imports]),
+        "first_page": _summary([r["first_page"] for r in pages]),
+        "process": _summary([r["process"] for r in pages]),
+    }, {"after_import": imports[-1]["loaded"], "after_first_page": pages[-1]["loaded"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="App cold-start time in fresh interpreters.")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--backend", default="replay", help="TRAVEL_BACKEND for the children")
+    parser.add_argument("--no-warm-up", action="store_true", help="run the children with WARM_UP=0")
+    parser.add_argument("-o", "--output", help="write the results JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two result files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown (fraction)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            before = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            after = json.load(f)
+        flagged = compare(before, after, args.threshold)
+        for r in flagged:
+            print(f"❌ {r['metric']}: {r['before']} -> {r['after']} ({r['change']})")
+        print(f"{len(flagged)} regression(s) beyond {args.threshold:.0%}")
+        return 1 if flagged else 0
+
+    env = dict(os.environ, TRAVEL_BACKEND=args.backend)
+    if args.no_warm_up:
+        env["WARM_UP"] = "0"
+    startup, loaded = bench(args.samples, env)
+    results = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "samples": args.samples,
+            "backend": args.backend,
+            "loaded": loaded,
+        },
+        "scenarios": {"startup": startup},
+    }
+    for name, qs in startup.items():
+        print(f"{name:<12} p50 {qs['p50']:.3f}s  p95 {qs['p95']:.3f}s  min {qs['min']:.3f}s", file=sys.stderr)
+    print(f"heavy modules loaded by the imports: {', '.join(loaded['after_import']) or 'none'}", file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
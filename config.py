@@ -0,0 +1,131 @@
+# config.py
+"""
+Settings read once from the environment (and .env), and the API clients
+built from them. Nothing here imports an SDK or opens a connection until it
+is first needed:
+
+    config.gmaps()     googlemaps.Client on the pooled session (http_transport)
+    config.genai()     google.generativeai, configured with GEMINI_KEY
+
+warm_up() does all of that ahead of the first request; the app runs it in a
+background thread while the first page renders.
+"""
+import importlib
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# Loaded here, before any other project module reads os.environ.
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# Hosts to open a pooled (keep-alive) connection to during warm-up.
+WARM_UP_URLS = {
+    "maps": "https://maps.googleapis.com/",
+    "open-meteo": "https://api.open-meteo.com/",
+}
+WARM_UP_TIMEOUT = (3.05, 5)
+
+
+class Config:
+    """API keys and startup switches."""
+
+    def __init__(self, env):
+        self.gmaps_key = env.get("GMAPS_KEY")
+        self.gemini_key = env.get("GEMINI_KEY")
+        # WARM_UP=0 skips the background warm-up (e.g. for one-off scripts).
+        self.warm_up = env.get("WARM_UP", "1") != "0"
+
+
+_settings = Config(os.environ)
+_lock = threading.Lock()
+_clients = {}
+
+
+def settings():
+    return _settings
+
+
+def reload():
+    """Re-read the environment and drop the clients built from the old settings."""
+    global _settings
+    with _lock:
+        _settings = Config(os.environ)
+        _clients.clear()
+
+
+def _once(name, build):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = build()
+    return client
+
+
+# --- Clients ---
+def gmaps():
+    def build():
+        import http_transport
+        return http_transport.make_gmaps_client(_settings.gmaps_key)
+
+    return _once("gmaps", build)
+
+
+def genai():
+    def build():
+        import google.generativeai as genai
+        genai.configure(api_key=_settings.gemini_key)
+        return genai
+
+    return _once("genai", build)
+
+
+# --- Warm-up ---
+def _preconnect(url):
+    import http_transport
+    http_transport.session.head(url, timeout=WARM_UP_TIMEOUT)
+
+
+def warm_up(preload=()):
+    """
+    Import the SDKs, build the clients and open a connection to every
+    upstream, plus import the modules in `preload`. Returns seconds per step;
+    a failing step is logged and skipped.
+    """
+    import backends
+    import telemetry
+
+    steps = [("gmaps", gmaps)]
+    if backends.mode() != "replay":
+        steps.append(("gemini", genai))
+    if backends.mode() != "live":
+        # The stand-ins have no connections to open.
+        steps.append(("fake_backends", lambda: importlib.import_module("fake_backends")))
+    else:
+        steps += [(f"connect:{name}", lambda url=url: _preconnect(url)) for name, url in WARM_UP_URLS.items()]
+    steps += [(f"import:{module}", lambda module=module: importlib.import_module(module)) for module in preload]
+
+    timings = {}
+    for name, step in steps:
+        t0 = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            log.warning("warm-up step %s failed: %s", name, telemetry.redact(str(e)))
+        timings[name] = time.perf_counter() - t0
+    return timings
+
+
+def warm_up_in_background(preload=()):
+    """warm_up() on a daemon thread (no-op when WARM_UP=0); returns the thread or None."""
+    if not _settings.warm_up:
+        return None
+    thread = threading.Thread(target=warm_up, args=(preload,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
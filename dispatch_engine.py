@@ -0,0 +1,524 @@
+# dispatch_engine.py
+"""
+The tool-calling loop shared by every Gemini dispatcher.
+
+A dispatcher is a configuration: an instruction, a ToolRegistry describing
+its tools, and step / finish settings (see function_dispatcher.ENGINE and
+multiagent_dispatcher.ENGINE). The registry generates both the tool list in
+the prompt and the response schema for Gemini's JSON output mode, and checks
+every call the model makes: arguments are coerced, aliased and clamped, and
+calls that still can't run are answered with an error the model can correct
+on its next turn instead of aborting the plan.
+"""
+import asyncio
+import inspect
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import backends
+import rate_limiter
+import resilience
+import telemetry
+from dispatch_history import DEFAULT_TOKEN_BUDGET, DispatchHistory
+
+# Max tool calls from one model turn that run at the same time.
+MAX_PARALLEL_TOOLS = 4
+
+PROTOCOL = (
+    "Always reply ONLY with JSON.\n"
+    "Call one tool: {\"action\": <tool>, \"args\": {..}}.\n"
+    "Call several tools in one turn: {\"actions\": [{\"action\": <tool>, \"args\": {..}}, ...]}. "
+    "Request everything you need in a single batch whenever you can.\n"
+    "When finished, reply {\"action\": \"done\", \"result\": \"<final plan>\"}."
+)
+INVALID_JSON_NOTE = "\n[Your last reply was not a JSON object. Reply with exactly one JSON object.]"
+
+
+# --- Tool registry ---
+_SCHEMA_TYPES = {float: "number", int: "integer", str: "string"}
+
+
+class Param:
+    """One tool argument: type, default (or required), allowed range and accepted aliases."""
+
+    def __init__(self, name, type=float, default=None, required=False, minimum=None, maximum=None, aliases=()):
+        self.name = name
+        self.type = type
+        self.default = default
+        self.required = required
+        self.minimum = minimum
+        self.maximum = maximum
+        self.aliases = tuple(aliases)
+
+    def signature(self):
+        return self.name if self.required else f"{self.name}={self.default}"
+
+    def coerce(self, value):
+        """The value as this param's type, clamped to its range; ValueError if it can't be."""
+        if self.type is None:
+            return value
+        if isinstance(value, bool):
+            raise ValueError(f"{self.name} must be a {_SCHEMA_TYPES[self.type]}")
+        if self.type is str:
+            return str(value)
+        if isinstance(value, str):
+            value = value.strip().rstrip("°%")
+        value = float(value)
+        if self.type is int:
+            value = int(round(value))
+        if self.minimum is not None:
+            value = max(self.minimum, value)
+        if self.maximum is not None:
+            value = min(self.maximum, value)
+        return value
+
+
+class ToolSpec:
+    def __init__(self, name, description, params):
+        self.name = name
+        self.description = description
+        self.params = params
+
+    def prompt_line(self):
+        return f"- {self.name}({', '.join(p.signature() for p in self.params)}): {self.description}"
+
+    def check(self, args):
+        """(args ready to call with, error or None, whether anything was repaired)."""
+        repaired = False
+        if isinstance(args, (list, tuple)):       # positional args
+            args, repaired = dict(zip((p.name for p in self.params), args)), True
+        elif not isinstance(args, dict):
+            args, repaired = {}, args is not None
+
+        out = {}
+        for p in self.params:
+            key = next((k for k in (p.name, *p.aliases) if args.get(k) is not None), None)
+            if key is None:
+                if p.required:
+                    return None, f"missing required argument {p.name!r}", repaired
+                out[p.name] = p.default
+                continue
+            try:
+                out[p.name] = p.coerce(args[key])
+            except (TypeError, ValueError):
+                if p.required:
+                    return None, f"invalid value for {p.name!r}: {args[key]!r}", repaired
+                out[p.name], repaired = p.default, True
+                continue
+            repaired = repaired or key != p.name or out[p.name] != args[key]
+        repaired = repaired or bool(set(args) - {k for p in self.params for k in (p.name, *p.aliases)})
+        return out, None, repaired
+
+
+class ToolRegistry:
+    def __init__(self, specs):
+        self.specs = {s.name: s for s in specs}
+
+    @classmethod
+    def from_callables(cls, tools):
+        """A registry read off plain functions' signatures (annotations give the types)."""
+        specs = []
+        for name, fn in tools.items():
+            params = []
+            for p in inspect.signature(fn).parameters.values():
+                if p.kind in (p.VAR_POSITIONAL, p.VAR_KEYWORD):
+                    continue
+                kind = p.annotation if p.annotation in _SCHEMA_TYPES else None
+                if p.default is p.empty:
+                    params.append(Param(p.name, kind, required=True))
+                else:
+                    params.append(Param(p.name, kind, default=p.default))
+            doc = (inspect.getdoc(fn) or "").split("\n")[0]
+            specs.append(ToolSpec(name, doc or name.replace("_", " "), params))
+        return cls(specs)
+
+    def prompt(self):
+        return "Tools available:\n" + "\n".join(s.prompt_line() for s in self.specs.values())
+
+    def response_schema(self):
+        """Gemini response_schema admitting a single call, a batch, or "done"."""
+        arg_props = {}
+        for spec in self.specs.values():
+            for p in spec.params:
+                arg_props.setdefault(p.name, {"type": _SCHEMA_TYPES.get(p.type, "string")})
+        names = list(self.specs)
+        call = {
+            "type": "object",
+            "properties": {
+                "action": {"type": "string", "enum": names},
+                "args": {"type": "object", "properties": arg_props},
+            },
+            "required": ["action", "args"],
+        }
+        return {
+            "type": "object",
+            "properties": {
+                "action": {"type": "string", "enum": names + ["done"]},
+                "args": call["properties"]["args"],
+                "actions": {"type": "array", "items": call},
+                "result": {"type": "string"},
+            },
+        }
+
+    def check(self, action, args):
+        spec = self.specs.get(action)
+        if spec is None:
+            return None, f"unknown tool {action!r}; available: {', '.join(self.specs)}", False
+        return spec.check(args)
+
+    def bind(self, callables):
+        """name -> callable for every registered tool (e.g. travel_tools or a SharedToolResults)."""
+        missing = set(self.specs) - set(callables)
+        if missing:
+            raise ValueError(f"no implementation for tools: {', '.join(sorted(missing))}")
+        return {name: callables[name] for name in self.specs}
+
+
+# --- Reply parsing ---
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+def parse_reply(text: str):
+    """
+    The first JSON object in a model reply, or None. Braces and apostrophes
+    inside strings are handled by the JSON decoder itself.
+    """
+    text = _FENCE.sub("", text)
+    decoder = json.JSONDecoder()
+    for m in re.finditer(r"\{", text):
+        try:
+            value, _ = decoder.raw_decode(text, m.start())
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def _tool_calls(j: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    """Normalize a single {"action", "args"} or a batch {"actions": [...]} reply."""
+    if isinstance(j.get("actions"), list) and j["actions"]:
+        return [(str(c.get("action")), c.get("args", {})) for c in j["actions"] if isinstance(c, dict)]
+    if j.get("action"):
+        return [(str(j["action"]), j.get("args", {}))]
+    return []
+
+
+# --- Streaming helper ---
+# Structured output may emit empty "actions"/"args" before "result".
+_DONE_PREFIX = re.compile(
+    r'\s*(?:```(?:json)?\s*)?\{\s*"action"\s*:\s*"done"\s*,'
+    r'(?:\s*"(?:actions|args)"\s*:\s*(?:\[\s*\]|\{\s*\})\s*,)*\s*"result"\s*:\s*"'
+)
+# Give up on spotting a "done" reply once this much text has arrived without a match.
+_DONE_PREFIX_WINDOW = 160
+
+
+class DoneResultStream:
+    """
+    Fed raw chunks of a streamed model reply. Once the reply is recognizably
+    {"action": "done", "result": "...", the JSON string value is decoded
+    incrementally and passed to `on_token`; tool-call replies emit nothing.
+    """
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.buf = ""
+        self.pos = None        # index of the next undecoded char of the result string
+        self.finished = False
+
+    def feed(self, chunk: str):
+        self.buf += chunk
+        if self.finished:
+            return
+        if self.pos is None:
+            m = _DONE_PREFIX.match(self.buf)
+            if m is None:
+                self.finished = len(self.buf) > _DONE_PREFIX_WINDOW
+                return
+            self.pos = m.end()
+
+        out, i, buf = [], self.pos, self.buf
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.finished = True
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            # Escape: wait for the whole sequence (\uXXXX, maybe a surrogate pair).
+            size = 6 if buf[i + 1:i + 2] == "u" else 2
+            if size == 6 and buf[i + 2:i + 4].lower() in ("d8", "d9", "da", "db"):
+                size = 12
+            if i + size > len(buf):
+                break
+            try:
+                out.append(json.loads('"' + buf[i:i + size] + '"'))
+            except ValueError:
+                out.append(buf[i:i + size])
+            i += size
+        self.pos = i
+        if out:
+            self.on_token("".join(out))
+
+    def close(self):
+        """The reply is complete (nothing is held back here)."""
+
+
+# --- Gemini calls ---
+# Every call is held to the plan's deadline and fails fast while Gemini's
+# circuit is open. A call still running after HEDGE_DELAY s gets one
+# duplicate, but only when Gemini's rate budget has room for it right away.
+# Per-call cap on Gemini's request timeout, before the plan deadline cuts it.
+LLM_TIMEOUT = 60
+
+
+def generate(model, prompt, on_token=None, step=None, stream_cls=DoneResultStream) -> str:
+    """Reply text for `prompt`; with `on_token`, streamed through stream_cls(on_token)."""
+    cost = rate_limiter.gemini_cost(prompt)
+    resilience.check("a Gemini call")
+    rate_limiter.acquire("gemini", **cost)
+
+    def attempt(claim):
+        resilience.check("a Gemini call")
+        with resilience.guarded("gemini"):
+            options = {"timeout": resilience.timeout(LLM_TIMEOUT)}
+            with telemetry.llm_call(model, prompt, step) as span:
+                if on_token is None:
+                    text = model.generate_content(prompt, request_options=options).text
+                else:
+                    stream = stream_cls(on_token)
+                    for chunk in model.generate_content(prompt, stream=True, request_options=options):
+                        if not claim():
+                            span.set(superseded=True)
+                            break
+                        stream.feed(chunk.text)
+                    else:
+                        stream.close()
+                    text = stream.buf
+                span.set(response_chars=len(text), streamed=on_token is not None)
+        if on_token is not None and not claim():
+            raise resilience.Superseded()
+        return text
+
+    return resilience.hedged(attempt, spare=lambda: rate_limiter.try_acquire("gemini", **cost))
+
+
+async def generate_async(model, prompt, on_token=None, step=None, stream_cls=DoneResultStream) -> str:
+    cost = rate_limiter.gemini_cost(prompt)
+    resilience.check("a Gemini call")
+    await rate_limiter.acquire_async("gemini", **cost)
+
+    async def attempt(claim):
+        resilience.check("a Gemini call")
+        with resilience.guarded("gemini"):
+            options = {"timeout": resilience.timeout(LLM_TIMEOUT)}
+            with telemetry.llm_call(model, prompt, step) as span:
+                if on_token is None:
+                    text = (await model.generate_content_async(prompt, request_options=options)).text
+                else:
+                    stream = stream_cls(on_token)
+                    async for chunk in await model.generate_content_async(prompt, stream=True,
+                                                                          request_options=options):
+                        if not claim():
+                            span.set(superseded=True)
+                            break
+                        stream.feed(chunk.text)
+                    else:
+                        stream.close()
+                    text = stream.buf
+                span.set(response_chars=len(text), streamed=on_token is not None)
+        if on_token is not None and not claim():
+            raise resilience.Superseded()
+        return text
+
+    return await resilience.ahedged(attempt, spare=lambda: rate_limiter.try_acquire("gemini", **cost))
+
+
+# --- Dispatch loop ---
+# The loop does no I/O itself: it yields ("generate", prompt) and
+# ("tools", [(action, args), ...]) requests and receives the model text /
+# list of tool results back. drive_sync and drive_async run it, so blocking
+# and asyncio callers share one implementation.
+def dispatch_steps(instruction: str, user_prompt: str, registry: ToolRegistry, max_steps: int, finish=None,
+                   token_budget: int = DEFAULT_TOKEN_BUDGET):
+    """
+    Every returned dict carries `prompt_sizes` (estimated prompt size per
+    generate step, next to what the uncompacted history would have cost) and
+    `repairs` (tool calls whose arguments had to be fixed or were rejected).
+    """
+    history = DispatchHistory(
+        instruction + "\n\n" + registry.prompt() + "\n\n" + PROTOCOL + "\n\nUser: " + user_prompt, token_budget
+    )
+    repairs = []
+
+    def out(result):
+        result["prompt_sizes"] = history.prompt_sizes
+        result["repairs"] = repairs
+        return result
+
+    for _ in range(max_steps):
+        text = (yield ("generate", history.render())).strip()
+        history.start_step()
+
+        j = parse_reply(text)
+        if j is None:
+            if text and not text.startswith(("{", "[", "```")):
+                # Prose instead of JSON: that is the plan, don't pay for another turn.
+                return out({"done": True, "result": finish(text) if finish else text, "repaired": "prose"})
+            history.add_note(INVALID_JSON_NOTE)
+            repairs.append({"error": "invalid_json"})
+            continue
+
+        calls = _tool_calls(j)
+        if calls and calls[0][0] == "done":
+            args = calls[0][1] if isinstance(calls[0][1], dict) else {}
+            result_text = str(j.get("result") or args.get("result") or "")
+            return out({"done": True, "result": finish(result_text) if finish else result_text})
+        if not calls:
+            history.add_note(INVALID_JSON_NOTE)
+            repairs.append({"error": "no_action", "raw": j})
+            continue
+
+        checked = []
+        for action, args in calls:
+            fixed, error, repaired = registry.check(action, args)
+            if error or repaired:
+                repairs.append({"action": action, "args": args, "error": error})
+            checked.append((action, fixed if error is None else args, error))
+
+        # Repeated calls are answered from history, invalid ones with their error.
+        known = [
+            (True, {"error": error}) if error else history.lookup(action, args)
+            for action, args, error in checked
+        ]
+        pending = [(action, args) for (action, args, _), (hit, _) in zip(checked, known) if not hit]
+        fresh = iter((yield ("tools", pending)) if pending else [])
+        for (action, args, error), (hit, previous) in zip(checked, known):
+            history.add_result(action, args if isinstance(args, dict) else {"args": args},
+                               previous if hit else next(fresh))
+
+    return out({"error": "max_steps_exceeded"})
+
+
+def _call_tool(tools, action, args):
+    with telemetry.span("tool_call", action=action) as span:
+        try:
+            return tools[action](**args)
+        except Exception as e:
+            # Exception text can carry request URLs; never hand keys to the model.
+            span.fail(e)
+            return {"error": telemetry.redact(str(e))}
+
+
+def drive_sync(steps, model, tools: Dict[str, Any], max_parallel: int = MAX_PARALLEL_TOOLS,
+               on_token=None) -> Dict[str, Any]:
+    """With `on_token`, generate steps are streamed and the final plan text is emitted as it arrives."""
+    step = 0
+    with telemetry.span("dispatch_loop"):
+        try:
+            request = next(steps)
+            while True:
+                if request[0] == "generate":
+                    step += 1
+                    reply = generate(model, request[1], on_token, step)
+                elif len(request[1]) == 1:
+                    reply = [_call_tool(tools, *request[1][0])]
+                else:
+                    with ThreadPoolExecutor(max_workers=min(max_parallel, len(request[1]))) as pool:
+                        futures = [rate_limiter.submit(pool, _call_tool, tools, *call) for call in request[1]]
+                        reply = [f.result() for f in futures]
+                request = steps.send(reply)
+        except StopIteration as stop:
+            return stop.value
+
+
+async def _call_tool_async(tools, action, args, limit):
+    fn = tools[action]
+    async with limit:
+        with telemetry.span("tool_call", action=action) as span:
+            try:
+                if inspect.iscoroutinefunction(fn):
+                    return await fn(**args)
+                return await asyncio.to_thread(fn, **args)
+            except Exception as e:
+                span.fail(e)
+                return {"error": telemetry.redact(str(e))}
+
+
+async def drive_async(steps, model, tools: Dict[str, Any], max_parallel: int = MAX_PARALLEL_TOOLS,
+                      on_token=None) -> Dict[str, Any]:
+    """Like drive_sync; blocking tools are pushed to a worker thread."""
+    limit = asyncio.Semaphore(max_parallel)
+    step = 0
+    with telemetry.span("dispatch_loop"):
+        try:
+            request = next(steps)
+            while True:
+                if request[0] == "generate":
+                    step += 1
+                    reply = await generate_async(model, request[1], on_token, step)
+                else:
+                    reply = list(await asyncio.gather(*(
+                        _call_tool_async(tools, action, args, limit) for action, args in request[1]
+                    )))
+                request = steps.send(reply)
+        except StopIteration as stop:
+            return stop.value
+
+
+class DispatchFailed(RuntimeError):
+    """The model never finished the plan; `result` is the engine's non-done result dict."""
+
+    def __init__(self, result):
+        super().__init__(f"dispatch did not finish: {result.get('error', 'no result')}")
+        self.result = result
+
+
+# --- Engine ---
+class DispatchEngine:
+    """
+    One dispatcher configuration. `structured` asks Gemini for JSON that
+    matches the registry's response schema, so replies parse on the first try.
+    """
+
+    def __init__(self, instruction, registry, max_steps=4, finish=None, structured=True,
+                 model_name="gemini-2.0-flash", token_budget=DEFAULT_TOKEN_BUDGET):
+        self.instruction = instruction
+        self.registry = registry
+        self.max_steps = max_steps
+        self.finish = finish
+        self.structured = structured
+        self.model_name = model_name
+        self.token_budget = token_budget
+
+    def model(self):
+        if not self.structured:
+            return backends.gemini_model(self.model_name)
+        return backends.gemini_model(self.model_name, generation_config={
+            "response_mime_type": "application/json",
+            "response_schema": self.registry.response_schema(),
+        })
+
+    def with_tools(self, tools):
+        """This configuration with a registry read off `tools` (see ToolRegistry.from_callables)."""
+        return DispatchEngine(self.instruction, ToolRegistry.from_callables(tools), self.max_steps, self.finish,
+                              self.structured, self.model_name, self.token_budget)
+
+    def steps(self, user_prompt, max_steps=None):
+        return dispatch_steps(self.instruction, user_prompt, self.registry, max_steps or self.max_steps,
+                              finish=self.finish, token_budget=self.token_budget)
+
+    def run(self, user_prompt, tools, model=None, on_token=None, max_steps=None) -> Dict[str, Any]:
+        """`tools` maps every registered name to a callable (see ToolRegistry.bind)."""
+        tools = self.registry.bind(tools)
+        return drive_sync(self.steps(user_prompt, max_steps), model or self.model(), tools, on_token=on_token)
+
+    async def arun(self, user_prompt, tools, model=None, on_token=None, max_steps=None) -> Dict[str, Any]:
+        tools = self.registry.bind(tools)
+        return await drive_async(self.steps(user_prompt, max_steps), model or self.model(), tools,
+                                 on_token=on_token)
@@ -0,0 +1,120 @@
+# dispatch_history.py
+import json
+import os
+from typing import Any, Dict, List
+
+# Estimated prompt tokens per generate_content call before older tool
+# results get summarized, then dropped.
+DEFAULT_TOKEN_BUDGET = int(os.getenv("DISPATCH_TOKEN_BUDGET", "3000"))
+CHARS_PER_TOKEN = 4   # rough average for English/JSON text
+SUMMARY_ITEMS = 3
+
+# Fields the model never needs (it is told not to print coordinates).
+DROP_FIELDS = {"lat", "lng", "lon"}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=str, separators=(",", ":"), ensure_ascii=False)
+
+
+def compact(result: Any) -> Any:
+    """Strip a tool result down to the fields the itinerary actually uses."""
+    if isinstance(result, list):
+        return [compact(r) for r in result]
+    if isinstance(result, dict):
+        return {k: compact(v) for k, v in result.items() if k not in DROP_FIELDS}
+    if isinstance(result, float):
+        return round(result, 1)
+    return result
+
+
+def summarize(result: Any) -> str:
+    if isinstance(result, list) and len(result) > SUMMARY_ITEMS:
+        return _dumps(result[:SUMMARY_ITEMS])[:-1] + f',"... +{len(result) - SUMMARY_ITEMS} more"]'
+    text = _dumps(result)
+    return text if len(text) <= 200 else text[:200] + "..."
+
+
+class DispatchHistory:
+    """
+    Conversation history for the dispatch loop.
+
+    The instruction and user prompt are always kept. Tool results are stored
+    compacted and once per distinct (action, args); when the rendered prompt
+    exceeds the token budget the oldest results are summarized, then dropped.
+    The latest step (every result of the last tool batch) is never trimmed:
+    it is what the model is acting on.
+    """
+
+    def __init__(self, head: str, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        self.head = head
+        self.token_budget = token_budget
+        self._entries: List[Dict[str, Any]] = []
+        self._results: Dict[str, Any] = {}
+        self._raw_chars = len(head)
+        self._step = 0
+        self.prompt_sizes: List[Dict[str, int]] = []
+
+    def start_step(self):
+        """Entries added from now on belong to the next model turn."""
+        self._step += 1
+
+    def _add(self, full, summary, dropped):
+        self._entries.append({"full": full, "summary": summary, "dropped": dropped, "level": "full",
+                              "step": self._step})
+
+    @staticmethod
+    def _key(action, args):
+        return action + ":" + _dumps(sorted((args or {}).items()))
+
+    def lookup(self, action, args):
+        """(True, result) if this exact call already ran in this conversation."""
+        key = self._key(action, args)
+        if key in self._results:
+            return True, self._results[key]
+        return False, None
+
+    def add_result(self, action, args, result):
+        key = self._key(action, args)
+        self._raw_chars += len(f"\nToolResult {action}: {json.dumps(result, default=str)}")
+        if key in self._results:
+            repeat = f"\nToolResult {action}: same call already answered above"
+            self._add(repeat, repeat, "")
+            return
+        self._results[key] = result
+        small = compact(result)
+        self._add(
+            f"\nToolResult {action}: {_dumps(small)}",
+            f"\nToolResult {action} (summarized): {summarize(small)}",
+            f"\n[older {action} result omitted]",
+        )
+
+    def add_note(self, text):
+        """A correction for the model (e.g. after an unparseable reply); dropped first when trimming."""
+        self._add(text, text, "")
+
+    def render(self) -> str:
+        def text():
+            return self.head + "".join(e[e["level"]] for e in self._entries)
+
+        prompt = text()
+        latest = self._entries[-1]["step"] if self._entries else None
+        older = [e for e in self._entries if e["step"] != latest]
+        for level in ("summary", "dropped"):
+            for e in older:
+                if estimate_tokens(prompt) <= self.token_budget:
+                    break
+                e["level"] = level
+                prompt = text()
+
+        self.prompt_sizes.append({
+            "step": len(self.prompt_sizes) + 1,
+            "chars": len(prompt),
+            "tokens": estimate_tokens(prompt),
+            "raw_tokens": self._raw_chars // CHARS_PER_TOKEN + 1,
+        })
+        return prompt
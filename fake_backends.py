@@ -0,0 +1,510 @@
+# fake_backends.py
+"""
+Local stand-ins for Google Maps, Open-Meteo and Gemini (selected via backends.py).
+
+- replay: answer from cassettes (cassettes/http.json, cassettes/gemini.json);
+  on a miss, synthesize a deterministic response shaped like the real API,
+  or fail with 404 / an error when FAKE_STRICT=1.
+- record: call the real services and write every response to the cassettes.
+
+Both modes add the configured latency (+/- jitter) and inject errors at the
+configured rate (HTTP 503 for Maps / Open-Meteo, an exception for Gemini), so
+retries, timeouts and the schedulers can be exercised without network access.
+Replay also injects stalls (FAKE_STALL_RATE: calls taking STALL_FACTOR times
+their latency) and honours the caller's timeout, for testing deadlines and
+hedging.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+import backends
+from rate_limiter import UPSTREAM_HOSTS
+
+# Only these query params are dropped from cassette keys (never store the key).
+SECRET_PARAMS = {"key"}
+# A stalled call takes this many times its configured latency.
+STALL_FACTOR = 10
+
+
+# --- Cassettes ---
+class Cassette:
+    """A JSON file of recorded responses keyed by request."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, indent=1, sort_keys=True, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self._data)
+
+
+_cassettes = {}
+
+
+def cassette(config, name):
+    path = os.path.join(config["cassette_dir"], name + ".json")
+    if path not in _cassettes:
+        _cassettes[path] = Cassette(path)
+    return _cassettes[path]
+
+
+def http_key(method, url):
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query) if k not in SECRET_PARAMS)
+    return f"{method} {parts.hostname}{parts.path}?" + "&".join(f"{k}={v}" for k, v in query)
+
+
+def gemini_key(model_name, prompt):
+    return model_name + ":" + hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+
+# --- Latency / errors ---
+_rng = random.Random(backends.settings()["seed"])
+_rng_lock = threading.Lock()
+
+
+def reset():
+    """Re-seed the fault injection and re-read cassettes (after configure())."""
+    with _rng_lock:
+        _rng.seed(backends.settings()["seed"])
+    _cassettes.clear()
+
+
+def _delay(config, upstream):
+    base = config["latency"].get(upstream, 0.0)
+    if not base:
+        return 0.0
+    stall_rate = config["stall_rate"].get(upstream, 0.0)
+    with _rng_lock:
+        delay = max(0.0, base * (1 + _rng.uniform(-config["jitter"], config["jitter"])))
+        if stall_rate > 0 and _rng.random() < stall_rate:
+            delay *= STALL_FACTOR
+        return delay
+
+
+def _read_timeout(timeout):
+    """Seconds from a requests timeout (float or (connect, read)) or None."""
+    return timeout[1] if isinstance(timeout, tuple) else timeout
+
+
+def _fail(config, upstream):
+    rate = config["error_rate"].get(upstream, 0.0)
+    with _rng_lock:
+        return rate > 0 and _rng.random() < rate
+
+
+def _seeded(*parts):
+    return random.Random(hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest())
+
+
+# --- Synthetic Maps / Open-Meteo responses ---
+def _point(params):
+    lat, lng = (float(x) for x in params["location"].split(","))
+    return lat, lng
+
+
+def _haversine_m(a, b):
+    lat1, lng1, lat2, lng2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+def _fake_geocode(params):
+    address = params.get("address", "")
+    rng = _seeded("geocode", address.lower())
+    location = {"lat": round(rng.uniform(-60, 65), 6), "lng": round(rng.uniform(-170, 170), 6)}
+    return {"status": "OK", "results": [{"formatted_address": address, "geometry": {"location": location}}]}
+
+
+# Places pages through up to three pages of 20 via next_page_token.
+_PAGE_SIZE, _PAGES = 20, 3
+
+
+def _fake_nearby(params):
+    if "pagetoken" in params:
+        lat, lng, kind, radius, page = json.loads(base64.urlsafe_b64decode(params["pagetoken"]))
+    else:
+        lat, lng = _point(params)
+        kind, radius, page = params.get("type", "place"), float(params.get("radius", 1500)), 0
+    rng = _seeded("nearby", round(lat, 3), round(lng, 3), kind, radius)
+    results = []
+    for i in range(_PAGE_SIZE * (page + 1)):
+        d = rng.uniform(0, radius) / 111320
+        angle = rng.uniform(0, 2 * math.pi)
+        results.append({
+            "place_id": hashlib.sha1(f"{kind}:{lat:.3f},{lng:.3f}:{radius}:{i}".encode()).hexdigest()[:27],
+            "name": f"{kind.replace('_', ' ').title()} {i + 1}",
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "geometry": {"location": {
+                "lat": round(lat + d * math.sin(angle), 6),
+                "lng": round(lng + d * math.cos(angle) / max(math.cos(math.radians(lat)), 0.01), 6),
+            }},
+        })
+    body = {"status": "OK", "results": results[_PAGE_SIZE * page:]}
+    if page + 1 < _PAGES:
+        body["next_page_token"] = base64.urlsafe_b64encode(
+            json.dumps([lat, lng, kind, radius, page + 1]).encode()).decode()
+    return body
+
+
+def _walk_leg(origin, dest):
+    meters = _haversine_m(origin, dest) * 1.3   # streets are not straight lines
+    minutes = max(1, round(meters / 80))
+    return {
+        "distance": {"text": f"{meters / 1000:.1f} km", "value": round(meters)},
+        "duration": {"text": f"{minutes} mins", "value": minutes * 60},
+    }
+
+
+def _latlngs(text):
+    return [tuple(float(x) for x in p.split(",")) for p in text.split("|")]
+
+
+def _fake_directions(params):
+    origin = tuple(float(x) for x in params["origin"].split(","))
+    dest = tuple(float(x) for x in params["destination"].split(","))
+    return {"status": "OK", "routes": [{"legs": [_walk_leg(origin, dest)]}]}
+
+
+def _fake_distance_matrix(params):
+    origins, dests = _latlngs(params["origins"]), _latlngs(params["destinations"])
+    rows = [{"elements": [dict(_walk_leg(o, d), status="OK") for d in dests]} for o in origins]
+    return {"status": "OK", "rows": rows}
+
+
+def _fake_forecast(params):
+    days = int(params.get("forecast_days", 7))
+    fields = params.get("daily", "").split(",")
+    lats, lngs = params.get("latitude", "0").split(","), params.get("longitude", "0").split(",")
+    places = [_fake_forecast_at(float(lat), float(lng), days, fields) for lat, lng in zip(lats, lngs)]
+    # Like Open-Meteo: a list when several coordinates were asked for.
+    return places if len(places) > 1 else places[0]
+
+
+def _fake_forecast_at(lat, lng, days, fields):
+    rng = _seeded("forecast", lat, lng, time.strftime("%Y-%m-%d %H"))
+    daily = {"time": [], "temperature_2m_max": [], "temperature_2m_min": [],
+             "precipitation_probability_mean": []}
+    base = rng.uniform(5, 28)
+    for i in range(days):
+        high = round(base + rng.uniform(-3, 3), 1)
+        daily["time"].append(time.strftime("%Y-%m-%d", time.gmtime(time.time() + i * 86400)))
+        daily["temperature_2m_max"].append(high)
+        daily["temperature_2m_min"].append(round(high - rng.uniform(4, 10), 1))
+        daily["precipitation_probability_mean"].append(rng.randint(0, 100))
+    for field in fields:
+        if field:
+            daily.setdefault(field, [rng.randint(0, 3) for _ in range(days)])
+    return {"latitude": lat, "longitude": lng, "daily": daily}
+
+
+SYNTHETIC = {
+    "/maps/api/geocode/json": _fake_geocode,
+    "/maps/api/place/nearbysearch/json": _fake_nearby,
+    "/maps/api/directions/json": _fake_directions,
+    "/maps/api/distancematrix/json": _fake_distance_matrix,
+    "/v1/forecast": _fake_forecast,
+}
+
+
+def synthesize(url):
+    """(status, body) for a request no cassette covers."""
+    parts = urlsplit(url)
+    handler = SYNTHETIC.get(parts.path)
+    if handler is None:
+        return 404, {"error": f"no stand-in for {parts.path}"}
+    return 200, handler(dict(parse_qsl(parts.query)))
+
+
+def _replay_http(config, method, url, timeout=None):
+    """(status, headers, body bytes) for a replayed request, after latency / fault injection."""
+    upstream = UPSTREAM_HOSTS.get(urlsplit(url).hostname, "other")
+    delay = _delay(config, upstream)
+    if timeout is not None and delay > timeout:
+        time.sleep(timeout)
+        raise requests.exceptions.ReadTimeout(f"stand-in {upstream} did not answer within {timeout:g}s")
+    time.sleep(delay)
+    return _replay_record(config, method, url, upstream)
+
+
+async def _replay_http_async(config, method, url, timeout=None):
+    """Like _replay_http; raises asyncio.TimeoutError when `timeout` runs out first."""
+    upstream = UPSTREAM_HOSTS.get(urlsplit(url).hostname, "other")
+    delay = _delay(config, upstream)
+    if timeout is not None and delay > timeout:
+        await asyncio.sleep(timeout)
+        raise asyncio.TimeoutError(f"stand-in {upstream} did not answer within {timeout:g}s")
+    await asyncio.sleep(delay)
+    return _replay_record(config, method, url, upstream)
+
+
+def _replay_record(config, method, url, upstream):
+    if _fail(config, upstream):
+        return 503, {"Retry-After": "0"}, b'{"error": "injected failure"}'
+    record = cassette(config, "http").get(http_key(method, url))
+    if record is None:
+        if config["strict"]:
+            return 404, {}, json.dumps({"error": "not in cassette: " + http_key(method, url)}).encode()
+        status, body = synthesize(url)
+        record = {"status": status, "headers": {}, "body": body}
+    return record["status"], record["headers"], json.dumps(record["body"]).encode()
+
+
+def _record_http(config, method, url, status, headers, content):
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return   # only JSON APIs are stood in for
+    keep = {k: v for k, v in headers.items() if k.lower() in ("content-type", "retry-after")}
+    cassette(config, "http").put(http_key(method, url), {"status": status, "headers": keep, "body": body})
+
+
+# --- requests adapter (sync tools and googlemaps) ---
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+
+    def send(self, request, timeout=None, **kwargs):
+        status, headers, content = _replay_http(self.config, request.method, request.url,
+                                                _read_timeout(timeout))
+        resp = requests.Response()
+        resp.status_code = status
+        resp.reason = "OK" if status < 400 else "Stand-in error"
+        resp.headers.update({"Content-Type": "application/json", **headers})
+        resp._content = content
+        resp.encoding = "utf-8"
+        resp.url = request.url
+        resp.request = request
+        return resp
+
+    def close(self):
+        pass
+
+
+class RecordingAdapter(BaseAdapter):
+    def __init__(self, live_adapter, config):
+        super().__init__()
+        self.live = live_adapter
+        self.config = config
+
+    def send(self, request, **kwargs):
+        resp = self.live.send(request, **kwargs)
+        _record_http(self.config, request.method, request.url, resp.status_code, resp.headers, resp.content)
+        return resp
+
+    def close(self):
+        pass   # the live adapter's pool belongs to http_transport
+
+
+def http_adapter(live_adapter, config):
+    if config["mode"] == "record":
+        return RecordingAdapter(live_adapter, config)
+    return ReplayAdapter(config)
+
+
+# --- httpx transport (async tools) ---
+def async_transport(config):
+    import httpx
+
+    class ReplayTransport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            timeout = request.extensions.get("timeout", {}).get("read")
+            try:
+                status, headers, content = await _replay_http_async(config, request.method, str(request.url),
+                                                                    timeout)
+            except asyncio.TimeoutError as e:
+                raise httpx.ReadTimeout(str(e), request=request)
+            return httpx.Response(status, headers={"Content-Type": "application/json", **headers},
+                                  content=content, request=request)
+
+    class RecordingTransport(httpx.AsyncBaseTransport):
+        def __init__(self):
+            self.live = httpx.AsyncHTTPTransport()
+
+        async def handle_async_request(self, request):
+            resp = await self.live.handle_async_request(request)
+            content = await resp.aread()
+            _record_http(config, request.method, str(request.url), resp.status_code, resp.headers, content)
+            return httpx.Response(resp.status_code, headers=resp.headers, content=content, request=request)
+
+        async def aclose(self):
+            await self.live.aclose()
+
+    return RecordingTransport() if config["mode"] == "record" else ReplayTransport()
+
+
+# --- Gemini ---
+class _Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class _AsyncChunks:
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def _chunks(text, size=40):
+    return [_Reply(text[i:i + size]) for i in range(0, len(text), size)] or [_Reply("")]
+
+
+_TOOL_LINE = re.compile(r"^- (\w+)\(([^)]*)\)", re.M)
+_COORDS = re.compile(r"lat=(-?\d+(?:\.\d+)?), lng=(-?\d+(?:\.\d+)?)")
+_DAYS = re.compile(r"(\d+)[- ]day")
+_NAMES = re.compile(r'"name":"([^"]+)"')
+
+
+def synthesize_reply(prompt):
+    """
+    A protocol-correct Gemini turn: batch-call every listed tool first, then
+    answer "done" with a short day-by-day plan built from the tool results.
+    Plain-text prompts (single-shot) get the plan directly.
+    """
+    match = _DAYS.search(prompt)
+    days = int(match.group(1)) if match else 3
+    names = list(dict.fromkeys(_NAMES.findall(prompt)))
+    plan = "\n\n".join(
+        f"Day {d}: Morning at {names[(2 * d - 2) % len(names)] if names else 'the old town'}, "
+        f"afternoon around {names[(2 * d - 1) % len(names)] if names else 'the main square'}, "
+        f"evening dinner nearby."
+        for d in range(1, days + 1)
+    )
+    if "reply ONLY with JSON" not in prompt:
+        return plan
+    coords = _COORDS.search(prompt)
+    if "ToolResult" in prompt or coords is None:
+        return json.dumps({"action": "done", "result": plan})
+    lat, lng = coords.groups()
+    values = {"lat": float(lat), "lng": float(lng), "lon": float(lng), "days": days}
+    actions = []
+    for tool, params in _TOOL_LINE.findall(prompt):
+        wanted = [p.split("=")[0].strip() for p in params.split(",")]
+        actions.append({"action": tool, "args": {n: values[n] for n in wanted if n in values}})
+    return json.dumps({"actions": actions})
+
+
+class FakeGenerativeModel:
+    """Stand-in for genai.GenerativeModel: generate_content(_async), with stream=True."""
+
+    def __init__(self, model_name, config):
+        self.model_name = model_name
+        self.config = config
+
+    def _latency(self, request_options):
+        """(seconds to wait, whether the caller's timeout runs out first)."""
+        delay = _delay(self.config, "gemini")
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            return timeout, True
+        return delay, False
+
+    @staticmethod
+    def _timeout_error(timeout):
+        from google.api_core.exceptions import DeadlineExceeded
+        return DeadlineExceeded(f"stand-in Gemini did not answer within {timeout:g}s")
+
+    def _answer(self, prompt):
+        if _fail(self.config, "gemini"):
+            from google.api_core.exceptions import ServiceUnavailable
+            raise ServiceUnavailable("injected Gemini failure")
+        text = cassette(self.config, "gemini").get(gemini_key(self.model_name, prompt))
+        if text is None:
+            if self.config["strict"]:
+                raise KeyError("Gemini prompt not in cassette")
+            text = synthesize_reply(prompt)
+        return text
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        wait, timed_out = self._latency(request_options)
+        time.sleep(wait)
+        if timed_out:
+            raise self._timeout_error(wait)
+        text = self._answer(prompt)
+        return _chunks(text) if stream else _Reply(text)
+
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        wait, timed_out = self._latency(request_options)
+        await asyncio.sleep(wait)
+        if timed_out:
+            raise self._timeout_error(wait)
+        text = self._answer(prompt)
+        return _AsyncChunks(_chunks(text)) if stream else _Reply(text)
+
+
+class RecordingGenerativeModel:
+    """Wraps the real model and records each full reply keyed by prompt."""
+
+    def __init__(self, model, config):
+        self.model = model
+        self.config = config
+
+    def _save(self, prompt, text):
+        cassette(self.config, "gemini").put(gemini_key(self.model.model_name.split("/")[-1], prompt), text)
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        if not stream:
+            reply = self.model.generate_content(prompt, request_options=request_options)
+            self._save(prompt, reply.text)
+            return reply
+        chunks = list(self.model.generate_content(prompt, stream=True, request_options=request_options))
+        self._save(prompt, "".join(c.text for c in chunks))
+        return chunks
+
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        if not stream:
+            reply = await self.model.generate_content_async(prompt, request_options=request_options)
+            self._save(prompt, reply.text)
+            return reply
+        chunks = [c async for c in await self.model.generate_content_async(
+            prompt, stream=True, request_options=request_options)]
+        self._save(prompt, "".join(c.text for c in chunks))
+        return _AsyncChunks(chunks)
+
+
+def gemini_model(name, config, generation_config=None):
+    if config["mode"] == "record":
+        import config as app_config   # the real SDK, configured with GEMINI_KEY
+        live = app_config.genai().GenerativeModel(name, generation_config=generation_config)
+        return RecordingGenerativeModel(live, config)
+    # The synthetic replies are always valid JSON, so JSON mode needs no special casing.
+    return FakeGenerativeModel(name, config)
@@ -1,34 +1,8 @@
 # function_dispatcher.py
-import json
 import re
 from typing import Any, Dict
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
-from travel_tools import search_hotels, search_attractions, get_weather
-
-# --- Setup Gemini ---
-load_dotenv()
-GEMINI_KEY = os.getenv("GEMINI_KEY")
-genai.configure(api_key=GEMINI_KEY)
-
-
-# --- JSON helpers ---
-def _extract_first_json(text: str) -> str:
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1 or end < start:
-        raise ValueError("No JSON object found in model response")
-    return text[start:end+1]
-
-
-def parse_model_json(text: str) -> Dict[str, Any]:
-    snippet = _extract_first_json(text)
-    try:
-        return json.loads(snippet)
-    except Exception:
-        repaired = snippet.replace("'", '"')
-        return json.loads(repaired)
+import travel_tools
+from dispatch_engine import DispatchEngine, DispatchFailed, Param, ToolRegistry, ToolSpec
 
 
 # --- Cleaner to strip lat/lng ---
@@ -45,65 +19,129 @@ def clean_output(text: str) -> str:
     return text.strip()
 
 
+# Chars after a "Lat" during which a coordinate pattern may still be completing.
+_COORD_WINDOW = 64
+
+
+class CleanOutputStream:
+    """
+    Fed raw chunks of a plain-text reply; passes clean_output's text on to
+    `on_token`, so streamed and final text match. The tail a later chunk
+    could still turn into a coordinate pattern (the last word, an unclosed
+    "(", a recent "Lat") is held back until it settles or the reply ends.
+    """
+
+    def __init__(self, on_token):
+        self.on_token = on_token
+        self.buf = ""
+        self.sent = 0          # chars of cleaned text already passed on
+
+    def _settled(self):
+        buf = self.buf
+        end = max(buf.rfind(" "), buf.rfind("\n")) + 1
+        opened = buf.rfind("(")
+        if opened > buf.rfind(")"):
+            end = min(end, opened)
+        lat = buf.rfind("Lat", max(0, len(buf) - _COORD_WINDOW))
+        if lat >= 0:
+            end = min(end, lat)
+        return end
+
+    def _emit(self, text):
+        if len(text) > self.sent:
+            self.on_token(text[self.sent:])
+            self.sent = len(text)
+
+    def feed(self, chunk: str):
+        self.buf += chunk
+        # Cleaning a settled prefix gives a prefix of the final cleaned text.
+        self._emit(clean_output(self.buf[:self._settled()]))
+
+    def close(self):
+        self._emit(clean_output(self.buf))
+
+
+# --- Tools ---
+MAX_PLACES = travel_tools.PLACES_PAGE_SIZE * travel_tools.PLACES_MAX_PAGES
+LAT = Param("lat", required=True, minimum=-90, maximum=90, aliases=("latitude",))
+LNG = Param("lng", required=True, minimum=-180, maximum=180, aliases=("lon", "longitude"))
+
+TOOLS = ToolRegistry([
+    ToolSpec("search_hotels", "lodging near a point, best rated first", [
+        LAT, LNG,
+        Param("radius", int, default=1500, minimum=100, maximum=50000),
+        Param("limit", int, default=5, minimum=1, maximum=MAX_PLACES),
+    ]),
+    ToolSpec("search_attractions", "tourist attractions near a point", [
+        LAT, LNG,
+        Param("radius", int, default=2000, minimum=100, maximum=50000),
+        Param("limit", int, default=5, minimum=1, maximum=MAX_PLACES),
+    ]),
+    ToolSpec("get_weather", "daily min/max temperature and rain chance", [
+        LAT,
+        Param("lon", required=True, minimum=-180, maximum=180, aliases=("lng", "longitude")),
+        Param("days", int, default=5, minimum=1, maximum=16),
+    ]),
+])
+
+
 # --- Dispatcher ---
-def call_gemini_and_dispatch(model, user_prompt: str, tools: Dict[str, Any], max_steps: int = 4) -> Dict[str, Any]:
-    instruction = (
-        "You are a travel planner AI. Always reply ONLY with JSON.\n"
-        "Format: {\"action\": <tool>, \"args\": {..}}.\n\n"
-        "Tools available:\n"
-        "- search_hotels(lat, lng, radius=1500, limit=5)\n"
-        "- search_attractions(lat, lng, radius=2000, limit=5)\n"
-        "- get_weather(lat, lon, days=5)\n\n"
-        "When finished, reply {\"action\": \"done\", \"result\": \"<final plan>\"}.\n\n"
-        "IMPORTANT:\n"
-        "- Do NOT include lat/lng or technical details in the final plan.\n"
-        "- Write the itinerary in long, rich paragraphs (morning, afternoon, evening).\n"
-        "- Hotels and weather should be summarized in natural language, no raw data.\n"
-        "- Aim for a detailed travel blog style itinerary with context and flow."
-    )
-
-    history = instruction + "\n\nUser: " + user_prompt
-
-    for _ in range(max_steps):
-        resp = model.generate_content(history)
-        text = resp.text.strip()
-
-        try:
-            j = parse_model_json(text)
-        except Exception:
-            return {"error": "parse_failed", "raw": text}
-
-        action = j.get("action")
-        args = j.get("args", {})
-
-        if action == "done":
-            result_text = j.get("result", "")
-            return {"done": True, "result": clean_output(result_text)}
-
-        if action in tools:
-            try:
-                result = tools[action](**args)
-            except Exception as e:
-                result = {"error": str(e)}
-            history += f"\nToolResult {action}: {json.dumps(result, default=str)}"
-        else:
-            return {"error": "unknown_action", "raw": j}
-
-    return {"error": "max_steps_exceeded"}
-
-
-# --- Convenience wrapper ---
-def run_gemini_dispatcher(user_prompt: str, lat=None, lng=None, days=3):
-    model = genai.GenerativeModel("gemini-2.0-flash")
-
-    tools = {
-        "search_hotels": search_hotels,
-        "search_attractions": search_attractions,
-        "get_weather": get_weather,
-    }
-
-    result = call_gemini_and_dispatch(model, user_prompt, tools)
+INSTRUCTION = (
+    "You are a travel planner AI.\n\n"
+    "IMPORTANT:\n"
+    "- Do NOT include lat/lng or technical details in the final plan.\n"
+    "- Write the itinerary in long, rich paragraphs (morning, afternoon, evening).\n"
+    "- Hotels and weather should be summarized in natural language, no raw data.\n"
+    "- Aim for a detailed travel blog style itinerary with context and flow."
+)
 
+ENGINE = DispatchEngine(INSTRUCTION, TOOLS, max_steps=4, finish=clean_output)
+
+
+def call_gemini_and_dispatch(model, user_prompt: str, tools: Dict[str, Any], max_steps: int = 4,
+                             on_token=None) -> Dict[str, Any]:
+    """`tools` other than the travel tools get a registry read off their signatures."""
+    engine = ENGINE if set(tools) == set(TOOLS.specs) else ENGINE.with_tools(tools)
+    return engine.run(user_prompt, tools, model=model, on_token=on_token, max_steps=max_steps)
+
+
+async def call_gemini_and_dispatch_async(model, user_prompt: str, tools: Dict[str, Any], max_steps: int = 4,
+                                         on_token=None) -> Dict[str, Any]:
+    engine = ENGINE if set(tools) == set(TOOLS.specs) else ENGINE.with_tools(tools)
+    return await engine.arun(user_prompt, tools, model=model, on_token=on_token, max_steps=max_steps)
+
+
+# --- Convenience wrappers ---
+def _plan_prompt(user_prompt, lat, lng, days):
+    if lat is not None and lng is not None:
+        user_prompt += f"\nDestination coordinates: lat={lat}, lng={lng}. Trip length: {days} days."
+    return user_prompt
+
+
+def _finish(result):
+    """The finished plan's text; DispatchFailed when the model never got there."""
     if "done" in result and result["done"]:
         return result["result"]
-    return f"⚠️ Gemini dispatch failed: {result}"
+    raise DispatchFailed(result)
+
+
+def run_gemini_dispatcher(user_prompt: str, lat=None, lng=None, days=3, toolset=None, on_token=None):
+    """
+    `toolset` is any object exposing search_hotels / search_attractions /
+    get_weather (defaults to travel_tools), e.g. pipeline.SharedToolResults.
+    `on_token` receives the final itinerary text as it streams in.
+    """
+    toolset = toolset or travel_tools
+    tools = {name: getattr(toolset, name) for name in TOOLS.specs}
+    result = ENGINE.run(_plan_prompt(user_prompt, lat, lng, days), tools, on_token=on_token)
+    return _finish(result)
+
+
+async def run_gemini_dispatcher_async(user_prompt: str, lat=None, lng=None, days=3, toolset=None, on_token=None):
+    """Async run_gemini_dispatcher; defaults to the async travel_tools."""
+    if toolset is None:
+        tools = {name: getattr(travel_tools, name + "_async") for name in TOOLS.specs}
+    else:
+        tools = {name: getattr(toolset, name) for name in TOOLS.specs}
+    result = await ENGINE.arun(_plan_prompt(user_prompt, lat, lng, days), tools, on_token=on_token)
+    return _finish(result)
@@ -0,0 +1,500 @@
+# gazetteer.py
+"""
+Popular destinations with their aliases and common misspellings, in a
+character trie, so most destination queries are resolved without a
+Geocoding round trip:
+
+    gazetteer.locate("Plan a 5-day trip to Rome in October")  # {"lat": 41.9028, "lng": 12.4964}
+    gazetteer.complete("new")                                  # ["New York, United States", ...]
+
+The place name is pulled out of free text first (the words after "to",
+"in", "visit"...); only names the gazetteer cannot place, including
+qualified ones like "Paris, Texas", go to the API, and the answer is
+learned (and kept in GAZETTEER_PATH when set) so the next query for it is
+local too. A name a typo or two away from a known one is only a suggestion,
+or a last resort when the API cannot place it: "Grenada" and "Bolton" are
+real places, not misspelt Granada and Boston.
+
+    GAZETTEER_PATH=/mnt/cache/gazetteer.sqlite   # optional, learned places survive restarts
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import telemetry
+
+DISK_PATH = os.getenv("GAZETTEER_PATH")
+
+# Suggestions kept per trie node for autocomplete.
+TOP_K = 8
+# Words that introduce the destination in a free-text request.
+DESTINATION_CUES = {"to", "in", "visit", "visiting", "around", "explore", "exploring", "see", "at"}
+# Words that end a destination name in free text.
+STOP_WORDS = DESTINATION_CUES | {
+    "a", "an", "the", "for", "from", "with", "and", "on", "during", "next", "this", "of", "my", "our",
+    "day", "days", "week", "weeks", "weekend", "trip", "holiday", "vacation", "plan", "hotels",
+    "attractions", "weather", "january", "february", "march", "april", "may", "june", "july",
+    "august", "september", "october", "november", "december", "spring", "summer", "autumn", "fall",
+    "winter", "do", "go", "get", "fly", "travel", "stay", "spend", "eat",
+}
+# Skipped between a cue and the name ("to see the Grand Canyon").
+ARTICLES = {"a", "an", "the"}
+# Place names that are also everyday words: only taken after a cue or as the whole query.
+COMMON_WORDS = {"nice"}
+
+# name, country, lat, lng, aliases (native names, abbreviations, common misspellings).
+# Listed roughly by popularity: ties in autocomplete and fuzzy matches go to the earlier row.
+DESTINATIONS = (
+    ("Paris", "France", 48.8566, 2.3522, ("parigi",)),
+    ("London", "United Kingdom", 51.5072, -0.1276, ("londres", "londra")),
+    ("Rome", "Italy", 41.9028, 12.4964, ("roma",)),
+    ("New York", "United States", 40.7128, -74.0060, ("new york city", "nyc", "ny", "manhattan", "big apple")),
+    ("Tokyo", "Japan", 35.6762, 139.6503, ("tokio",)),
+    ("Barcelona", "Spain", 41.3874, 2.1686, ("barcelonna", "barca")),
+    ("Dubai", "United Arab Emirates", 25.2048, 55.2708, ("dubay",)),
+    ("Istanbul", "Turkey", 41.0082, 28.9784, ("constantinople", "instanbul")),
+    ("Amsterdam", "Netherlands", 52.3676, 4.9041, ("amsterdamn", "amsterdan")),
+    ("Bangkok", "Thailand", 13.7563, 100.5018, ("bkk", "krung thep")),
+    ("Singapore", "Singapore", 1.3521, 103.8198, ("singapur", "singapura")),
+    ("Prague", "Czechia", 50.0755, 14.4378, ("praha", "prag")),
+    ("Madrid", "Spain", 40.4168, -3.7038, ()),
+    ("Berlin", "Germany", 52.5200, 13.4050, ()),
+    ("Vienna", "Austria", 48.2082, 16.3738, ("wien", "viena")),
+    ("Lisbon", "Portugal", 38.7223, -9.1393, ("lisboa",)),
+    ("Florence", "Italy", 43.7696, 11.2558, ("firenze", "florenz")),
+    ("Venice", "Italy", 45.4408, 12.3155, ("venezia", "venedig")),
+    ("Milan", "Italy", 45.4642, 9.1900, ("milano", "mailand")),
+    ("Naples", "Italy", 40.8518, 14.2681, ("napoli", "neapel")),
+    ("Athens", "Greece", 37.9838, 23.7275, ("athina", "athen")),
+    ("Los Angeles", "United States", 34.0522, -118.2437, ("hollywood",)),
+    ("San Francisco", "United States", 37.7749, -122.4194, ("sf", "san fran", "frisco")),
+    ("Las Vegas", "United States", 36.1699, -115.1398, ("vegas",)),
+    ("Miami", "United States", 25.7617, -80.1918, ()),
+    ("Chicago", "United States", 41.8781, -87.6298, ("chicaco",)),
+    ("Washington", "United States", 38.9072, -77.0369, ("washington dc", "washington d c", "dc")),
+    ("Boston", "United States", 42.3601, -71.0589, ()),
+    ("Orlando", "United States", 28.5383, -81.3792, ()),
+    ("Honolulu", "United States", 21.3069, -157.8583, ("hawaii", "oahu")),
+    ("Seattle", "United States", 47.6062, -122.3321, ()),
+    ("New Orleans", "United States", 29.9511, -90.0715, ("nola",)),
+    ("Toronto", "Canada", 43.6532, -79.3832, ()),
+    ("Vancouver", "Canada", 49.2827, -123.1207, ()),
+    ("Montreal", "Canada", 45.5019, -73.5674, ("montréal",)),
+    ("Mexico City", "Mexico", 19.4326, -99.1332, ("cdmx", "ciudad de mexico")),
+    ("Cancun", "Mexico", 21.1619, -86.8515, ("cancún",)),
+    ("Rio de Janeiro", "Brazil", -22.9068, -43.1729, ("rio",)),
+    ("Sao Paulo", "Brazil", -23.5558, -46.6396, ("são paulo", "sampa")),
+    ("Buenos Aires", "Argentina", -34.6037, -58.3816, ()),
+    ("Lima", "Peru", -12.0464, -77.0428, ()),
+    ("Cusco", "Peru", -13.5320, -71.9675, ("cuzco",)),
+    ("Bogota", "Colombia", 4.7110, -74.0721, ("bogotá",)),
+    ("Cartagena", "Colombia", 10.3910, -75.4794, ()),
+    ("Havana", "Cuba", 23.1136, -82.3666, ("la habana", "habana")),
+    ("Sydney", "Australia", -33.8688, 151.2093, ("sidney",)),
+    ("Melbourne", "Australia", -37.8136, 144.9631, ()),
+    ("Auckland", "New Zealand", -36.8485, 174.7633, ()),
+    ("Queenstown", "New Zealand", -45.0312, 168.6626, ()),
+    ("Hong Kong", "China", 22.3193, 114.1694, ("hk", "hongkong")),
+    ("Seoul", "South Korea", 37.5665, 126.9780, ()),
+    ("Kyoto", "Japan", 35.0116, 135.7681, ()),
+    ("Osaka", "Japan", 34.6937, 135.5023, ()),
+    ("Beijing", "China", 39.9042, 116.4074, ("peking",)),
+    ("Shanghai", "China", 31.2304, 121.4737, ()),
+    ("Taipei", "Taiwan", 25.0330, 121.5654, ()),
+    ("Bali", "Indonesia", -8.4095, 115.1889, ("denpasar",)),
+    ("Kuala Lumpur", "Malaysia", 3.1390, 101.6869, ("kl",)),
+    ("Hanoi", "Vietnam", 21.0278, 105.8342, ("ha noi",)),
+    ("Ho Chi Minh City", "Vietnam", 10.8231, 106.6297, ("saigon", "hcmc", "ho chi minh")),
+    ("Phuket", "Thailand", 7.8804, 98.3923, ()),
+    ("Chiang Mai", "Thailand", 18.7883, 98.9853, ()),
+    ("Manila", "Philippines", 14.5995, 120.9842, ()),
+    ("Delhi", "India", 28.6139, 77.2090, ("new delhi",)),
+    ("Mumbai", "India", 19.0760, 72.8777, ("bombay",)),
+    ("Goa", "India", 15.2993, 74.1240, ()),
+    ("Jaipur", "India", 26.9124, 75.7873, ()),
+    ("Kathmandu", "Nepal", 27.7172, 85.3240, ()),
+    ("Maldives", "Maldives", 4.1755, 73.5093, ()),
+    ("Colombo", "Sri Lanka", 6.9271, 79.8612, ()),
+    ("Abu Dhabi", "United Arab Emirates", 24.4539, 54.3773, ()),
+    ("Doha", "Qatar", 25.2854, 51.5310, ()),
+    ("Jerusalem", "Israel", 31.7683, 35.2137, ()),
+    ("Tel Aviv", "Israel", 32.0853, 34.7818, ("tel aviv yafo",)),
+    ("Cairo", "Egypt", 30.0444, 31.2357, ("kairo",)),
+    ("Marrakech", "Morocco", 31.6295, -7.9811, ("marrakesh", "marakesh", "marakech")),
+    ("Cape Town", "South Africa", -33.9249, 18.4241, ("capetown", "kaapstad")),
+    ("Johannesburg", "South Africa", -26.2041, 28.0473, ("joburg", "jozi")),
+    ("Nairobi", "Kenya", -1.2921, 36.8219, ()),
+    ("Zanzibar", "Tanzania", -6.1659, 39.2026, ()),
+    ("Mombasa", "Kenya", -4.0435, 39.6682, ()),
+    ("Dublin", "Ireland", 53.3498, -6.2603, ("baile atha cliath",)),
+    ("Edinburgh", "United Kingdom", 55.9533, -3.1883, ("edinborough", "edinburg", "edimburgo")),
+    ("Manchester", "United Kingdom", 53.4808, -2.2426, ()),
+    ("Brussels", "Belgium", 50.8503, 4.3517, ("bruxelles", "brussel")),
+    ("Bruges", "Belgium", 51.2093, 3.2247, ("brugge",)),
+    ("Copenhagen", "Denmark", 55.6761, 12.5683, ("kobenhavn", "københavn")),
+    ("Stockholm", "Sweden", 59.3293, 18.0686, ()),
+    ("Oslo", "Norway", 59.9139, 10.7522, ()),
+    ("Helsinki", "Finland", 60.1699, 24.9384, ()),
+    ("Reykjavik", "Iceland", 64.1466, -21.9426, ("reykjavík", "iceland")),
+    ("Munich", "Germany", 48.1351, 11.5820, ("münchen", "munchen", "muenchen")),
+    ("Hamburg", "Germany", 53.5511, 9.9937, ()),
+    ("Frankfurt", "Germany", 50.1109, 8.6821, ("frankfurt am main",)),
+    ("Cologne", "Germany", 50.9375, 6.9603, ("köln", "koln", "koeln")),
+    ("Zurich", "Switzerland", 47.3769, 8.5417, ("zürich", "zuerich")),
+    ("Geneva", "Switzerland", 46.2044, 6.1432, ("genève", "geneve", "genf")),
+    ("Interlaken", "Switzerland", 46.6863, 7.8632, ()),
+    ("Budapest", "Hungary", 47.4979, 19.0402, ()),
+    ("Krakow", "Poland", 50.0647, 19.9450, ("kraków", "cracow")),
+    ("Warsaw", "Poland", 52.2297, 21.0122, ("warszawa",)),
+    ("Dubrovnik", "Croatia", 42.6507, 18.0944, ()),
+    ("Santorini", "Greece", 36.3932, 25.4615, ("thira", "fira")),
+    ("Mykonos", "Greece", 37.4467, 25.3289, ()),
+    ("Seville", "Spain", 37.3891, -5.9845, ("sevilla",)),
+    ("Valencia", "Spain", 39.4699, -0.3763, ()),
+    ("Granada", "Spain", 37.1773, -3.5986, ()),
+    ("Malaga", "Spain", 36.7213, -4.4214, ("málaga",)),
+    ("Ibiza", "Spain", 38.9067, 1.4206, ("eivissa",)),
+    ("Mallorca", "Spain", 39.5696, 2.6502, ("majorca", "palma de mallorca")),
+    ("Tenerife", "Spain", 28.2916, -16.6291, ()),
+    ("Porto", "Portugal", 41.1579, -8.6291, ("oporto",)),
+    ("Nice", "France", 43.7102, 7.2620, ("nizza",)),
+    ("Lyon", "France", 45.7640, 4.8357, ("lyons",)),
+    ("Marseille", "France", 43.2965, 5.3698, ("marseilles",)),
+    ("Monaco", "Monaco", 43.7384, 7.4246, ("monte carlo",)),
+    ("Bordeaux", "France", 44.8378, -0.5792, ()),
+    ("Amalfi", "Italy", 40.6340, 14.6027, ("amalfi coast",)),
+    ("Cinque Terre", "Italy", 44.1461, 9.6439, ()),
+    ("Bologna", "Italy", 44.4949, 11.3426, ()),
+    ("Turin", "Italy", 45.0703, 7.6869, ("torino",)),
+    ("Verona", "Italy", 45.4384, 10.9916, ()),
+    ("Pisa", "Italy", 43.7228, 10.4017, ()),
+    ("Siena", "Italy", 43.3188, 11.3308, ()),
+    ("Palermo", "Italy", 38.1157, 13.3615, ()),
+    ("Salzburg", "Austria", 47.8095, 13.0550, ()),
+    ("Tallinn", "Estonia", 59.4370, 24.7536, ()),
+    ("Riga", "Latvia", 56.9496, 24.1052, ()),
+    ("Vilnius", "Lithuania", 54.6872, 25.2797, ()),
+    ("St Petersburg", "Russia", 59.9311, 30.3609, ("saint petersburg", "st. petersburg")),
+    ("Moscow", "Russia", 55.7558, 37.6173, ("moskva",)),
+    ("Kyiv", "Ukraine", 50.4501, 30.5234, ("kiev",)),
+    ("Bucharest", "Romania", 44.4268, 26.1025, ("bucuresti",)),
+    ("Sofia", "Bulgaria", 42.6977, 23.3219, ()),
+    ("Belgrade", "Serbia", 44.7866, 20.4489, ("beograd",)),
+    ("Ljubljana", "Slovenia", 46.0569, 14.5058, ()),
+    ("Valletta", "Malta", 35.8989, 14.5146, ("malta",)),
+    ("Antalya", "Turkey", 36.8969, 30.7133, ()),
+    ("Cappadocia", "Turkey", 38.6431, 34.8289, ("goreme", "göreme")),
+    ("Petra", "Jordan", 30.3285, 35.4444, ()),
+    ("Muscat", "Oman", 23.5880, 58.3829, ()),
+)
+
+
+def normalize(text):
+    """Lowercase, accents stripped, punctuation as spaces, whitespace collapsed."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def _tokens(text):
+    """(word, normalized word) pairs of a free-text request; commas are words of their own."""
+    return [(word, normalize(word)) for word in str(text).replace(",", " , ").split()]
+
+
+def _is_stop(low):
+    return any(part in STOP_WORDS or part.isdigit() for part in low.split())
+
+
+def _run(tokens, start, skip):
+    """The words from `start` (past any `skip` words) up to a stop word, number or punctuation."""
+    while start < len(tokens) and skip(tokens[start][1]):
+        start += 1
+    run = []
+    for word, low in tokens[start:]:
+        if word != "," and (not low or _is_stop(low)):
+            break
+        run.append((word.strip(".!?;:"), low))
+    while run and run[-1][0] == ",":
+        run.pop()
+    return run
+
+
+def destination(text):
+    """
+    (words, after_cue): the words naming the destination in a free-text
+    request, with any qualifier ("Paris, Texas"). That is the run after the
+    first cue ("to", "in", "visit"...) that has one, else the run at the
+    start of the query.
+    """
+    tokens = _tokens(text)
+    for i, (_, low) in enumerate(tokens):
+        if low in DESTINATION_CUES:
+            run = _run(tokens, i + 1, lambda low: low in ARTICLES)
+            if run:
+                return [word for word, _ in run], True
+    run = _run(tokens, 0, lambda low: not low or _is_stop(low))
+    return [word for word, _ in run], False
+
+
+def max_typos(key):
+    """Edits tolerated for a name of this length: short names must match exactly."""
+    n = len(key)
+    return 0 if n <= 4 else 1 if n <= 8 else 2
+
+
+# --- Trie ---
+class _Node:
+    __slots__ = ("children", "ids", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.ids = None     # entries whose key ends here
+        self.top = []       # best-ranked entries under this prefix, at most TOP_K
+
+
+class Trie:
+    """Normalized keys -> entry ids, with per-prefix top-k and bounded-edit search."""
+
+    def __init__(self):
+        self.root = _Node()
+        self.size = 0
+
+    def insert(self, key, entry_id):
+        node = self.root
+        for c in key:
+            if entry_id not in node.top and len(node.top) < TOP_K:
+                node.top.append(entry_id)
+            node = node.children.setdefault(c, _Node())
+        if entry_id not in node.top and len(node.top) < TOP_K:
+            node.top.append(entry_id)
+        if node.ids is None:
+            node.ids = []
+            self.size += 1
+        if entry_id not in node.ids:
+            node.ids.append(entry_id)
+
+    def find(self, key):
+        node = self._walk(key)
+        return node.ids if node is not None and node.ids else None
+
+    def prefix(self, key):
+        node = self._walk(key)
+        return node.top if node is not None else []
+
+    def _walk(self, key):
+        node = self.root
+        for c in key:
+            node = node.children.get(c)
+            if node is None:
+                return None
+        return node
+
+    def fuzzy(self, key, max_dist):
+        """[(distance, entry_id)] within `max_dist` edits (a swap of neighbours counts as one)."""
+        found = []
+        first = list(range(len(key) + 1))
+        for c, child in self.root.children.items():
+            self._search(child, c, None, key, first, None, max_dist, found)
+        return found
+
+    def _search(self, node, c, prev_c, key, prev_row, prev_prev_row, max_dist, found):
+        # One row of the Damerau-Levenshtein (optimal string alignment) table per trie level.
+        row = [prev_row[0] + 1]
+        for i in range(1, len(key) + 1):
+            cost = key[i - 1] != c
+            d = min(row[i - 1] + 1, prev_row[i] + 1, prev_row[i - 1] + cost)
+            if prev_prev_row is not None and i > 1 and key[i - 1] == prev_c and key[i - 2] == c:
+                d = min(d, prev_prev_row[i - 2] + 1)
+            row.append(d)
+        if node.ids and row[-1] <= max_dist:
+            found.extend((row[-1], entry_id) for entry_id in node.ids)
+        if min(row) <= max_dist:
+            for next_c, child in node.children.items():
+                self._search(child, next_c, c, key, row, prev_row, max_dist, found)
+
+
+# --- Gazetteer ---
+class Gazetteer:
+    """Destinations by name and alias; learns the places the Geocoding API resolves for it."""
+
+    def __init__(self, rows=DESTINATIONS, path=DISK_PATH):
+        self._lock = threading.Lock()
+        self.entries = []
+        self.trie = Trie()
+        self._counters = {"local": 0, "api": 0, "fuzzy": 0, "not_found": 0, "learned": 0}
+        for name, country, lat, lng, aliases in rows:
+            self._add(name, country, lat, lng, aliases)
+        self.path = path
+        self._local = threading.local()
+        if path:
+            self._load()
+
+    def _add(self, name, country, lat, lng, aliases=()):
+        entry_id = len(self.entries)
+        self.entries.append({"name": name, "country": country, "lat": lat, "lng": lng})
+        keys = {normalize(name), *(normalize(a) for a in aliases)}
+        if country:
+            keys.add(normalize(f"{name} {country}"))
+        for key in keys:
+            if key:
+                self.trie.insert(key, entry_id)
+        return entry_id
+
+    # --- Persistence ---
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def _load(self):
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS gazetteer_learned ("
+            "key TEXT PRIMARY KEY, name TEXT NOT NULL, lat REAL NOT NULL, lng REAL NOT NULL, "
+            "learned_at REAL NOT NULL)"
+        )
+        conn.commit()
+        for key, name, lat, lng in conn.execute("SELECT key, name, lat, lng FROM gazetteer_learned"):
+            if self.trie.find(key) is None:
+                self._add(name, "", lat, lng, (key,))
+
+    # --- Lookups ---
+    def _entry(self, entry_id):
+        entry = self.entries[entry_id]
+        return {"lat": entry["lat"], "lng": entry["lng"]}
+
+    def lookup(self, text, fuzzy=False):
+        """Location of a place name or alias (with `fuzzy`, the closest within a few typos), or None."""
+        key = normalize(text)
+        if not key:
+            return None
+        with self._lock:
+            ids = self.trie.find(key)
+            if ids is None and fuzzy and max_typos(key):
+                # Closest match; equally close ones go to the more popular entry.
+                matches = self.trie.fuzzy(key, max_typos(key))
+                ids = [min(matches)[1]] if matches else None
+        return self._entry(ids[0]) if ids else None
+
+    def extract(self, text, fuzzy=False):
+        """
+        Location of the destination named in a free-text request, or None.
+        The whole destination (see destination()) must be one known name or
+        alias, so "Paris, Texas" is left to the API rather than read as Paris.
+        With `fuzzy`, a near miss is accepted too, but only right after a cue
+        or in a short query.
+        """
+        words, after_cue = destination(text)
+        key = normalize(" ".join(words))
+        if not key or (key in COMMON_WORDS and not after_cue and key != normalize(text)):
+            return None
+        return self.lookup(key, fuzzy=fuzzy and (after_cue or len(normalize(text).split()) <= 3))
+
+    @staticmethod
+    def candidate(text):
+        """The part of a free-text request worth geocoding: its destination(), qualifier included."""
+        words, _ = destination(text)
+        return " ".join(words).replace(" , ", ", ") or " ".join(str(text).split())
+
+    def complete(self, prefix, limit=5):
+        """
+        Up to `limit` "Name, Country" suggestions for a partly typed
+        destination; when no name starts with it, the closest misspellings.
+        """
+        key = normalize(prefix)
+        if not key:
+            return []
+        with self._lock:
+            ids = self.trie.prefix(key)
+            if not ids and max_typos(key):
+                ids = list(dict.fromkeys(i for _, i in sorted(self.trie.fuzzy(key, max_typos(key)))))
+            entries = [self.entries[i] for i in ids[:limit]]
+        return [f"{e['name']}, {e['country']}" if e["country"] else e["name"] for e in entries]
+
+    def learn(self, text, loc):
+        """Remember where the API placed `text`."""
+        key = normalize(text)
+        if not key or not loc:
+            return
+        with self._lock:
+            if self.trie.find(key) is not None:
+                return
+            self._add(" ".join(str(text).split()), "", loc["lat"], loc["lng"], (key,))
+            self._counters["learned"] += 1
+        if self.path:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO gazetteer_learned (key, name, lat, lng, learned_at) VALUES (?, ?, ?, ?, ?)",
+                (key, " ".join(str(text).split()), loc["lat"], loc["lng"], time.time()),
+            )
+            conn.commit()
+
+    def locate(self, query, geocode=None):
+        """
+        {lat, lng} for a destination query, free text allowed: from the
+        gazetteer when it knows the name or alias, else from `geocode` (the
+        Geocoding tool by default) on the extracted name, which is learned.
+        Only when the API cannot place it is the closest misspelling taken.
+        """
+        with telemetry.span("gazetteer", query=query) as span:
+            loc = self.extract(query)
+            if loc is not None:
+                self._count("local")
+                span.set(source="local")
+                return loc
+            if geocode is None:
+                from travel_tools import geocode_place as geocode
+            name = self.candidate(query)
+            try:
+                loc = geocode(name)
+            except Exception:
+                loc = self.extract(query, fuzzy=True)
+                if loc is None:
+                    raise
+            else:
+                if loc:
+                    self._count("api")
+                    self.learn(name, loc)
+                    span.set(source="api")
+                    return loc
+                loc = self.extract(query, fuzzy=True)
+            source = "fuzzy" if loc else "not_found"
+            self._count(source)
+            span.set(source=source)
+            return loc
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._counters)
+            out["places"] = len(self.entries)
+            out["keys"] = self.trie.size
+        return out
+
+
+gazetteer = Gazetteer()
+
+
+def locate(query):
+    return gazetteer.locate(query)
+
+
+def lookup(text):
+    return gazetteer.lookup(text)
+
+
+def complete(prefix, limit=5):
+    return gazetteer.complete(prefix, limit)
+
+
+def stats():
+    return gazetteer.stats()
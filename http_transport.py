@@ -0,0 +1,222 @@
+# http_transport.py
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import backends
+import rate_limiter
+import resilience
+import telemetry
+
+# --- Per-endpoint (connect, read) timeouts in seconds ---
+ENDPOINT_TIMEOUTS = {
+    "maps": (3.05, 10),
+    "open-meteo": (3.05, 8),
+}
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# --- Retry policy ---
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.3   # seconds
+BACKOFF_CAP = 4.0    # seconds
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# googlemaps runs its own jittered retry loop; this bounds it.
+MAPS_RETRY_TIMEOUT = 15
+
+POOL_CONNECTIONS = 10   # distinct hosts kept pooled
+POOL_MAXSIZE = 32       # keep-alive connections per host
+
+
+# --- Shared session ---
+class _ScheduledSession(requests.Session):
+    """
+    Every request (ours and googlemaps') waits for its upstream's rate budget
+    first, is traced, fails fast while the upstream's circuit is open, and
+    gets a timeout no longer than what is left of the plan's deadline.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        upstream = rate_limiter.UPSTREAM_HOSTS.get(urlsplit(url).hostname, "other")
+        resilience.check(f"a {upstream} request")
+        # Queue for the rate budget first: a half-open circuit's trial slot is not held while waiting.
+        rate_limiter.acquire_for_url(url)
+        with resilience.guarded(upstream) as outcome:
+            kwargs["timeout"] = resilience.timeout(kwargs.get("timeout"))
+            with telemetry.upstream_call(upstream, method, url) as span:
+                resp = super().request(method, url, *args, **kwargs)
+                span.set(status=resp.status_code)
+            if resp.status_code in RETRY_STATUSES:
+                outcome.fail(f"HTTP {resp.status_code}")
+            return resp
+
+
+session = _ScheduledSession()
+_adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+
+_lock = threading.Lock()
+_counters = {}
+
+
+def _count(endpoint, name):
+    with _lock:
+        c = _counters.setdefault(endpoint, {"requests": 0, "retries": 0, "failures": 0})
+        c[name] += 1
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, honouring Retry-After when the server sends one."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), BACKOFF_CAP))
+        except ValueError:
+            pass
+    return delay
+
+
+def get_json(endpoint, url, params=None):
+    """GET `url` through the shared pool with the endpoint's timeouts and bounded retries."""
+    timeout = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+    for attempt in range(MAX_RETRIES + 1):
+        _count(endpoint, "requests")
+        try:
+            resp = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                _count(endpoint, "failures")
+                raise
+            _count(endpoint, "retries")
+            time.sleep(resilience.timeout(backoff_delay(attempt)))
+            continue
+
+        if resp.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            _count(endpoint, "retries")
+            time.sleep(resilience.timeout(backoff_delay(attempt, resp.headers.get("Retry-After"))))
+            continue
+        if not resp.ok:
+            _count(endpoint, "failures")
+        resp.raise_for_status()
+        return resp.json()
+
+
+# --- Async client ---
+# httpx.AsyncClient is bound to the loop it was created on, so keep one per loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def async_client():
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(transport=backends.async_transport(), limits=httpx.Limits(
+            max_connections=POOL_CONNECTIONS * POOL_MAXSIZE,
+            max_keepalive_connections=POOL_MAXSIZE,
+        ))
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose():
+    """Close the current loop's async client (call on service shutdown)."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def reset_backend():
+    """(Re)mount the adapter for the selected backend (see backends.py)."""
+    adapter = backends.http_adapter(_adapter)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # Async clients pick up the new transport when next created.
+    _async_clients.clear()
+
+
+reset_backend()
+
+
+async def aget_json(endpoint, url, params=None):
+    """Async get_json: same timeouts, retry policy and counters."""
+    import httpx
+
+    client = async_client()
+    for attempt in range(MAX_RETRIES + 1):
+        _count(endpoint, "requests")
+        resilience.check(f"a {endpoint} request")
+        try:
+            await rate_limiter.acquire_async(endpoint)
+            with resilience.guarded(endpoint) as outcome:
+                connect, read = resilience.timeout(ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+                with telemetry.upstream_call(endpoint, "GET", url) as span:
+                    resp = await client.get(url, params=params, timeout=httpx.Timeout(read, connect=connect))
+                    span.set(status=resp.status_code)
+                if resp.status_code in RETRY_STATUSES:
+                    outcome.fail(f"HTTP {resp.status_code}")
+        except (httpx.ConnectError, httpx.TimeoutException):
+            if attempt == MAX_RETRIES:
+                _count(endpoint, "failures")
+                raise
+            _count(endpoint, "retries")
+            await asyncio.sleep(resilience.timeout(backoff_delay(attempt)))
+            continue
+
+        if resp.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            _count(endpoint, "retries")
+            await asyncio.sleep(resilience.timeout(backoff_delay(attempt, resp.headers.get("Retry-After"))))
+            continue
+        if not resp.is_success:
+            _count(endpoint, "failures")
+        resp.raise_for_status()
+        return resp.json()
+
+
+def make_gmaps_client(key):
+    """googlemaps.Client sharing our pooled session, with bounded timeouts and retries."""
+    import googlemaps
+
+    if not key and backends.mode() != "live":
+        key = "AIza-offline"   # googlemaps checks the prefix; the stand-ins ignore it
+    connect, read = ENDPOINT_TIMEOUTS["maps"]
+    return googlemaps.Client(
+        key=key,
+        connect_timeout=connect,
+        read_timeout=read,
+        retry_timeout=MAPS_RETRY_TIMEOUT,
+        requests_session=session,
+    )
+
+
+# --- Stats ---
+def connection_stats():
+    """
+    Per-host pool usage. `reuse` is the share of requests that did not need a
+    new connection (and therefore no TCP/TLS handshake).
+    """
+    pools = _adapter.poolmanager.pools
+    out = {}
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        reqs = pool.num_requests
+        out[pool.host] = {
+            "connections": pool.num_connections,
+            "requests": reqs,
+            "reuse": round(1 - pool.num_connections / reqs, 3) if reqs else 0.0,
+        }
+    return out
+
+
+def stats():
+    with _lock:
+        counters = {k: dict(v) for k, v in _counters.items()}
+    return {"endpoints": counters, "pools": connection_stats()}
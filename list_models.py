@@ -1,9 +1,6 @@
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
+import config
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_KEY"))
+genai = config.genai()
 
 for m in genai.list_models():
     print(m.name)
@@ -1,97 +1,103 @@
 # multiagent_dispatcher.py
-import json
 from typing import Any, Dict
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
 
 # Import tools
-from travel_tools import search_hotels, search_attractions, get_weather
-
-# --- Setup Gemini ---
-load_dotenv()
-GEMINI_KEY = os.getenv("GEMINI_KEY")
-genai.configure(api_key=GEMINI_KEY)
-
-# --- JSON helpers ---
-def _extract_first_json(text: str) -> str:
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1 or end < start:
-        raise ValueError("No JSON object found in model response")
-    return text[start:end+1]
-
-def parse_model_json(text: str) -> Dict[str, Any]:
-    snippet = _extract_first_json(text)
-    try:
-        return json.loads(snippet)
-    except Exception:
-        repaired = snippet.replace("'", '"')
-        return json.loads(repaired)
+import travel_tools
+from dispatch_engine import DispatchEngine, DispatchFailed, Param, ToolRegistry, ToolSpec
+from function_dispatcher import LAT, LNG, MAX_PLACES
+
+# --- Agents ---
+AGENTS = ToolRegistry([
+    ToolSpec("hotel_agent", "finds well rated hotels near the destination", [
+        LAT, LNG, Param("limit", int, default=5, minimum=1, maximum=MAX_PLACES),
+    ]),
+    ToolSpec("attraction_agent", "finds the main sights near the destination", [
+        LAT, LNG, Param("limit", int, default=5, minimum=1, maximum=MAX_PLACES),
+    ]),
+    ToolSpec("weather_agent", "daily forecast for the trip", [
+        LAT, LNG, Param("days", int, default=5, minimum=1, maximum=16),
+    ]),
+])
 
 # --- Multi-Agent Dispatcher ---
-def call_multiagent(model, user_prompt: str, tools: Dict[str, Any], max_steps: int = 6) -> Dict[str, Any]:
-    instruction = (
-        "You are a multi-agent coordinator. Always reply ONLY with JSON.\n"
-        "Format: {\"action\": <tool>, \"args\": {..}}.\n\n"
-        "Available tools:\n"
-        "- hotel_agent(lat, lng, limit)\n"
-        "- attraction_agent(lat, lng, limit)\n"
-        "- weather_agent(lat, lng, days)\n\n"
-        "When finished, reply {\"action\": \"done\", \"result\": \"<final detailed plan>\"}.\n"
-        "Expand the itinerary into paragraphs (one per day). Do NOT include lat/lng in the final output."
-    )
-
-    history = instruction + "\n\nUser: " + user_prompt
-
-    for _ in range(max_steps):
-        resp = model.generate_content(history)
-        text = resp.text.strip()
-
-        try:
-            j = parse_model_json(text)
-        except Exception:
-            return {"error": "parse_failed", "raw": text}
-
-        action = j.get("action")
-        args = j.get("args", {})
-
-        if action == "done":
-            return {"done": True, "result": j.get("result", "")}
-
-        if action in tools:
-            try:
-                result = tools[action](**args)
-            except Exception as e:
-                result = {"error": str(e)}
-            history += f"\nToolResult {action}: {json.dumps(result, default=str)}"
-        else:
-            return {"error": "unknown_action", "raw": j}
-
-    return {"error": "max_steps_exceeded"}
+INSTRUCTION = (
+    "You are a multi-agent coordinator.\n"
+    "Expand the itinerary into paragraphs (one per day). Do NOT include lat/lng in the final output."
+)
+
+ENGINE = DispatchEngine(INSTRUCTION, AGENTS, max_steps=6)
+
+def call_multiagent(model, user_prompt: str, tools: Dict[str, Any], max_steps: int = 6,
+                    on_token=None) -> Dict[str, Any]:
+    """`tools` other than the three agents get a registry read off their signatures."""
+    engine = ENGINE if set(tools) == set(AGENTS.specs) else ENGINE.with_tools(tools)
+    return engine.run(user_prompt, tools, model=model, on_token=on_token, max_steps=max_steps)
+
+async def call_multiagent_async(model, user_prompt: str, tools: Dict[str, Any], max_steps: int = 6,
+                                on_token=None) -> Dict[str, Any]:
+    engine = ENGINE if set(tools) == set(AGENTS.specs) else ENGINE.with_tools(tools)
+    return await engine.arun(user_prompt, tools, model=model, on_token=on_token, max_steps=max_steps)
 
 # --- Wrappers for tools ---
-def hotel_agent(lat, lng, limit=5):
-    return search_hotels(lat, lng, limit=limit)
+def make_agent_tools(toolset=travel_tools):
+    """Bind the agent tools to a toolset (travel_tools or pipeline.SharedToolResults)."""
+    def hotel_agent(lat, lng, limit=5):
+        return toolset.search_hotels(lat, lng, limit=limit)
 
-def attraction_agent(lat, lng, limit=5):
-    return search_attractions(lat, lng, limit=limit)
+    def attraction_agent(lat, lng, limit=5):
+        return toolset.search_attractions(lat, lng, limit=limit)
 
-def weather_agent(lat, lng, days=5):
-    return get_weather(lat, lng, days)
+    def weather_agent(lat, lng, days=5):
+        return toolset.get_weather(lat, lng, days)
 
-# --- Convenience wrapper ---
-def run_multiagent_dispatcher(query: str, lat: float, lng: float, days: int = 3):
-    model = genai.GenerativeModel("gemini-2.0-flash")
+    return {
+        "hotel_agent": hotel_agent,
+        "attraction_agent": attraction_agent,
+        "weather_agent": weather_agent,
+    }
+
+def make_async_agent_tools():
+    async def hotel_agent(lat, lng, limit=5):
+        return await travel_tools.search_hotels_async(lat, lng, limit=limit)
 
-    tools = {
+    async def attraction_agent(lat, lng, limit=5):
+        return await travel_tools.search_attractions_async(lat, lng, limit=limit)
+
+    async def weather_agent(lat, lng, days=5):
+        return await travel_tools.get_weather_async(lat, lng, days)
+
+    return {
         "hotel_agent": hotel_agent,
         "attraction_agent": attraction_agent,
         "weather_agent": weather_agent,
     }
 
-    result = call_multiagent(model, f"Plan a {days}-day trip to {query}", tools)
+# The agents over travel_tools itself, kept importable by name.
+_default_agents = make_agent_tools()
+hotel_agent = _default_agents["hotel_agent"]
+attraction_agent = _default_agents["attraction_agent"]
+weather_agent = _default_agents["weather_agent"]
+
+# --- Convenience wrapper ---
+def run_multiagent_dispatcher(query: str, lat: float, lng: float, days: int = 3, toolset=None, on_token=None):
+    tools = make_agent_tools(toolset or travel_tools)
+
+    result = ENGINE.run(_plan_prompt(query, lat, lng, days), tools, on_token=on_token)
+    return _finish(result)
+
+async def run_multiagent_dispatcher_async(query: str, lat: float, lng: float, days: int = 3, toolset=None,
+                                          on_token=None):
+    """Async run_multiagent_dispatcher; defaults to the async travel_tools."""
+    tools = make_async_agent_tools() if toolset is None else make_agent_tools(toolset)
+
+    result = await ENGINE.arun(_plan_prompt(query, lat, lng, days), tools, on_token=on_token)
+    return _finish(result)
+
+def _plan_prompt(query, lat, lng, days):
+    return f"Plan a {days}-day trip to {query}\nDestination coordinates: lat={lat}, lng={lng}."
 
+def _finish(result):
+    """The finished plan's text; DispatchFailed when the model never got there."""
     if "done" in result and result["done"]:
         return result["result"]
-    return f"⚠️ Multi-Agent dispatch failed: {result}"
+    raise DispatchFailed(result)
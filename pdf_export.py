@@ -0,0 +1,172 @@
+# pdf_export.py
+import hashlib
+import io
+import json
+import os
+import time
+
+from tool_cache import LRUStore
+
+# reportlab is imported on the first export, not at startup.
+
+MARGIN = 50
+BOTTOM = 50
+LINE_HEIGHT = 20
+BODY_SIZE = 11
+
+# Unicode TTF fonts, (regular, bold), tried in order; reportlab's own Vera is
+# the last one. PDF_FONT points at another .ttf (e.g. a CJK font).
+FONT_FILES = (
+    (os.getenv("PDF_FONT"), os.getenv("PDF_FONT_BOLD")),
+    ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"),
+    ("/Library/Fonts/Arial Unicode.ttf", None),
+    ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf"),
+    ("Vera.ttf", "VeraBd.ttf"),
+)
+# Plain-text stand-ins for symbols the font has no glyph for; anything else becomes "?".
+SYMBOL_TEXT = {"⚠": "(!)", "❌": "(x)", "✅": "(ok)", "✔": "(ok)", "★": "*", "•": "-", "–": "-", "—": "-"}
+# Emoji presentation selectors and joiners: invisible, so just dropped.
+INVISIBLE = {"\ufe0e", "\ufe0f", "\u200d"}
+
+# Rendered PDFs per plan content; small, the bytes can be a few hundred KB.
+PDF_CACHE_SIZE = 32
+PDF_CACHE_TTL = 6 * 3600
+_pdf_cache = LRUStore(PDF_CACHE_SIZE)
+
+
+_fonts = None
+
+
+def _font_names():
+    """(regular, bold) font names: the first TTF from FONT_FILES that loads, else core Helvetica."""
+    global _fonts
+    if _fonts is None:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        fonts = ("Helvetica", "Helvetica-Bold")
+        for regular, bold in FONT_FILES:
+            try:
+                pdfmetrics.registerFont(TTFont("PlanSans", regular))
+                pdfmetrics.registerFont(TTFont("PlanSans-Bold", bold or regular))
+            except Exception:
+                continue
+            fonts = ("PlanSans", "PlanSans-Bold")
+            break
+        _fonts = fonts
+    return _fonts
+
+
+def _printable(text, font):
+    """`text` with the characters `font` has no glyph for replaced by plain-text stand-ins."""
+    from reportlab.pdfbase import pdfmetrics
+
+    face = getattr(pdfmetrics.getFont(font), "face", None)
+    glyphs = getattr(face, "charToGlyph", None)
+
+    def has_glyph(ch):
+        if glyphs is not None:
+            return ord(ch) in glyphs
+        try:
+            ch.encode("cp1252")   # core fonts only cover WinAnsi
+            return True
+        except UnicodeEncodeError:
+            return False
+
+    out = []
+    for ch in text:
+        if ch in INVISIBLE:
+            continue
+        if not has_glyph(ch):
+            ch = SYMBOL_TEXT.get(ch, "?")
+        out.append(ch)
+    return "".join(out)
+
+
+class _PdfWriter:
+    """Top-down text flow on a canvas: wraps long lines and starts new pages as needed."""
+
+    def __init__(self, c, pagesize):
+        from reportlab.lib.utils import simpleSplit
+
+        self.c = c
+        self.width, self.height = pagesize
+        self.split = simpleSplit
+        self.y = self.height - MARGIN
+        self.font, self.bold = _font_names()
+
+    def _ensure_room(self, needed):
+        if self.y - needed < BOTTOM:
+            self.c.showPage()
+            self.y = self.height - MARGIN
+
+    def heading(self, text, size=14):
+        self.y -= LINE_HEIGHT
+        self._ensure_room(LINE_HEIGHT)
+        self.c.setFont(self.bold, size)
+        self.c.drawString(MARGIN, self.y, _printable(text, self.bold))
+        self.y -= LINE_HEIGHT
+
+    def text(self, text, indent=10, size=BODY_SIZE):
+        x = MARGIN + indent
+        text = _printable(text, self.font)
+        for line in self.split(text, self.font, size, self.width - x - MARGIN) or [""]:
+            self._ensure_room(0)
+            self.c.setFont(self.font, size)
+            self.c.drawString(x, self.y, line)
+            self.y -= LINE_HEIGHT
+
+
+# --- PDF Export ---
+def export_pdf(reply, hotels, attractions, weather, query, days, file_path=None):
+    """Render the plan into memory and return the PDF bytes (also written to `file_path` if given)."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    w = _PdfWriter(c, A4)
+
+    c.setFont(w.bold, 16)
+    c.drawString(MARGIN, w.y, "Smart Travel AI Assistant")
+    w.y -= 30
+    w.text(f"Query: {query}", indent=0, size=12)
+    w.text(f"Days: {days}", indent=0, size=12)
+
+    w.heading("Hotels Nearby")
+    for h in hotels:
+        w.text(f"- {h['name']} | Rating: {h.get('rating','N/A')}")
+
+    w.heading("Attractions Nearby")
+    for a in attractions:
+        w.text(f"- {a['name']} | Rating: {a.get('rating','N/A')}")
+
+    w.heading("Weather Forecast")
+    for d in weather:
+        rain = f"{d['rain']}%" if d.get("rain") is not None else "N/A"
+        w.text(f"{d['day']}: {d['min_temp']}°C - {d['max_temp']}°C, Rain: {rain}")
+
+    w.heading("AI Suggested Itinerary")
+    for line in reply.split("\n"):
+        if line.strip():
+            w.text(line)
+
+    c.save()
+    pdf = buf.getvalue()
+    if file_path:
+        with open(file_path, "wb") as f:
+            f.write(pdf)
+    return pdf
+
+
+def cached_pdf(reply, hotels, attractions, weather, query, days):
+    """export_pdf memoized on the plan content, so repeated downloads render once."""
+    key = hashlib.sha1(
+        json.dumps([reply, hotels, attractions, weather, query, days], default=str).encode()
+    ).hexdigest()
+    item = _pdf_cache.get(key)
+    if item is not None:
+        return item[1]
+    pdf = export_pdf(reply, hotels, attractions, weather, query, days)
+    _pdf_cache.set(key, pdf, time.time() + PDF_CACHE_TTL)
+    return pdf
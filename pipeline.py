@@ -0,0 +1,217 @@
+# pipeline.py
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from threading import Lock
+
+import gazetteer
+import rate_limiter
+import tool_cache
+import travel_tools
+
+# Places returns at most 20 results per page whatever `limit` is, so we
+# always fetch a full page once and slice it locally for every caller
+# (larger limits page through travel_tools.iter_places).
+PLACES_PAGE_SIZE = travel_tools.PLACES_PAGE_SIZE
+# Forecasts are fetched for the trip length, but at least for the tools'
+# default horizon, which the dispatchers ask for when the model omits `days`.
+WEATHER_DEFAULT_DAYS = 5
+WEATHER_HORIZON_DAYS = travel_tools.MAX_FORECAST_DAYS
+# ~100 m: coordinates the model echoes back are often rounded.
+COORD_TOLERANCE = 1e-3
+
+# Shared by every request in the process; tool fetches are I/O bound.
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="travel-pipeline")
+# Dispatchers wait on tool futures, so they get their own pool to avoid
+# starving the fetches they are waiting for.
+_dispatch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="travel-dispatch")
+
+
+def submit_dispatch(fn, *args, **kwargs):
+    """Run a dispatcher (or anything else that waits on tool futures) in the background."""
+    return rate_limiter.submit(_dispatch_executor, fn, *args, **kwargs)
+
+
+# --- Stage timings ---
+class StageTimer:
+    """Collect wall-clock durations (in seconds) per pipeline stage."""
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._lock = Lock()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def mark(self, name):
+        """Record the time since the timer started, once (e.g. time-to-first-content)."""
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = time.perf_counter() - self._start
+
+    def timed(self, name, fn, *args, **kwargs):
+        with self.stage(name):
+            return fn(*args, **kwargs)
+
+    def as_dict(self):
+        with self._lock:
+            out = {k: round(v, 3) for k, v in self.stages.items()}
+        out["total"] = round(time.perf_counter() - self._start, 3)
+        return out
+
+
+# --- Shared tool results ---
+def weather_days(days):
+    """Forecast days fetched for a trip of `days` days."""
+    return min(max(int(days), WEATHER_DEFAULT_DAYS), WEATHER_HORIZON_DAYS)
+
+
+def _same_point(lat, lng, other_lat, other_lng):
+    try:
+        return (math.isclose(float(lat), other_lat, abs_tol=COORD_TOLERANCE)
+                and math.isclose(float(lng), other_lng, abs_tol=COORD_TOLERANCE))
+    except (TypeError, ValueError):
+        return False
+
+
+class SharedToolResults:
+    """
+    Request-scoped hotels, attractions and weather for one destination.
+
+    All three fetches start concurrently as soon as the object is created.
+    The methods mirror the signatures in travel_tools, so an instance can be
+    handed to the dispatchers as a toolset: calls for the same point are
+    answered from the in-flight results, anything else goes to the network.
+    """
+
+    def __init__(self, lat, lng, days, timer=None, executor=None):
+        self.lat, self.lng = lat, lng
+        self.days = weather_days(days)
+        self.timer = timer or StageTimer()
+        executor = executor or _executor
+
+        self._hotels = rate_limiter.submit(
+            executor, self.timer.timed, "hotels", travel_tools.search_hotels,
+            lat, lng, limit=PLACES_PAGE_SIZE,
+        )
+        self._attractions = rate_limiter.submit(
+            executor, self.timer.timed, "attractions", travel_tools.search_attractions,
+            lat, lng, limit=PLACES_PAGE_SIZE,
+        )
+        self._weather = rate_limiter.submit(
+            executor, self.timer.timed, "weather", travel_tools.get_weather,
+            lat, lng, self.days,
+        )
+
+    def futures(self):
+        """Name -> future, for callers that render each result as soon as it lands."""
+        return {"hotels": self._hotels, "attractions": self._attractions, "weather": self._weather}
+
+    def available(self, timeout=0):
+        """Name -> result of the fetches done within `timeout` seconds ([] for the rest and for failures)."""
+        futures = self.futures()
+        wait(futures.values(), timeout=timeout)
+        return {name: fut.result() if fut.done() and fut.exception() is None else []
+                for name, fut in futures.items()}
+
+    def hotels(self, limit):
+        return self._hotels.result()[:limit]
+
+    def attractions(self, limit):
+        return self._attractions.result()[:limit]
+
+    def weather(self, days):
+        return self._weather.result()[:days]
+
+    # --- travel_tools-compatible toolset ---
+    def search_hotels(self, lat, lng, radius=1500, limit=5):
+        if radius == 1500 and limit <= PLACES_PAGE_SIZE and _same_point(lat, lng, self.lat, self.lng):
+            return self.hotels(limit)
+        return travel_tools.search_hotels(lat, lng, radius=radius, limit=limit)
+
+    def search_attractions(self, lat, lng, radius=2000, limit=5):
+        if radius == 2000 and limit <= PLACES_PAGE_SIZE and _same_point(lat, lng, self.lat, self.lng):
+            return self.attractions(limit)
+        return travel_tools.search_attractions(lat, lng, radius=radius, limit=limit)
+
+    def get_weather(self, lat, lon, days=5):
+        if days <= self.days and _same_point(lat, lon, self.lat, self.lng):
+            return self.weather(days)
+        return travel_tools.get_weather(lat, lon, days)
+
+
+# --- Whole-plan memoization ---
+# Plans live in the shared tool cache (memory + optional SQLite tier), so they
+# are reused across Streamlit reruns, sessions and workers.
+PLAN_CACHE_NAME = "travel_plan"
+# Bumped when the shape of a stored plan changes (2: numeric rain probability).
+PLAN_FORMAT = 2
+
+
+def plan_mode(use_multiagent=False, single_shot=False):
+    if single_shot:
+        return "single_shot"
+    return "multiagent" if use_multiagent else "gemini"
+
+
+def plan_key(query, days, mode):
+    """
+    Key on what changes the itinerary; list sizes are sliced at render time.
+    The destination is the one gazetteer.destination() reads from the query,
+    so "Plan a trip to Paris" and "Paris" share a plan.
+    """
+    words, _ = gazetteer.destination(query)
+    place = gazetteer.normalize(" ".join(words)) or " ".join(query.lower().split())
+    return PLAN_CACHE_NAME + ":" + json.dumps([place, int(days), mode, PLAN_FORMAT])
+
+
+def cached_plan(key):
+    hit, plan = tool_cache.cache.get(key)
+    return plan if hit else None
+
+
+def store_plan(key, plan):
+    tool_cache.cache.set(PLAN_CACHE_NAME, key, plan)
+
+
+def plan_events(plan):
+    """Replay a stored plan in the same (kind, payload) shape travel_agent_events yields."""
+    yield "location", plan["location"]
+    for name in ("hotels", "attractions", "weather"):
+        yield name, plan[name]
+    yield "itinerary", plan["itinerary"]
+
+
+# --- Latency summaries ---
+def percentile(values, q):
+    """Linear-interpolated percentile, q in [0, 100]."""
+    values = sorted(values)
+    if not values:
+        return None
+    pos = (len(values) - 1) * q / 100
+    lo, hi = math.floor(pos), math.ceil(pos)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def latency_summary(samples, quantiles=(50, 90, 99)):
+    """Per-stage percentiles (seconds) over a list of StageTimer.as_dict() results."""
+    stages = {}
+    for timings in samples:
+        for stage, seconds in timings.items():
+            stages.setdefault(stage, []).append(seconds)
+    return {
+        stage: dict({"count": len(v)}, **{f"p{q}": round(percentile(v, q), 3) for q in quantiles})
+        for stage, v in stages.items()
+    }
@@ -0,0 +1,288 @@
+# poi_store.py
+"""
+Every place a nearby search returned, with coordinates, rating, type and
+fetch time, in a grid index. A later search over an area we have already
+fetched (for the same type) is answered from here, ranked by rating and
+distance; only searches reaching outside the fetched areas go to the API.
+An area whose search stopped before the last result page only answers
+searches asking for no more places than it fetched.
+
+    POI_STORE_PATH=/mnt/cache/poi.sqlite   # optional, persists across restarts
+    POI_TTL=86400                          # seconds a fetched place / area stays usable
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+# Grid cells in degrees: places in ~1 km cells, fetched areas in ~11 km cells.
+CELL_DEG = 0.01
+AREA_CELL_DEG = 0.1
+EARTH_RADIUS_M = 6371000
+METERS_PER_DEG = 111320
+
+POI_TTL = int(os.getenv("POI_TTL", str(24 * 3600)))
+DISK_PATH = os.getenv("POI_STORE_PATH")
+
+# A place at the edge of the search radius ranks this many stars below one at the centre.
+DISTANCE_PENALTY = 1.0
+# Points on the query circle's rim that must lie in a fetched area (plus the centre).
+RIM_SAMPLES = 8
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _span(lat, radius):
+    """Half-width of the bounding box of a circle, in degrees (lat, lng)."""
+    dlat = radius / METERS_PER_DEG
+    return dlat, dlat / max(math.cos(math.radians(lat)), 0.01)
+
+
+def _cells(lat, lng, radius, size):
+    dlat, dlng = _span(lat, radius)
+    for x in range(math.floor((lat - dlat) / size), math.floor((lat + dlat) / size) + 1):
+        for y in range(math.floor((lng - dlng) / size), math.floor((lng + dlng) / size) + 1):
+            yield x, y
+
+
+def place_key(raw):
+    """Dedupe key for an API result: its place_id, else name and position."""
+    loc = raw["geometry"]["location"]
+    return raw.get("place_id") or f"{raw.get('name')}@{loc['lat']:.5f},{loc['lng']:.5f}"
+
+
+class PoiStore:
+    """Grid-indexed places and fetched areas, per place type; optionally mirrored to SQLite."""
+
+    def __init__(self, path=DISK_PATH, ttl=POI_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._places = {}                      # (kind, key) -> place dict
+        self._cells = defaultdict(set)         # (kind, x, y) -> {key}
+        self._areas = defaultdict(list)        # (kind, x, y) -> [area dict, see add_area]
+        self._counters = {"hits": 0, "misses": 0, "areas": 0}
+        self.path = path
+        self._local = threading.local()
+        if path:
+            self._load()
+
+    # --- Persistence ---
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def _load(self):
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS poi ("
+            "kind TEXT NOT NULL, key TEXT NOT NULL, name TEXT, rating REAL, "
+            "lat REAL NOT NULL, lng REAL NOT NULL, fetched_at REAL NOT NULL, PRIMARY KEY (kind, key))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS poi_area ("
+            "kind TEXT NOT NULL, lat REAL NOT NULL, lng REAL NOT NULL, radius REAL NOT NULL, "
+            "fetched_at REAL NOT NULL, fetched INTEGER NOT NULL DEFAULT 0, complete INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(poi_area)")}
+        for column in ("fetched", "complete"):
+            if column not in columns:   # files written before searches recorded how far they got
+                conn.execute(f"ALTER TABLE poi_area ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+        conn.commit()
+        since = time.time() - self.ttl
+        for kind, key, name, rating, lat, lng, fetched_at in conn.execute(
+            "SELECT kind, key, name, rating, lat, lng, fetched_at FROM poi WHERE fetched_at >= ?", (since,)
+        ):
+            self._index_place(kind, key, {"name": name, "rating": rating, "lat": lat, "lng": lng,
+                                          "fetched_at": fetched_at})
+        for rowid, kind, lat, lng, radius, fetched_at, fetched, complete in conn.execute(
+            "SELECT rowid, kind, lat, lng, radius, fetched_at, fetched, complete FROM poi_area "
+            "WHERE fetched_at >= ?", (since,)
+        ):
+            self._index_area(kind, {"lat": lat, "lng": lng, "radius": radius, "fetched_at": fetched_at,
+                                    "fetched": fetched, "complete": bool(complete), "rowid": rowid})
+
+    def _save(self, kind, places, area=None, new_area=False):
+        conn = self._conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO poi (kind, key, name, rating, lat, lng, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(kind, key, p["name"], p["rating"], p["lat"], p["lng"], p["fetched_at"]) for key, p in places],
+        )
+        if new_area:
+            area["rowid"] = conn.execute(
+                "INSERT INTO poi_area (kind, lat, lng, radius, fetched_at, fetched, complete) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, area["lat"], area["lng"], area["radius"], area["fetched_at"], area["fetched"],
+                 area["complete"]),
+            ).lastrowid
+        elif area is not None:
+            conn.execute("UPDATE poi_area SET fetched = ?, complete = ? WHERE rowid = ?",
+                         (area["fetched"], area["complete"], area.get("rowid")))
+        conn.commit()
+
+    # --- Index ---
+    def _index_place(self, kind, key, place):
+        old = self._places.get((kind, key))
+        if old is not None:
+            self._cells[(kind, math.floor(old["lat"] / CELL_DEG), math.floor(old["lng"] / CELL_DEG))].discard(key)
+        self._places[(kind, key)] = place
+        self._cells[(kind, math.floor(place["lat"] / CELL_DEG), math.floor(place["lng"] / CELL_DEG))].add(key)
+
+    def _index_area(self, kind, area):
+        for x, y in _cells(area["lat"], area["lng"], area["radius"], AREA_CELL_DEG):
+            self._areas[(kind, x, y)].append(area)
+        self._counters["areas"] += 1
+
+    def add_area(self, kind, lat, lng, radius, results, now=None, complete=False):
+        """
+        Record an API nearby search: the circle it covered and the raw places
+        of its first page. `complete` means there are no further pages. Returns
+        the area, for add_places.
+        """
+        now = now or time.time()
+        places = self._places_from(results, now)
+        area = {"lat": lat, "lng": lng, "radius": radius, "fetched_at": now,
+                "fetched": len(results), "complete": complete}
+        with self._lock:
+            for key, place in places:
+                self._index_place(kind, key, place)
+            self._index_area(kind, area)
+        if self.path:
+            self._save(kind, places, area, new_area=True)
+        return area
+
+    def add_places(self, kind, results, now=None, area=None, complete=False):
+        """Record raw places of an area already added (e.g. its further result pages)."""
+        places = self._places_from(results, now or time.time())
+        with self._lock:
+            for key, place in places:
+                self._index_place(kind, key, place)
+            if area is not None:
+                area["fetched"] += len(results)
+                area["complete"] = complete
+        if self.path:
+            self._save(kind, places, area)
+
+    @staticmethod
+    def _places_from(results, now):
+        places = []
+        for raw in results:
+            loc = raw["geometry"]["location"]
+            places.append((place_key(raw), {
+                "name": raw.get("name"), "rating": raw.get("rating"),
+                "lat": loc["lat"], "lng": loc["lng"], "fetched_at": now,
+            }))
+        return places
+
+    # --- Queries ---
+    def _in_fetched_area(self, kind, lat, lng, since, limit):
+        for area in self._areas.get((kind, math.floor(lat / AREA_CELL_DEG), math.floor(lng / AREA_CELL_DEG)), ()):
+            if (area["fetched_at"] >= since and (area["complete"] or area["fetched"] >= limit)
+                    and haversine_m(lat, lng, area["lat"], area["lng"]) <= area["radius"]):
+                return True
+        return False
+
+    def covered(self, kind, lat, lng, radius, limit=0):
+        """
+        Whether the circle lies within areas fetched for `kind` (centre and rim
+        points checked) whose searches went far enough for `limit` places.
+        """
+        since = time.time() - self.ttl
+        dlat, dlng = _span(lat, radius)
+        points = [(lat, lng)] + [
+            (lat + dlat * math.sin(2 * math.pi * i / RIM_SAMPLES), lng + dlng * math.cos(2 * math.pi * i / RIM_SAMPLES))
+            for i in range(RIM_SAMPLES)
+        ]
+        with self._lock:
+            return all(self._in_fetched_area(kind, p_lat, p_lng, since, limit) for p_lat, p_lng in points)
+
+    def within(self, kind, lat, lng, radius):
+        """[(distance_m, place)] of the fresh places of `kind` inside the circle."""
+        since = time.time() - self.ttl
+        dlat, dlng = _span(lat, radius)
+        out = []
+        with self._lock:
+            for x, y in _cells(lat, lng, radius, CELL_DEG):
+                for key in self._cells.get((kind, x, y), ()):
+                    place = self._places[(kind, key)]
+                    # Cheap bounding-box test before the exact distance.
+                    if (place["fetched_at"] < since or abs(place["lat"] - lat) > dlat
+                            or abs(place["lng"] - lng) > dlng):
+                        continue
+                    d = haversine_m(lat, lng, place["lat"], place["lng"])
+                    if d <= radius:
+                        out.append((d, place))
+        return out
+
+    def nearby(self, kind, lat, lng, radius, limit):
+        """
+        Up to `limit` places as the tools return them ({name, rating, lat, lng}),
+        ranked by rating less a distance penalty; None when the area was not
+        fetched yet, or not far enough for `limit`, or holds fewer than `limit`
+        places (the API may know more).
+        """
+        found = self.within(kind, lat, lng, radius) if self.covered(kind, lat, lng, radius, limit) else []
+        if len(found) < limit:
+            with self._lock:
+                self._counters["misses"] += 1
+            return None
+        with self._lock:
+            self._counters["hits"] += 1
+        found.sort(key=lambda dp: -((dp[1]["rating"] or 0) - DISTANCE_PENALTY * dp[0] / radius))
+        return [{"name": p["name"], "rating": p["rating"] if p["rating"] is not None else "N/A",
+                 "lat": p["lat"], "lng": p["lng"]} for _, p in found[:limit]]
+
+    # --- Maintenance ---
+    def purge_expired(self):
+        since = time.time() - self.ttl
+        with self._lock:
+            for (kind, key), place in list(self._places.items()):
+                if place["fetched_at"] < since:
+                    del self._places[(kind, key)]
+                    self._cells[(kind, math.floor(place["lat"] / CELL_DEG),
+                                 math.floor(place["lng"] / CELL_DEG))].discard(key)
+            for cell, areas in list(self._areas.items()):
+                self._areas[cell] = [a for a in areas if a["fetched_at"] >= since]
+        if self.path:
+            conn = self._conn()
+            conn.execute("DELETE FROM poi WHERE fetched_at < ?", (since,))
+            conn.execute("DELETE FROM poi_area WHERE fetched_at < ?", (since,))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._places.clear()
+            self._cells.clear()
+            self._areas.clear()
+            self._counters["areas"] = 0
+        if self.path:
+            conn = self._conn()
+            conn.execute("DELETE FROM poi")
+            conn.execute("DELETE FROM poi_area")
+            conn.commit()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._counters)
+            out["places"] = len(self._places)
+        return out
+
+    def __len__(self):
+        return len(self._places)
+
+
+store = PoiStore()
+
+
+def stats():
+    return store.stats()
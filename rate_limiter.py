@@ -0,0 +1,225 @@
+# rate_limiter.py
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# --- Budgets (override via env) ---
+MAPS_QPS = float(os.getenv("MAPS_QPS", "50"))              # googlemaps' own quota is 60 qps
+OPEN_METEO_QPS = float(os.getenv("OPEN_METEO_QPS", "10"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+# Output tokens are unknown up front; reserve this much per call on top of the prompt.
+GEMINI_OUTPUT_ESTIMATE = 1000
+
+UPSTREAM_HOSTS = {
+    "maps.googleapis.com": "maps",
+    "api.open-meteo.com": "open-meteo",
+}
+
+# --- Priorities (lower is served first) ---
+INTERACTIVE = 0
+BATCH = 1
+_priority = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level):
+    """Run the enclosed upstream calls at `level` (INTERACTIVE or BATCH)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that carries the caller's context (priority, plan deadline) into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# --- Token bucket ---
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n, now):
+        self._refill(now)
+        return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    def take(self, n):
+        self.tokens -= n
+
+
+# --- Scheduler ---
+class UpstreamScheduler:
+    """
+    Priority queue in front of one upstream's token buckets.
+
+    Callers block (or await) until every bucket can cover their cost and no
+    higher-priority or earlier caller is ahead of them, so bursts queue up
+    instead of turning into upstream 429s.
+    """
+
+    def __init__(self, name, **buckets):
+        self.name = name
+        self.buckets = buckets
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self.granted = 0
+        self._waits = deque(maxlen=1000)
+        self.max_wait = 0.0
+
+    def _cost(self, cost):
+        return {k: min(v, self.buckets[k].capacity) for k, v in cost.items() if k in self.buckets}
+
+    def _enqueue(self, cost):
+        ticket = [_priority.get(), next(self._seq), self._cost(cost), time.monotonic()]
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _try_grant(self, ticket):
+        """0 if granted, otherwise a hint (seconds) for how long to wait."""
+        with self._cond:
+            if self._queue[0] is not ticket:
+                return 0.01
+            now = time.monotonic()
+            wait = max([b.wait_time(ticket[2].get(k, 0), now) for k, b in self.buckets.items()] or [0.0])
+            if wait > 0:
+                return wait
+            for k, n in ticket[2].items():
+                self.buckets[k].take(n)
+            heapq.heappop(self._queue)
+            waited = now - ticket[3]
+            self.granted += 1
+            self._waits.append(waited)
+            self.max_wait = max(self.max_wait, waited)
+            self._cond.notify_all()
+            return 0.0
+
+    def _next_wait(self, ticket):
+        """0 once granted, else how long to wait; DeadlineExceeded if the plan's budget ends first."""
+        import resilience   # resilience imports this module
+
+        wait = self._try_grant(ticket)
+        left = resilience.remaining()
+        if wait and left is not None and wait > left - resilience.MIN_CALL_SECONDS:
+            raise resilience.DeadlineExceeded(f"plan budget spent queuing for {self.name}")
+        return wait
+
+    def acquire(self, **cost):
+        ticket = self._enqueue(cost)
+        try:
+            while True:
+                wait = self._next_wait(ticket)
+                if wait == 0:
+                    return
+                with self._cond:
+                    self._cond.wait(wait)
+        except BaseException:
+            self._withdraw(ticket)
+            raise
+
+    def try_acquire(self, **cost):
+        """Take `cost` only if nobody is queued and the buckets cover it now; never waits."""
+        cost = self._cost(cost)
+        with self._cond:
+            now = time.monotonic()
+            if self._queue or any(b.wait_time(cost.get(k, 0), now) for k, b in self.buckets.items()):
+                return False
+            for k, n in cost.items():
+                self.buckets[k].take(n)
+            self.granted += 1
+            return True
+
+    def _withdraw(self, ticket):
+        """Drop a caller that stopped waiting, so it does not block everyone queued behind it."""
+        with self._cond:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    async def acquire_async(self, **cost):
+        ticket = self._enqueue(cost)
+        try:
+            while True:
+                wait = self._next_wait(ticket)
+                if wait == 0:
+                    return
+                await asyncio.sleep(min(wait, 0.05))
+        except BaseException:
+            # out of time, or cancelled (e.g. the losing attempt of a hedged call)
+            self._withdraw(ticket)
+            raise
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            depth = len(self._queue)
+        pick = lambda q: round(waits[int((len(waits) - 1) * q)], 4) if waits else 0.0
+        return {
+            "queue_depth": depth,
+            "granted": self.granted,
+            "wait_p50": pick(0.5),
+            "wait_p95": pick(0.95),
+            "wait_max": round(self.max_wait, 4),
+        }
+
+
+schedulers = {
+    "maps": UpstreamScheduler("maps", requests=TokenBucket(MAPS_QPS)),
+    "open-meteo": UpstreamScheduler("open-meteo", requests=TokenBucket(OPEN_METEO_QPS)),
+    # Gemini budgets are per minute; allow bursts of ~10 s worth.
+    "gemini": UpstreamScheduler(
+        "gemini",
+        requests=TokenBucket(GEMINI_RPM / 60, capacity=max(GEMINI_RPM / 6, 1.0)),
+        tokens=TokenBucket(GEMINI_TPM / 60, capacity=GEMINI_TPM / 6),
+    ),
+}
+
+
+# --- Entry points ---
+def acquire(upstream, **cost):
+    scheduler = schedulers.get(upstream)
+    if scheduler is not None:
+        scheduler.acquire(**(cost or {"requests": 1}))
+
+
+async def acquire_async(upstream, **cost):
+    scheduler = schedulers.get(upstream)
+    if scheduler is not None:
+        await scheduler.acquire_async(**(cost or {"requests": 1}))
+
+
+def try_acquire(upstream, **cost):
+    """Spare budget for an optional call (e.g. a hedge): True if granted without waiting."""
+    scheduler = schedulers.get(upstream)
+    return scheduler is None or scheduler.try_acquire(**(cost or {"requests": 1}))
+
+
+def acquire_for_url(url):
+    acquire(UPSTREAM_HOSTS.get(urlsplit(url).hostname))
+
+
+def gemini_cost(prompt):
+    return {"requests": 1, "tokens": len(prompt) // 4 + GEMINI_OUTPUT_ESTIMATE}
+
+
+def stats():
+    return {name: s.stats() for name, s in schedulers.items()}
@@ -0,0 +1,291 @@
+# resilience.py
+"""
+Latency budgets, hedged calls and circuit breakers.
+
+    with resilience.deadline(30):      # everything below sees the same deadline, including
+        ...                            # work handed to rate_limiter.submit / asyncio tasks
+    resilience.timeout((3.05, 10))     # a request timeout cut to the time left
+    resilience.hedged(attempt)         # a duplicate after HEDGE_DELAY s; the first result wins
+
+The deadline travels in a contextvar, like rate_limiter's priority, so tools
+and LLM steps running on pool threads are held to their plan's budget.
+
+    PLAN_BUDGET=30        seconds per plan before the local itinerary is used
+    HEDGE_DELAY=4         seconds before a slow Gemini call gets a duplicate
+    BREAKER_FAILURES=5    consecutive failures that open an upstream's circuit
+    BREAKER_RESET=30      seconds an open circuit waits before letting one trial call through
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import rate_limiter
+import telemetry
+
+PLAN_BUDGET = float(os.getenv("PLAN_BUDGET", "30"))
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "4"))
+# The original call plus one duplicate.
+HEDGE_ATTEMPTS = 2
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+# With less than this left, a call is not worth starting.
+MIN_CALL_SECONDS = 0.05
+
+
+class DeadlineExceeded(TimeoutError):
+    """The plan's latency budget ran out."""
+
+
+class CircuitOpen(RuntimeError):
+    """The upstream failed repeatedly; calls fail fast until its circuit closes."""
+
+
+class Superseded(Exception):
+    """Another attempt of a hedged call already owns the output."""
+
+
+# --- Deadlines ---
+class Deadline:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() < MIN_CALL_SECONDS
+
+
+_deadline = contextvars.ContextVar("plan_deadline", default=None)
+
+
+@contextmanager
+def deadline(budget):
+    """Run the block (and the work it submits) under `budget`: seconds or a Deadline."""
+    d = budget if isinstance(budget, Deadline) else Deadline(budget)
+    token = _deadline.set(d)
+    try:
+        yield d
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left in the current budget, or None outside one."""
+    d = _deadline.get()
+    return None if d is None else d.remaining()
+
+
+def check(what="call"):
+    """Raise DeadlineExceeded when the current budget is spent."""
+    d = _deadline.get()
+    if d is not None and d.expired():
+        raise DeadlineExceeded(f"plan budget of {d.seconds:g}s spent before {what}")
+
+
+def timeout(cap):
+    """`cap` (seconds, or a (connect, read) pair) cut to the time left in the current budget."""
+    left = remaining()
+    if left is None:
+        return cap
+    if isinstance(cap, tuple):
+        return tuple(min(c, left) for c in cap)
+    return left if cap is None else min(cap, left)
+
+
+# --- Circuit breakers ---
+class CircuitBreaker:
+    """
+    Closed until `failures` calls in a row fail, then open: calls fail fast
+    for `reset_after` seconds, after which one trial call (half-open)
+    decides whether it closes again.
+    """
+
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.name = name
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self._lock = threading.Lock()
+        self._failed = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self.trips = 0
+
+    def before(self):
+        """Raise CircuitOpen unless a call may go out now."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state, self._trial = "half_open", False
+            if self.state == "closed" or (self.state == "half_open" and not self._trial):
+                self._trial = self.state == "half_open"
+                return
+        raise CircuitOpen(f"{self.name} circuit open after {self.failures} failures")
+
+    def record(self, error=None):
+        """Outcome of a call let through by before(): None for success, else the exception / reason."""
+        if error is not None and _not_upstreams_fault(error):
+            with self._lock:
+                self._trial = False
+            return
+        with self._lock:
+            self._trial = False
+            if error is None:
+                self.state, self._failed = "closed", 0
+                return
+            self._failed += 1
+            if self.state == "half_open" or (self.state == "closed" and self._failed >= self.failures):
+                self.state, self._opened_at = "open", time.monotonic()
+                self.trips += 1
+                telemetry.CIRCUIT_TRIPS.inc(upstream=self.name)
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self._failed, "trips": self.trips}
+
+
+def _not_upstreams_fault(error):
+    # Budget / breaker errors, cancelled hedges, and timeouts we shortened to
+    # fit the budget say nothing about the upstream's health.
+    if isinstance(error, (DeadlineExceeded, CircuitOpen, Superseded)):
+        return True
+    if isinstance(error, BaseException) and not isinstance(error, Exception):
+        return True
+    left = remaining()
+    return left is not None and left < MIN_CALL_SECONDS
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(upstream):
+    b = _breakers.get(upstream)
+    if b is None:
+        with _breakers_lock:
+            b = _breakers.setdefault(upstream, CircuitBreaker(upstream))
+    return b
+
+
+def stats():
+    return {name: b.stats() for name, b in list(_breakers.items())}
+
+
+class _Outcome:
+    def __init__(self):
+        self.error = None
+
+    def fail(self, reason):
+        """Count the call as failed although it returned (e.g. an HTTP 503)."""
+        self.error = reason
+
+
+@contextmanager
+def guarded(upstream):
+    """Fail fast while `upstream`'s circuit is open; the block's outcome feeds its breaker."""
+    b = breaker(upstream)
+    b.before()
+    outcome = _Outcome()
+    try:
+        yield outcome
+    except BaseException as e:
+        b.record(e)
+        raise
+    b.record(outcome.error)
+
+
+# --- Hedged calls ---
+_hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+
+def _claims():
+    owner, lock = [], threading.Lock()
+
+    def claim_for(i):
+        def claim():
+            with lock:
+                if not owner:
+                    owner.append(i)
+                return owner[0] == i
+        return claim
+    return claim_for
+
+
+def hedged(attempt, delay=HEDGE_DELAY, attempts=HEDGE_ATTEMPTS, spare=None, name="gemini"):
+    """
+    Call attempt(claim) and, when it is still running after `delay` seconds
+    (or failed), once more; the first attempt to succeed wins. `spare()` is
+    asked before each duplicate and vetoes it when the upstream has no
+    budget to spare (see rate_limiter.try_acquire). A streaming attempt calls
+    claim() before emitting output and raises Superseded when it returns
+    False, so only one attempt ever streams. Waits no longer than the current
+    deadline.
+    """
+    claim_for = _claims()
+    pending, done, error, started = set(), set(), None, 0
+    while True:
+        if started == 0 or (started < attempts and (not pending or not done)):
+            if started and spare is not None and not spare():
+                attempts = started   # no budget for a duplicate: wait for what is running
+            else:
+                if started:
+                    telemetry.LLM_HEDGES.inc(upstream=name)
+                pending.add(rate_limiter.submit(_hedge_pool, attempt, claim_for(started)))
+                started += 1
+        if not pending:
+            raise error
+        done, pending = wait(pending, timeout=_wait_for(delay, started < attempts),
+                             return_when=FIRST_COMPLETED)
+        for fut in done:
+            try:
+                return fut.result()
+            except Superseded:
+                pass
+            except Exception as e:
+                error = e
+        check("the call finished")
+
+
+async def ahedged(attempt, delay=HEDGE_DELAY, attempts=HEDGE_ATTEMPTS, spare=None, name="gemini"):
+    """Async hedged(): `attempt` is a coroutine function; the losing attempt is cancelled."""
+    claim_for = _claims()
+    pending, done, error, started = set(), set(), None, 0
+    try:
+        while True:
+            if started == 0 or (started < attempts and (not pending or not done)):
+                if started and spare is not None and not spare():
+                    attempts = started
+                else:
+                    if started:
+                        telemetry.LLM_HEDGES.inc(upstream=name)
+                    pending.add(asyncio.ensure_future(attempt(claim_for(started))))
+                    started += 1
+            if not pending:
+                raise error
+            done, pending = await asyncio.wait(pending, timeout=_wait_for(delay, started < attempts),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    return task.result()
+                except Superseded:
+                    pass
+                except Exception as e:
+                    error = e
+            check("the call finished")
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _wait_for(delay, can_hedge):
+    # Until the next hedge is due, capped by the deadline; None waits for a result.
+    wait_for = delay if can_hedge else None
+    left = remaining()
+    if left is not None:
+        wait_for = left if wait_for is None else min(wait_for, left)
+    return wait_for
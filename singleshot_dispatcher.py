@@ -0,0 +1,62 @@
+# singleshot_dispatcher.py
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import backends
+import rate_limiter
+import telemetry
+import travel_tools
+from dispatch_engine import generate
+from dispatch_history import compact
+from function_dispatcher import CleanOutputStream, clean_output
+
+INSTRUCTION = (
+    "You are a travel planner AI. Using ONLY the data below, write the final itinerary "
+    "as plain text (no JSON).\n\n"
+    "IMPORTANT:\n"
+    "- Do NOT include lat/lng or technical details in the final plan.\n"
+    "- Write the itinerary in long, rich paragraphs (morning, afternoon, evening), one section per day.\n"
+    "- Hotels and weather should be summarized in natural language, no raw data.\n"
+    "- Aim for a detailed travel blog style itinerary with context and flow."
+)
+
+
+# --- Single-shot planner ---
+def fetch_trip_data(lat, lng, days, toolset=None):
+    """Fetch hotels, attractions and weather in parallel (the calls the LLM loop would make)."""
+    toolset = toolset or travel_tools
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        hotels = rate_limiter.submit(pool, toolset.search_hotels, lat, lng)
+        attractions = rate_limiter.submit(pool, toolset.search_attractions, lat, lng)
+        weather = rate_limiter.submit(pool, toolset.get_weather, lat, lng, days)
+        return {
+            "hotels": hotels.result(),
+            "attractions": attractions.result(),
+            "weather": weather.result(),
+        }
+
+
+def build_prompt(query: str, days: int, data) -> str:
+    return (
+        INSTRUCTION
+        + f"\n\nUser: {query}\nTrip length: {days} days.\n\n"
+        + "\n".join(f"{k}: {json.dumps(compact(v), separators=(',', ':'), ensure_ascii=False)}"
+                    for k, v in data.items())
+    )
+
+
+def call_singleshot(model, prompt: str, on_token=None) -> str:
+    """Raw reply text; streamed tokens are already cleaned like the final plan (see CleanOutputStream)."""
+    return generate(model, prompt, on_token, step=1, stream_cls=CleanOutputStream)
+
+
+# --- Convenience wrapper ---
+def run_singleshot_dispatcher(query: str, lat: float, lng: float, days: int = 3, toolset=None, on_token=None):
+    """
+    Deterministic "prefetch then write" planning: no tool-calling loop, the
+    tool data is embedded up front and Gemini is called exactly once.
+    """
+    model = backends.gemini_model("gemini-2.0-flash")
+    with telemetry.span("singleshot"):
+        data = fetch_trip_data(lat, lng, days, toolset)
+        return clean_output(call_singleshot(model, build_prompt(query, days, data), on_token))
@@ -0,0 +1,388 @@
+# telemetry.py
+"""
+Traces and metrics for plans, tool calls, upstream requests and Gemini turns.
+
+- Spans: `with telemetry.span("tool.search_hotels", lat=...) as s: ... s.set(cache_hit=True)`.
+  The current span is a contextvar, so children started in pool threads
+  (rate_limiter.submit, asyncio.to_thread) attach to the right parent. Every
+  finished trace is kept in memory (recent_traces()), optionally appended to
+  TRACE_FILE as one JSON line, and mirrored to OpenTelemetry when the SDK is
+  installed and OTEL_EXPORTER_OTLP_ENDPOINT is set.
+- Metrics: counters and latency histograms, rendered by prometheus_text();
+  METRICS_PORT serves them on /metrics.
+
+All attribute values, log lines and error strings pass through redact(), so
+API keys never end up in traces, logs or user-facing messages.
+"""
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+TRACE_FILE = os.getenv("TRACE_FILE")
+METRICS_PORT = os.getenv("METRICS_PORT")
+RECENT_TRACES = 50
+# Spans that finish after their root (rare) would otherwise pile up.
+MAX_OPEN_TRACES = 1000
+
+# Seconds; tool calls sit at the low end, Gemini turns at the high end.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+# --- Redaction ---
+_SECRETS = [
+    (re.compile(r"((?:api_?)?key=)[^&\s\"']+", re.I), r"\1REDACTED"),
+    (re.compile(r"AIza[0-9A-Za-z_\-]{20,}"), "AIza-REDACTED"),
+]
+
+
+def redact(value):
+    """Strip API keys from a string (other values are returned unchanged)."""
+    if not isinstance(value, str):
+        return value
+    for pattern, repl in _SECRETS:
+        value = pattern.sub(repl, value)
+    return value
+
+
+class RedactingFilter(logging.Filter):
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = ()
+        return True
+
+
+def configure_logging(path=None, level=logging.INFO):
+    """Log to `path` (or stderr) with keys redacted, e.g. when debugging urllib3 traffic."""
+    handler = logging.FileHandler(path) if path else logging.StreamHandler()
+    handler.addFilter(RedactingFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
+
+
+# --- Metrics ---
+def _labels_text(labels):
+    return ",".join(f'{k}="{v}"' for k, v in labels)
+
+
+def _sample(name, labels, value):
+    return f"{name}{{{_labels_text(labels)}}} {value}" if labels else f"{name} {value}"
+
+
+class Counter:
+    def __init__(self, name, doc):
+        self.name, self.doc = name, doc
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.samples().items()):
+            lines.append(_sample(self.name, key, value))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, doc, buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.buckets = name, doc, buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    def samples(self):
+        with self._lock:
+            return {k: (list(c), s, n) for k, (c, s, n) in self._values.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, n) in sorted(self.samples().items()):
+            base = _labels_text(key)
+            sep = "," if base else ""
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {n}')
+            lines.append(_sample(self.name + "_sum", key, round(total, 6)))
+            lines.append(_sample(self.name + "_count", key, n))
+        return lines
+
+
+PLANS = Counter("travel_plans_total", "Plans requested, by mode and outcome.")
+PLAN_SECONDS = Histogram("travel_plan_seconds", "End-to-end plan latency.")
+TOOL_CALLS = Counter("travel_tool_calls_total", "Tool executions, by tool, cache result and outcome.")
+TOOL_SECONDS = Histogram("travel_tool_seconds", "Tool execution latency (including cache hits).")
+UPSTREAM_REQUESTS = Counter("travel_upstream_requests_total", "HTTP requests, by upstream and status.")
+UPSTREAM_SECONDS = Histogram("travel_upstream_seconds", "HTTP request latency, by upstream.")
+LLM_CALLS = Counter("travel_llm_calls_total", "Gemini generate calls, by outcome.")
+LLM_SECONDS = Histogram("travel_llm_seconds", "Gemini generate latency.")
+LLM_PROMPT_TOKENS = Counter("travel_llm_prompt_tokens_total", "Estimated prompt tokens sent to Gemini.")
+LLM_RESPONSE_CHARS = Counter("travel_llm_response_chars_total", "Characters received from Gemini.")
+LLM_HEDGES = Counter("travel_llm_hedges_total", "Duplicate requests sent for slow or failed Gemini calls.")
+CIRCUIT_TRIPS = Counter("travel_circuit_trips_total", "Circuit breakers opened, by upstream.")
+
+METRICS = [PLANS, PLAN_SECONDS, TOOL_CALLS, TOOL_SECONDS, UPSTREAM_REQUESTS, UPSTREAM_SECONDS,
+           LLM_CALLS, LLM_SECONDS, LLM_PROMPT_TOKENS, LLM_RESPONSE_CHARS, LLM_HEDGES, CIRCUIT_TRIPS]
+
+
+def prometheus_text():
+    return "\n".join(line for m in METRICS for line in m.render()) + "\n"
+
+
+def serve_metrics(port):
+    """Serve prometheus_text() on http://0.0.0.0:<port>/metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = prometheus_text().encode()
+            self.send_response(200 if self.path == "/metrics" else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.end_headers()
+            if self.path == "/metrics":
+                self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", int(port)), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
+
+
+# --- Tracing ---
+_current = contextvars.ContextVar("telemetry_span", default=None)
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_open = {}                                  # trace_id -> finished spans so far
+_recent = deque(maxlen=RECENT_TRACES)
+
+
+class Span:
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.span_id = next(_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else f"{int(time.time() * 1000):x}-{self.span_id}"
+        self.attributes = {}
+        self.status = "ok"
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration = None
+        self._otel = _otel_start(name, parent)
+        self.set(**attributes)
+
+    def set(self, **attributes):
+        for k, v in attributes.items():
+            self.attributes[k] = redact(v)
+        if self._otel is not None:
+            self._otel.set_attributes({k: v for k, v in self.attributes.items()
+                                       if isinstance(v, (str, bool, int, float))})
+        return self
+
+    def fail(self, error):
+        self.status = "error"
+        self.set(error=f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error))
+
+    def as_dict(self):
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "start": round(self.start, 6),
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "status": self.status, "attributes": self.attributes,
+        }
+
+
+@contextmanager
+def span(name, **attributes):
+    parent = _current.get()
+    s = Span(name, parent, attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            s.fail(e)
+        raise
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Finished in another context (e.g. a generator resumed elsewhere).
+            _current.set(parent)
+        _finish(s, root=parent is None)
+
+
+def current_span():
+    return _current.get()
+
+
+def annotate(**attributes):
+    """Set attributes on the current span, if any."""
+    s = _current.get()
+    if s is not None:
+        s.set(**attributes)
+
+
+def _finish(s, root):
+    s.duration = time.perf_counter() - s._t0
+    if s._otel is not None:
+        if s.status == "error":
+            from opentelemetry.trace import Status, StatusCode
+            s._otel.set_status(Status(StatusCode.ERROR, s.attributes.get("error")))
+        s._otel.end()
+    with _lock:
+        spans = _open.setdefault(s.trace_id, [])
+        spans.append(s.as_dict())
+        if not root:
+            if len(_open) > MAX_OPEN_TRACES:
+                del _open[next(iter(_open))]
+            return
+        del _open[s.trace_id]
+        trace = {"trace_id": s.trace_id, "name": s.name, "duration": round(s.duration, 6),
+                 "spans": sorted(spans, key=lambda d: d["start"])}
+        _recent.append(trace)
+    if TRACE_FILE:
+        with _lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trace, default=str) + "\n")
+
+
+def traced(tool_name):
+    """Run a tool (sync or async) in a "tool.<name>" span and record its metrics."""
+    def decorator(fn):
+        def done(s, t0, outcome):
+            hit = s.attributes.get("cache_hit")
+            TOOL_CALLS.inc(tool=tool_name, cache="none" if hit is None else ("hit" if hit else "miss"),
+                           outcome=outcome)
+            TOOL_SECONDS.observe(time.perf_counter() - t0, tool=tool_name)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                with span("tool." + tool_name, args=_args_text(args, kwargs)) as s:
+                    try:
+                        result = await fn(*args, **kwargs)
+                    except Exception:
+                        done(s, t0, "error")
+                        raise
+                    done(s, t0, "ok" if result is not None else "empty")
+                    return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            with span("tool." + tool_name, args=_args_text(args, kwargs)) as s:
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception:
+                    done(s, t0, "error")
+                    raise
+                done(s, t0, "ok" if result is not None else "empty")
+                return result
+        return wrapper
+    return decorator
+
+
+def _args_text(args, kwargs):
+    text = ", ".join([repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()])
+    return text if len(text) <= 200 else text[:200] + "..."
+
+
+@contextmanager
+def llm_call(model, prompt, step=None):
+    """Span + metrics around one Gemini generate call; set `response_chars` on the yielded span."""
+    from dispatch_history import estimate_tokens
+
+    t0 = time.perf_counter()
+    tokens = estimate_tokens(prompt)
+    with span("llm.generate", model=getattr(model, "model_name", type(model).__name__), step=step,
+              prompt_chars=len(prompt), prompt_tokens=tokens) as s:
+        try:
+            yield s
+        except Exception:
+            LLM_CALLS.inc(outcome="error")
+            raise
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - t0)
+            LLM_PROMPT_TOKENS.inc(tokens)
+        LLM_CALLS.inc(outcome="ok")
+        LLM_RESPONSE_CHARS.inc(s.attributes.get("response_chars", 0))
+
+
+@contextmanager
+def upstream_call(upstream, method, url):
+    """Span + metrics around one HTTP request; set `status` on the yielded span."""
+    parent = _current.get()
+    t0 = time.perf_counter()
+    with span("http." + upstream, method=method, url=url) as s:
+        try:
+            yield s
+        finally:
+            status = s.attributes.get("status", "error")
+            UPSTREAM_REQUESTS.inc(upstream=upstream, status=status)
+            UPSTREAM_SECONDS.observe(time.perf_counter() - t0, upstream=upstream)
+            if parent is not None:
+                parent.set(upstream_status=status)
+
+
+def recent_traces():
+    with _lock:
+        return list(_recent)
+
+
+# --- OpenTelemetry bridge (optional) ---
+_otel_tracer = None
+if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+    try:
+        from opentelemetry import trace as _otel_trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        _provider = TracerProvider(resource=Resource.create({"service.name": "travel-ai-assistant"}))
+        _provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        _otel_tracer = _provider.get_tracer("travel-ai-assistant")
+    except ImportError:
+        logging.getLogger(__name__).warning("OTEL_EXPORTER_OTLP_ENDPOINT set but opentelemetry-sdk is missing")
+
+
+def _otel_start(name, parent):
+    if _otel_tracer is None:
+        return None
+    context = None
+    if parent is not None and parent._otel is not None:
+        context = _otel_trace.set_span_in_context(parent._otel)
+    return _otel_tracer.start_span(name, context=context)
+
+
+if METRICS_PORT:
+    serve_metrics(METRICS_PORT)
@@ -0,0 +1,94 @@
+# template_plan.py
+"""
+A day-by-day itinerary assembled locally from the hotels, attractions and
+weather already fetched: no LLM call, so it is ready in microseconds. Plans
+fall back to it when Gemini fails or the plan's latency budget runs out.
+
+The best rated hotel is the base. Attractions are spread over the days best
+rated first, two per day, each day's stops nearest to the hotel first; on
+days with a high chance of rain, indoor sights (museums, churches, markets,
+...) are scheduled before outdoor ones.
+"""
+from poi_store import haversine_m
+from travel_tools import best_rated
+
+STOPS_PER_DAY = 2
+SLOTS = ("Morning", "Afternoon")
+# Chance of rain (%) from which a day gets indoor sights first.
+RAINY_PERCENT = 50
+INDOOR_WORDS = (
+    "museum", "museo", "musée", "gallery", "galleria", "church", "chiesa", "église", "basilica",
+    "cathedral", "duomo", "palace", "palazzo", "palais", "market", "theatre", "theater", "opera",
+    "library", "aquarium", "mosque", "temple", "synagogue", "hall", "mall",
+)
+
+
+def is_indoor(place):
+    name = (place.get("name") or "").lower()
+    return any(word in name for word in INDOOR_WORDS)
+
+
+def _rated(place):
+    rating = place.get("rating")
+    return f"{place['name']} (rated {rating})" if isinstance(rating, (int, float)) else place["name"]
+
+
+def _forecast(day):
+    if not day:
+        return ""
+    parts = []
+    if day.get("min_temp") is not None and day.get("max_temp") is not None:
+        parts.append(f"{round(day['min_temp'])}–{round(day['max_temp'])}°C")
+    if day.get("rain") is not None:
+        parts.append(f"{day['rain']}% chance of rain")
+    return " — " + ", ".join(parts) if parts else ""
+
+
+def _rainy(day):
+    return bool(day) and day.get("rain") is not None and day["rain"] >= RAINY_PERCENT
+
+
+def schedule(days, attractions, weather, hotel=None):
+    """Day index -> list of attractions for that day."""
+    seen, places = set(), []
+    for place in best_rated(attractions, len(attractions)):
+        if place.get("name") and place["name"] not in seen:
+            seen.add(place["name"])
+            places.append(place)
+    indoor = [p for p in places if is_indoor(p)]
+    outdoor = [p for p in places if not is_indoor(p)]
+
+    forecast = list(weather[:days]) + [None] * (days - len(weather[:days]))
+    plan = {i: [] for i in range(days)}
+    # Rainiest days choose first, so the indoor sights go where they are needed.
+    for i in sorted(range(days), key=lambda i: -((forecast[i] or {}).get("rain") or 0)):
+        first, second = (indoor, outdoor) if _rainy(forecast[i]) else (outdoor, indoor)
+        while len(plan[i]) < STOPS_PER_DAY and (first or second):
+            plan[i].append((first or second).pop(0))
+    for i, stops in plan.items():
+        # Indoor sights first on rainy days, then nearest to the hotel first.
+        stops.sort(key=lambda p: (_rainy(forecast[i]) and not is_indoor(p),
+                                  haversine_m(hotel["lat"], hotel["lng"], p["lat"], p["lng"]) if hotel else 0))
+    return plan
+
+
+def template_itinerary(query, days, hotels, attractions, weather, reason):
+    """Plain-text itinerary; starts with a "⚠️" note line, like every fallback plan."""
+    hotel = best_rated(hotels, 1)[0] if hotels else None
+    base = hotel["name"] if hotel else f"the centre of {query}"
+    lines = [
+        f"⚠️ Quick plan ({reason}): assembled from the hotel, attraction and weather data below.",
+        "",
+        f"Where to stay: {_rated(hotel)}." if hotel else f"Where to stay: somewhere central in {query}.",
+    ]
+    for i, stops in schedule(days, attractions, weather, hotel).items():
+        day = weather[i] if i < len(weather) else None
+        lines += ["", f"Day {i + 1}{_forecast(day)}"]
+        if _rainy(day) and any(is_indoor(p) for p in stops):
+            lines.append("Rain is likely, so the day starts indoors.")
+        for slot, place in zip(SLOTS, stops):
+            lines.append(f"- {slot}: {_rated(place)}.")
+        for slot in SLOTS[len(stops):]:
+            lines.append(f"- {slot}: free time to explore the area around {base}.")
+        lines.append(f"- Evening: dinner near {base}.")
+    return "\n".join(lines)
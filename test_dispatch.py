@@ -1,12 +1,8 @@
-import os
-from dotenv import load_dotenv
-import google.generativeai as genai
+import config
 from function_dispatcher import call_gemini_and_dispatch
 
-# Load keys
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_KEY"))
-model = genai.GenerativeModel("gemini-2.5-flash")  # replace with the one in your list_models.py
+# Keys come from .env (see config.py)
+model = config.genai().GenerativeModel("gemini-2.5-flash")  # replace with the one in your list_models.py
 
 # Example tools
 def add(a: int, b: int):
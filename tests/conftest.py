@@ -0,0 +1,32 @@
+# tests/conftest.py
+"""
+The tests run against the offline stand-ins (fake_backends.py): no keys, no
+network, in-memory caches only. The environment is set before any project
+module is imported, since most of them read it at import time.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ.update({
+    "TRAVEL_BACKEND": "replay",
+    "FAKE_CASSETTE_DIR": tempfile.mkdtemp(prefix="travel-cassettes-"),
+    "WARM_UP": "0",
+    "GEMINI_RPM": "100000",
+})
+for name in ("TOOL_CACHE_PATH", "POI_STORE_PATH", "GAZETTEER_PATH", "FAKE_LATENCY", "FAKE_ERROR_RATE",
+             "FAKE_STALL_RATE", "TRACE_FILE", "METRICS_PORT"):
+    os.environ.pop(name, None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    """Each test starts without cached tool results, plans or places."""
+    import poi_store
+    import tool_cache
+    tool_cache.cache.clear()
+    poi_store.store.clear()
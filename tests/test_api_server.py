@@ -0,0 +1,82 @@
+# tests/test_api_server.py
+import threading
+
+import pytest
+
+import api_server
+from api_server import ApiError, PlanService
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Plans block until the gate opens; returns the gate and the list of plans actually run."""
+    opened, runs = threading.Event(), []
+
+    def run_plan(destination, days, mode):
+        runs.append((destination, days, mode))
+        opened.wait(5)
+        return {"itinerary": f"{days} days in {destination}"}
+
+    monkeypatch.setattr(PlanService, "_run_plan", staticmethod(run_plan))
+    yield opened, runs
+    opened.set()
+
+
+def test_identical_plans_in_flight_share_one_run(gate):
+    opened, runs = gate
+    service = PlanService(workers=2, queue=8)
+    first, coalesced = service.plan("Paris", 3, "single_shot")
+    assert not coalesced
+    for query in ("paris", "  PARIS "):
+        fut, coalesced = service.plan(query, 3, "single_shot")
+        assert coalesced and fut is first
+    other, coalesced = service.plan("Paris", 4, "single_shot")
+    assert not coalesced and other is not first
+    opened.set()
+    assert first.result(5) == {"itinerary": "3 days in Paris"}
+    other.result(5)
+    assert len(runs) == 2
+    assert service.stats()["coalesced"] == 2 and service.stats()["inflight_plans"] == 0
+
+
+def test_phrasings_of_one_destination_share_one_run(gate):
+    opened, runs = gate
+    service = PlanService(workers=2, queue=8)
+    first, _ = service.plan("Paris", 3, "single_shot")
+    fut, coalesced = service.plan("Plan a 3-day trip to Paris in May", 3, "single_shot")
+    assert coalesced and fut is first
+    opened.set()
+    first.result(5)
+    assert len(runs) == 1
+
+
+def test_finished_plans_are_not_coalesced(gate):
+    opened, runs = gate
+    opened.set()
+    service = PlanService(workers=1, queue=8)
+    service.plan("Rome", 2, "single_shot")[0].result(5)
+    fut, coalesced = service.plan("Rome", 2, "single_shot")
+    fut.result(5)
+    assert not coalesced and len(runs) == 2
+
+
+def test_full_or_draining_service_refuses_work(gate):
+    opened, _ = gate
+    service = PlanService(workers=1, queue=1)
+    service.plan("Rome", 2, "single_shot")
+    with pytest.raises(ApiError) as full:
+        service.plan("Lisbon", 2, "single_shot")
+    assert full.value.status == 503
+    assert service.plan("Rome", 2, "single_shot")[1]   # joining a running plan costs no slot
+    opened.set()
+    assert service.drain(timeout=5)
+    with pytest.raises(ApiError, match="draining"):
+        service.plan("Vienna", 2, "single_shot")
+
+
+def test_plan_runs_the_pipeline():
+    service = PlanService(workers=1, queue=4)
+    plan = service.plan("Lisbon", 2, "single_shot")[0].result(30)
+    assert plan["itinerary"] and plan["location"] and plan["hotels"]
+    assert set(plan["timings"]) >= {"total"}
+    service.drain(timeout=5)
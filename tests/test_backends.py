@@ -0,0 +1,20 @@
+# tests/test_backends.py
+import backends
+import config
+
+
+def test_live_gemini_model_uses_the_configured_sdk(monkeypatch):
+    class SDK:
+        class GenerativeModel:
+            def __init__(self, name, generation_config=None):
+                self.name = name
+
+    monkeypatch.setitem(backends._config, "mode", "live")
+    monkeypatch.setattr(config, "genai", lambda: SDK)
+    assert backends.gemini_model("gemini-2.0-flash").name == "gemini-2.0-flash"
+
+
+def test_settings_is_a_copy():
+    settings = backends.settings()
+    settings["seed"] = -1
+    assert backends.settings()["seed"] != -1 and backends.mode() == "replay"
@@ -0,0 +1,56 @@
+# tests/test_dispatch_engine.py
+import asyncio
+
+import function_dispatcher
+import multiagent_dispatcher
+from dispatch_engine import parse_reply
+
+
+class ScriptedModel:
+    """Returns the given replies in order, like a Gemini model would."""
+
+    def __init__(self, *replies):
+        self.replies = iter(replies)
+        self.prompts = []
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        self.prompts.append(prompt)
+        reply = type("Reply", (), {})()
+        reply.text = next(self.replies)
+        return reply
+
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        return self.generate_content(prompt)
+
+
+def test_parse_reply_finds_the_first_object():
+    assert parse_reply('{"action": "done", "result": "ok"}') == {"action": "done", "result": "ok"}
+    assert parse_reply('```json\n{"action": "done"}\n```') == {"action": "done"}
+    assert parse_reply('Sure! [1, 2] then {"a": "}{ isn\'t a brace"} and {"b": 1}') == {"a": "}{ isn't a brace"}
+    assert parse_reply("no json {here") is None
+
+
+def test_args_are_coerced_and_checked():
+    args, error, _ = function_dispatcher.TOOLS.check("get_weather", {"lat": "41.9", "longitude": 12.5, "days": "3"})
+    assert error is None and args == {"lat": 41.9, "lon": 12.5, "days": 3}
+    _, error, _ = function_dispatcher.TOOLS.check("nope", {})
+    assert "unknown tool" in error
+
+
+def _add(a: int, b: int):
+    return {"sum": a + b}
+
+
+def test_call_multiagent_accepts_custom_tools():
+    model = ScriptedModel('{"action": "add", "args": {"a": 2, "b": "3"}}', '{"action": "done", "result": "5"}')
+    result = multiagent_dispatcher.call_multiagent(model, "add 2 and 3", {"add": _add})
+    assert result["done"] and result["result"] == "5"
+    assert '"sum":5' in model.prompts[-1]
+
+
+def test_call_multiagent_async_accepts_custom_tools():
+    async def add(a: int, b: int):
+        return _add(a, b)
+    model = ScriptedModel('{"action": "add", "args": {"a": 1, "b": 1}}', '{"action": "done", "result": "2"}')
+    result = asyncio.run(multiagent_dispatcher.call_multiagent_async(model, "add", {"add": add}))
+    assert result["result"] == "2"
@@ -0,0 +1,45 @@
+# tests/test_dispatch_history.py
+from dispatch_history import DispatchHistory, compact, summarize
+
+PLACES = [{"name": f"Place {i}", "rating": 4.5, "lat": 41.9, "lng": 12.5} for i in range(20)]
+
+
+def test_compact_drops_coordinates_and_rounds():
+    assert compact([{"name": "A", "lat": 1.0, "lng": 2.0, "rating": 4.5678}]) == [{"name": "A", "rating": 4.6}]
+
+
+def test_summarize_keeps_the_first_items():
+    assert summarize(list(range(10))).endswith('"... +7 more"]')
+
+
+def test_latest_step_is_kept_whole():
+    history = DispatchHistory("head", token_budget=50)
+    history.start_step()
+    history.add_result("search_hotels", {"lat": 1}, PLACES)
+    history.start_step()
+    history.add_result("search_hotels", {"lat": 2}, PLACES)
+    history.add_result("search_attractions", {"lat": 2}, PLACES)
+    history.add_result("get_weather", {"lat": 2}, [{"day": "Day 1", "rain": 10}])
+
+    prompt = history.render()
+    # Every result of the newest batch is verbatim, however far over budget.
+    assert prompt.count("(summarized)") == 0
+    assert "older search_hotels result omitted" in prompt
+    assert prompt.count("Place 19") == 2
+
+
+def test_older_steps_are_summarized_before_dropped():
+    history = DispatchHistory("head", token_budget=60)
+    history.start_step()
+    history.add_result("search_hotels", {"lat": 1}, PLACES)
+    history.start_step()
+    history.add_result("get_weather", {"lat": 1}, [{"day": "Day 1", "rain": 10}])
+    assert "ToolResult search_hotels (summarized)" in history.render()
+
+
+def test_repeated_call_is_answered_from_history():
+    history = DispatchHistory("head")
+    history.start_step()
+    history.add_result("get_weather", {"lat": 1, "lon": 2}, [1, 2])
+    assert history.lookup("get_weather", {"lon": 2, "lat": 1}) == (True, [1, 2])
+    assert history.lookup("get_weather", {"lat": 3}) == (False, None)
@@ -0,0 +1,96 @@
+# tests/test_gazetteer.py
+import pytest
+
+from gazetteer import Gazetteer
+
+ROME = {"lat": 41.9028, "lng": 12.4964}
+NICE = {"lat": 43.7102, "lng": 7.262}
+BARCELONA = {"lat": 41.3874, "lng": 2.1686}
+
+
+@pytest.fixture
+def gaz():
+    return Gazetteer(path=None)
+
+
+@pytest.mark.parametrize("query, name", [
+    ("Plan a nice weekend trip to Denver", "Denver"),
+    ("Trip to Perth with la familia", "Perth"),
+    ("Paris, Texas", "Paris, Texas"),
+    ("London, Ontario", "London, Ontario"),
+    ("Rome, Georgia", "Rome, Georgia"),
+    ("Naples, Florida", "Naples, Florida"),
+    ("Valencia Venezuela", "Valencia Venezuela"),
+    ("Sydney Nova Scotia", "Sydney Nova Scotia"),
+    ("Plan a trip to see the Grand Canyon", "Grand Canyon"),
+    ("Trip to Paris, Texas to see the rodeo", "Paris, Texas"),
+])
+def test_unknown_or_qualified_places_go_to_the_api(gaz, query, name):
+    assert gaz.extract(query) is None
+    assert gaz.candidate(query) == name
+
+
+@pytest.mark.parametrize("query, loc", [
+    ("Plan a 5-day trip to Rome in October", ROME),
+    ("Things to do in Rome", ROME),
+    ("Rome in October", ROME),
+    ("Rome, Italy", ROME),
+    ("5 days Roma", ROME),
+    ("weekend in Barcelonna", BARCELONA),
+    ("Nice", NICE),
+    ("3 days in Nice", NICE),
+])
+def test_known_places_are_local(gaz, query, loc):
+    assert gaz.extract(query) == loc
+
+
+def test_common_words_need_a_cue(gaz):
+    assert gaz.extract("a nice weekend by the sea") is None
+
+
+def test_api_answers_are_learned(gaz):
+    asked = []
+
+    def geocode(name):
+        asked.append(name)
+        return {"lat": 33.66, "lng": -95.55}
+
+    assert gaz.locate("Weekend in Paris, Texas", geocode=geocode) == {"lat": 33.66, "lng": -95.55}
+    assert gaz.locate("Paris, Texas", geocode=geocode) == {"lat": 33.66, "lng": -95.55}
+    assert asked == ["Paris, Texas"]
+
+
+@pytest.mark.parametrize("query, name", [
+    ("Grenada", "Grenada"),            # not Granada
+    ("Trip to Bolton", "Bolton"),      # not Boston
+    ("5 days in Milas", "Milas"),      # not Milan
+    ("Homburg", "Homburg"),            # not Hamburg
+])
+def test_near_misses_ask_the_api_first(gaz, query, name):
+    asked = []
+
+    def geocode(place):
+        asked.append(place)
+        return {"lat": 1.0, "lng": 2.0}
+
+    assert gaz.extract(query) is None
+    assert gaz.locate(query, geocode=geocode) == {"lat": 1.0, "lng": 2.0}
+    assert asked == [name]
+
+
+def test_misspelling_is_the_last_resort(gaz):
+    assert gaz.locate("weekend in Barcellona", geocode=lambda place: None) == BARCELONA
+
+    def down(place):
+        raise ConnectionError("geocoding unavailable")
+
+    assert gaz.locate("Barcellona", geocode=down) == BARCELONA
+    with pytest.raises(ConnectionError):
+        gaz.locate("Ulaanbaatar", geocode=down)
+    assert gaz.stats()["fuzzy"] == 2
+
+
+def test_complete(gaz):
+    assert gaz.complete("new")[0] == "New York, United States"
+    assert gaz.complete("") == []
+    assert gaz.complete("Grenada")[0] == "Granada, Spain"   # a suggestion, never an answer
@@ -0,0 +1,17 @@
+# tests/test_pdf_export.py
+import pdf_export
+
+WEATHER = [{"day": "2025-06-01", "min_temp": 18, "max_temp": 27, "rain": 60}]
+
+
+def test_reply_with_emoji_exports():
+    reply = "⚠️ Quick plan (out of time): assembled locally.\n❌ Museum closed on Mondays.\nDay 1 — Tōkyō ★"
+    pdf = pdf_export.export_pdf(reply, [{"name": "Hôtel ✅", "rating": 4.5}], [], WEATHER, "Tōkyō", 1)
+    assert pdf.startswith(b"%PDF")
+
+
+def test_missing_glyphs_become_text():
+    assert pdf_export._printable("⚠️ Rain ❌", "Helvetica") == "(!) Rain (x)"
+    assert pdf_export._printable("café 東", "Helvetica") == "café ?"
+    font, _ = pdf_export._font_names()
+    assert "\ufe0f" not in pdf_export._printable("⚠️", font)
@@ -0,0 +1,58 @@
+# tests/test_poi_store.py
+import sqlite3
+
+import poi_store
+import travel_tools
+from poi_store import PoiStore
+
+CENTRE = (41.9, 12.5)
+
+
+def _page(start, n, token=None):
+    lat, lng = CENTRE
+    resp = {"results": [{
+        "place_id": f"p{i}", "name": f"Place {i}", "rating": 4.0,
+        "geometry": {"location": {"lat": lat + (i % 10) * 0.0005, "lng": lng + (i // 10) * 0.0005}},
+    } for i in range(start, start + n)]}
+    if token:
+        resp["next_page_token"] = token
+    return resp
+
+
+def test_partial_search_only_answers_smaller_limits():
+    store = PoiStore(path=None)
+    store.add_area("lodging", *CENTRE, 1500, _page(0, 20)["results"])
+    assert len(store.nearby("lodging", *CENTRE, 1500, limit=20)) == 20
+    assert store.nearby("lodging", *CENTRE, 1500, limit=21) is None
+
+
+def test_finished_pagination_covers_the_area(monkeypatch):
+    store = PoiStore(path=None)
+    monkeypatch.setattr(poi_store, "store", store)
+    pages = travel_tools._PlacePages("lodging", *CENTRE, 1500)
+    _, token = pages.page(_page(0, 20, token="t1"))
+    assert token == "t1" and not store.covered("lodging", *CENTRE, 1500, limit=30)
+    _, token = pages.page(_page(20, 12))
+    assert token is None and store.covered("lodging", *CENTRE, 1500, limit=60)
+    assert len(store.nearby("lodging", *CENTRE, 1500, limit=32)) == 32
+
+
+def test_area_progress_is_persisted(tmp_path):
+    path = str(tmp_path / "poi.sqlite")
+    store = PoiStore(path=path)
+    area = store.add_area("lodging", *CENTRE, 1500, _page(0, 20)["results"])
+    store.add_places("lodging", _page(20, 20)["results"], area=area)
+    reopened = PoiStore(path=path)
+    assert reopened.covered("lodging", *CENTRE, 1500, limit=40)
+    assert not reopened.covered("lodging", *CENTRE, 1500, limit=41)
+
+
+def test_old_area_table_is_migrated(tmp_path):
+    path = str(tmp_path / "poi.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE poi_area (kind TEXT NOT NULL, lat REAL NOT NULL, lng REAL NOT NULL, "
+                 "radius REAL NOT NULL, fetched_at REAL NOT NULL)")
+    conn.execute("INSERT INTO poi_area VALUES ('lodging', 41.9, 12.5, 1500, strftime('%s','now'))")
+    conn.commit()
+    store = PoiStore(path=path)
+    assert not store.covered("lodging", *CENTRE, 1500, limit=1)
@@ -0,0 +1,105 @@
+# tests/test_rate_limiter.py
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import rate_limiter
+import resilience
+from rate_limiter import BATCH, INTERACTIVE, TokenBucket, UpstreamScheduler
+
+
+def _queued(scheduler, n):
+    deadline = time.monotonic() + 2
+    while scheduler.stats()["queue_depth"] < n:
+        assert time.monotonic() < deadline, "callers never queued"
+        time.sleep(0.001)
+
+
+def test_bucket_bursts_to_capacity_then_waits():
+    bucket = TokenBucket(rate=10, capacity=2)
+    now = time.monotonic()
+    assert bucket.wait_time(2, now) == 0
+    bucket.take(2)
+    assert 0.09 < bucket.wait_time(1, now) <= 0.1
+
+
+def test_interactive_callers_go_before_queued_batch_callers():
+    scheduler = UpstreamScheduler("test", requests=TokenBucket(rate=20, capacity=1))
+    scheduler.acquire(requests=1)   # empty the bucket, so the next callers queue
+    order = []
+
+    def call(level):
+        with rate_limiter.priority(level):
+            scheduler.acquire(requests=1)
+        order.append(level)
+
+    batch = threading.Thread(target=call, args=(BATCH,))
+    batch.start()
+    _queued(scheduler, 1)
+    interactive = threading.Thread(target=call, args=(INTERACTIVE,))
+    interactive.start()
+    batch.join(2), interactive.join(2)
+    assert order == [INTERACTIVE, BATCH]
+
+
+def test_try_acquire_never_waits():
+    scheduler = UpstreamScheduler("test", requests=TokenBucket(rate=1, capacity=1))
+    assert scheduler.try_acquire(requests=1)
+    assert not scheduler.try_acquire(requests=1)   # bucket empty
+    assert scheduler.stats()["granted"] == 1
+
+
+def test_try_acquire_does_not_jump_the_queue():
+    scheduler = UpstreamScheduler("test", requests=TokenBucket(rate=20, capacity=1))
+    scheduler.acquire(requests=1)
+    waiter = threading.Thread(target=scheduler.acquire, kwargs={"requests": 1})
+    waiter.start()
+    _queued(scheduler, 1)
+    time.sleep(0.06)   # the bucket refills, but it belongs to the queued caller
+    assert not scheduler.try_acquire(requests=1)
+    waiter.join(2)
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = UpstreamScheduler("test", requests=TokenBucket(rate=0.5, capacity=1))
+    scheduler.acquire(requests=1)
+
+    async def main():
+        task = asyncio.ensure_future(scheduler.acquire_async(requests=1))
+        await asyncio.sleep(0.02)
+        assert scheduler.stats()["queue_depth"] == 1
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_waits_past_the_deadline_fail_fast():
+    scheduler = UpstreamScheduler("test", requests=TokenBucket(rate=0.5, capacity=1))
+    scheduler.acquire(requests=1)   # the next token is 2 s away
+    start = time.monotonic()
+    with resilience.deadline(0.5), pytest.raises(resilience.DeadlineExceeded):
+        scheduler.acquire(requests=1)
+    with resilience.deadline(0.5), pytest.raises(resilience.DeadlineExceeded):
+        asyncio.run(scheduler.acquire_async(requests=1))
+    assert time.monotonic() - start < 0.5
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_queued_waiter_gives_up_when_the_deadline_passes():
+    scheduler = UpstreamScheduler("test", requests=TokenBucket(rate=20, capacity=1))
+    scheduler.acquire(requests=1)
+    scheduler._enqueue({"requests": 1})   # a caller ahead that never leaves
+    with resilience.deadline(0.2), pytest.raises(resilience.DeadlineExceeded):
+        scheduler.acquire(requests=1)
+    assert scheduler.stats()["queue_depth"] == 1
+
+
+def test_submit_carries_the_priority():
+    with ThreadPoolExecutor(1) as pool, rate_limiter.priority(BATCH):
+        assert rate_limiter.submit(pool, rate_limiter._priority.get).result() == BATCH
+        assert pool.submit(rate_limiter._priority.get).result() == INTERACTIVE
@@ -0,0 +1,95 @@
+# tests/test_resilience.py
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import rate_limiter
+import resilience
+from resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, Superseded
+
+
+def test_deadline_travels_with_submitted_work():
+    with resilience.deadline(10) as d, ThreadPoolExecutor(1) as pool:
+        assert rate_limiter.submit(pool, resilience.remaining).result() <= d.seconds
+        assert pool.submit(resilience.remaining).result() is None
+    assert resilience.remaining() is None
+
+
+def test_timeouts_are_cut_to_the_budget():
+    assert resilience.timeout((3.05, 10)) == (3.05, 10)
+    with resilience.deadline(1):
+        connect, read = resilience.timeout((3.05, 10))
+        assert connect <= 1 and read <= 1
+    with resilience.deadline(0), pytest.raises(DeadlineExceeded):
+        resilience.check("the call")
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    b = CircuitBreaker("test", failures=2, reset_after=0.05)
+    for _ in range(2):
+        b.before()
+        b.record(RuntimeError("503"))
+    with pytest.raises(CircuitOpen):
+        b.before()
+    time.sleep(0.06)
+    b.before()                         # the half-open trial
+    with pytest.raises(CircuitOpen):
+        b.before()                     # only one at a time
+    b.record(None)
+    assert b.stats() == {"state": "closed", "failures": 0, "trips": 1}
+
+
+def test_budget_errors_do_not_count_against_the_upstream():
+    b = CircuitBreaker("test", failures=1)
+    b.before()
+    b.record(DeadlineExceeded("spent"))
+    b.before()
+    b.record(Superseded())
+    assert b.stats()["state"] == "closed"
+
+
+def test_slow_call_gets_a_duplicate_and_the_first_result_wins():
+    calls = []
+
+    def attempt(claim):
+        n = len(calls)
+        calls.append(n)
+        time.sleep(0.5 if n == 0 else 0.01)
+        if not claim():
+            raise Superseded()
+        return n
+
+    start = time.perf_counter()
+    assert resilience.hedged(attempt, delay=0.05) == 1
+    assert time.perf_counter() - start < 0.3 and calls == [0, 1]
+
+
+def test_no_duplicate_without_spare_budget():
+    calls = []
+
+    def attempt(claim):
+        calls.append(1)
+        time.sleep(0.1)
+        return "ok"
+
+    assert resilience.hedged(attempt, delay=0.01, spare=lambda: False) == "ok"
+    assert len(calls) == 1
+
+
+def test_async_hedge_cancels_the_loser():
+    calls, cancelled = [], []
+
+    async def attempt(claim):
+        n = len(calls)
+        calls.append(n)
+        try:
+            await asyncio.sleep(0.5 if n == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(n)
+            raise
+        return n
+
+    assert asyncio.run(resilience.ahedged(attempt, delay=0.05)) == 1
+    assert cancelled == [0]
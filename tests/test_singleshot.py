@@ -0,0 +1,34 @@
+# tests/test_singleshot.py
+from function_dispatcher import CleanOutputStream, clean_output
+from singleshot_dispatcher import call_singleshot
+
+REPLY = ("Day 1: Start at the Colosseum (Lat: 41.89, Lng: 12.49) and walk to the Forum "
+         "(41.892, 12.485). Lunch near Piazza Navona, Lat: 41.899, Lng: 12.473 is close.\n\n"
+         "Day 2: A slow morning (coffee first) then the Vatican.")
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_streamed_tokens_are_cleaned_like_the_final_text():
+    for size in (1, 3, 7, 40):
+        tokens = []
+        stream = CleanOutputStream(tokens.append)
+        for chunk in _chunks(REPLY, size):
+            stream.feed(chunk)
+        stream.close()
+        assert "".join(tokens) == clean_output(REPLY)
+        assert not any("Lat" in t or "41." in t for t in tokens)
+
+
+def test_singleshot_streams_clean_text():
+    class Model:
+        def generate_content(self, prompt, stream=False, request_options=None):
+            return [type("Chunk", (), {"text": c})() for c in _chunks(REPLY, 5)]
+
+    tokens = []
+    raw = call_singleshot(Model(), "prompt", tokens.append)
+    assert raw == REPLY
+    assert "".join(tokens) == clean_output(REPLY)
+    assert len(tokens) > 1   # still streamed, not one block at the end
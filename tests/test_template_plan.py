@@ -0,0 +1,34 @@
+# tests/test_template_plan.py
+from template_plan import is_indoor, schedule, template_itinerary
+
+HOTELS = [{"name": "Hotel Okay", "rating": 3.9, "lat": 41.90, "lng": 12.49},
+          {"name": "Hotel Best", "rating": 4.8, "lat": 41.90, "lng": 12.50}]
+ATTRACTIONS = [
+    {"name": "Vatican Museum", "rating": 4.7, "lat": 41.906, "lng": 12.454},
+    {"name": "Trevi Fountain", "rating": 4.8, "lat": 41.901, "lng": 12.483},
+    {"name": "Pantheon", "rating": 4.6, "lat": 41.899, "lng": 12.477},
+    {"name": "Galleria Borghese", "rating": 4.5, "lat": 41.914, "lng": 12.492},
+]
+DRY, WET = {"min_temp": 14, "max_temp": 24, "rain": 10}, {"min_temp": 12, "max_temp": 18, "rain": 80}
+
+
+def test_rainy_days_get_the_indoor_sights_first():
+    plan = schedule(2, ATTRACTIONS, [DRY, WET], HOTELS[1])
+    assert all(is_indoor(p) for p in plan[1])
+    assert not any(is_indoor(p) for p in plan[0])
+
+
+def test_itinerary_covers_every_day():
+    text = template_itinerary("Rome", 3, HOTELS, ATTRACTIONS, [DRY, WET], "out of time")
+    assert text.startswith("⚠️ Quick plan (out of time)")
+    assert "Where to stay: Hotel Best (rated 4.8)." in text
+    for day in ("Day 1 — 14–24°C", "Day 2 — 12–18°C, 80% chance of rain", "Day 3\n"):
+        assert day in text
+    assert "Rain is likely, so the day starts indoors." in text
+    assert "free time to explore the area around Hotel Best" in text   # day 3 has no sights left
+
+
+def test_itinerary_without_any_data():
+    text = template_itinerary("Rome", 1, [], [], [], "the AI planner failed")
+    assert "Where to stay: somewhere central in Rome." in text
+    assert "- Evening: dinner near the centre of Rome." in text
@@ -0,0 +1,60 @@
+# tests/test_tool_cache.py
+import asyncio
+import time
+
+import tool_cache
+from tool_cache import LRUStore, ToolCache
+
+
+def test_lru_evicts_least_recently_used():
+    store = LRUStore(2)
+    later = time.time() + 60
+    store.set("a", 1, later)
+    store.set("b", 2, later)
+    store.get("a")
+    store.set("c", 3, later)
+    assert store.get("b") is None and store.get("a") == (later, 1)
+    assert store.evictions == 1
+
+
+def test_expired_entries_are_misses():
+    store = LRUStore(2)
+    store.set("a", 1, time.time() - 1)
+    assert store.get("a") is None and len(store) == 0
+
+
+def test_disk_tier_survives_a_new_process(tmp_path):
+    path = str(tmp_path / "tools.sqlite")
+    ToolCache(disk_path=path).set("get_weather", "k", [{"day": "Mon"}])
+    fresh = ToolCache(disk_path=path)
+    assert fresh.get("k") == (True, [{"day": "Mon"}])
+    assert fresh.get("k") == (True, [{"day": "Mon"}])
+    assert fresh.stats()["disk_hits"] == 1 and fresh.stats()["hits"] == 1
+
+
+def test_keys_normalize_arguments():
+    def search(lat, lng, query="museum"):
+        pass
+    key = tool_cache.make_key("search", search, (41.90281, 12.49641), {})
+    assert key == tool_cache.make_key("search", search, (), {"lng": 12.4960, "lat": 41.9030, "query": " Museum "})
+    assert key != tool_cache.make_key("search", search, (41.91, 12.4964), {})
+
+
+def test_cached_skips_none_and_serves_repeats(monkeypatch):
+    monkeypatch.setattr(tool_cache, "cache", ToolCache(disk_path=None))
+    calls = []
+
+    @tool_cache.cached("get_weather")
+    def weather(lat, lng):
+        calls.append((lat, lng))
+        return None if lat > 80 else [lat]
+
+    @tool_cache.cached("get_weather")
+    async def weather_async(lat, lng):
+        calls.append((lat, lng))
+        return [lat]
+
+    assert weather(10, 20) == weather(10, 20.0001) == [10]
+    assert weather(85, 0) is None and weather(85, 0) is None
+    assert asyncio.run(weather_async(1, 2)) == asyncio.run(weather_async(1, 2)) == [1]
+    assert calls == [(10, 20), (85, 0), (85, 0), (1, 2)]
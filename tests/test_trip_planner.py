@@ -0,0 +1,90 @@
+# tests/test_trip_planner.py
+import queue
+import time
+
+import pytest
+
+import backends
+import resilience
+import trip_planner
+
+
+def _events(query, **kwargs):
+    return list(trip_planner.travel_agent_events(query, 2, stream=True, single_shot=True, **kwargs))
+
+
+def test_streamed_plan_events():
+    events = _events("Lisbon")
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] == "location" and kinds[-1] == "itinerary"
+    assert {"hotels", "attractions", "weather"} <= set(kinds)
+    tokens = [payload for kind, payload in events if kind == "token"]
+    assert tokens and "".join(tokens).strip() == events[-1][1].strip()
+
+
+def test_streamed_plan_wakes_only_for_events(monkeypatch):
+    gets = []
+
+    class Events(queue.Queue):
+        def get(self, block=True, timeout=None):
+            item = super().get(block, timeout)   # a timed-out wait raises queue.Empty past the append
+            gets.append(item[0])
+            return item
+
+    monkeypatch.setattr(trip_planner.queue, "Queue", Events)
+    events = _events("Vienna")
+    # One wake-up per fetch, token and the finished writer: no idle polling in between.
+    tokens = sum(kind == "token" for kind, _ in events)
+    assert sorted(gets) == sorted(["hotels", "attractions", "weather", "written"] + ["token"] * tokens)
+
+
+def test_phrasings_of_one_destination_share_one_plan():
+    first = trip_planner.travel_agent("Plan a trip to Lisbon", 2, single_shot=True)[0]
+    timings = {}
+    again = trip_planner.travel_agent("lisbon", 2, single_shot=True, timings=timings)[0]
+    assert "plan_cache_hit" in timings and again == first
+
+
+class NeverDone:
+    """A model that keeps asking for the weather and never writes the plan."""
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        reply = type("Reply", (), {})()
+        reply.text = '{"action": "get_weather", "args": {"lat": 38.72, "lon": -9.14, "days": 2}}'
+        return reply
+
+
+@pytest.mark.parametrize("use_multiagent", [False, True])
+def test_unfinished_dispatch_uses_the_template(monkeypatch, use_multiagent):
+    monkeypatch.setattr(backends, "gemini_model", lambda *args, **kwargs: NeverDone())
+    reply = trip_planner.travel_agent("Lisbon", 2, use_multiagent)[0]
+    assert reply.startswith("⚠️ Quick plan (the AI planner failed)")
+    assert "max_steps_exceeded" not in reply and "prompt_sizes" not in reply
+
+
+@pytest.fixture
+def weather_down():
+    backends.configure(error_rate={"open-meteo": 1.0})
+    yield
+    backends.configure(error_rate={})
+    resilience._breakers.clear()
+
+
+def test_failed_fetch_falls_back_to_the_template(weather_down):
+    for _ in range(2):   # the second plan meets an open circuit instead of a 503
+        timings = {}
+        events = dict(trip_planner.travel_agent_events("Rome", 2, single_shot=True, timings=timings))
+        assert events["weather"] == [] and events["hotels"]
+        assert events["itinerary"].startswith("⚠️ Quick plan")
+        assert "plan_cache_hit" not in timings   # plans missing a section are not cached
+
+
+def test_out_of_time_plan_uses_the_template():
+    backends.configure(latency={"gemini": 2.0})
+    try:
+        start = time.perf_counter()
+        reply = trip_planner.travel_agent("Porto", 2, single_shot=True, budget=0.5)[0]
+    finally:
+        backends.configure(latency={})
+    assert reply.startswith("⚠️ Quick plan (out of time)")
+    assert time.perf_counter() - start < 1.5
@@ -0,0 +1,48 @@
+# tests/test_walk_matrix.py
+import random
+
+import travel_tools
+from travel_tools import MATRIX_MAX_ELEMENTS, MATRIX_MAX_SIDE, _matrix_batches
+
+ROME = [(41.9, 12.5), (41.91, 12.5)]
+MILAN = [(45.0, 9.0)]
+
+
+def _covered(batches):
+    return [(i, j) for origins, dests in batches for i in origins for j in dests]
+
+
+def test_batches_fetch_exactly_the_requested_pairs():
+    rng = random.Random(0)
+    for _ in range(50):
+        pairs = {(rng.randrange(40), rng.randrange(40)) for _ in range(rng.randrange(1, 400))}
+        batches = _matrix_batches(pairs)
+        covered = _covered(batches)
+        assert sorted(covered) == sorted(pairs)
+        for origins, dests in batches:
+            assert len(origins) <= MATRIX_MAX_SIDE and len(dests) <= MATRIX_MAX_SIDE
+            assert len(origins) * len(dests) <= MATRIX_MAX_ELEMENTS
+
+
+def test_destinations_sharing_origins_are_grouped():
+    # Each origin needs a different set, but every destination needs the same two origins.
+    pairs = [(0, 0), (1, 0), (0, 1), (1, 1), (0, 2), (1, 2)]
+    assert _matrix_batches(pairs) == [([0, 1], [0, 1, 2])]
+    pairs = [(0, j) for j in range(5)] + [(1, j) for j in range(3)]
+    assert len(_matrix_batches(pairs)) == 2
+
+
+def test_pruned_pairs_stay_none():
+    rows = travel_tools.get_walk_matrix(ROME + MILAN, [(41.9, 12.51), (45.0, 9.01)])
+    assert rows[0][1] is None and rows[1][1] is None and rows[2][0] is None
+    assert rows[0][0]["meters"] > 0 and rows[2][1]["meters"] > 0
+
+
+def test_only_requested_pairs_are_recorded():
+    matrix = travel_tools._WalkMatrix(ROME + MILAN, MILAN, 5000)
+    assert matrix.pending == {(2, 0)}
+    element = {"status": "OK", "distance": {"text": "300 km", "value": 300000},
+               "duration": {"text": "60 h", "value": 216000}}
+    matrix.add(([0, 1, 2], [0]), {"rows": [{"elements": [element]}] * 3})
+    assert matrix.rows[0][0] is None and matrix.rows[1][0] is None
+    assert matrix.rows[2][0]["meters"] == 300000
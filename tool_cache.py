@@ -0,0 +1,225 @@
+# tool_cache.py
+import functools
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import telemetry
+
+# --- Freshness policy (seconds) ---
+TOOL_TTLS = {
+    "geocode_place": 3 * 24 * 3600,
+    "search_hotels": 6 * 3600,
+    "search_attractions": 6 * 3600,
+    "get_weather": 3600,
+    "walk_pair": 7 * 24 * 3600,
+    "travel_plan": 6 * 3600,
+}
+DEFAULT_TTL = 3600
+
+# Coordinates are snapped to this grid (degrees, ~100 m) so nearby points share an entry.
+COORD_GRID = 0.001
+COORD_ARGS = {"lat", "lng", "lon"}
+
+MEMORY_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "1024"))
+# Optional on-disk tier, e.g. a path on a mounted volume shared by workers.
+DISK_PATH = os.getenv("TOOL_CACHE_PATH")
+
+
+# --- Key normalization ---
+def _normalize(name, value):
+    if name in COORD_ARGS and isinstance(value, (int, float)):
+        return round(round(value / COORD_GRID) * COORD_GRID, 6)
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    return value
+
+
+def coord_key(tool_name, *points):
+    """Key for a value identified only by (lat, lng) points, snapped like tool arguments."""
+    return tool_name + ":" + json.dumps([[_normalize("lat", lat), _normalize("lng", lng)] for lat, lng in points])
+
+
+def make_key(tool_name, fn, args, kwargs):
+    """Build a stable key from the bound call, so positional and keyword calls match."""
+    bound = inspect.signature(fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+    parts = {k: _normalize(k, v) for k, v in bound.arguments.items()}
+    return tool_name + ":" + json.dumps(parts, sort_keys=True, default=str)
+
+
+# --- Storage tiers ---
+class LRUStore:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=MEMORY_SIZE):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteStore:
+    """On-disk tier; WAL mode lets several worker processes share one file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT expires_at, value FROM tool_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[0] < time.time():
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key, value, expires_at):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO tool_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), expires_at),
+        )
+        conn.commit()
+
+    def purge_expired(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM tool_cache WHERE expires_at < ?", (time.time(),))
+        conn.commit()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM tool_cache")
+        conn.commit()
+
+
+class ToolCache:
+    """Two-tier (memory, optional disk) cache with hit/miss/eviction counters."""
+
+    def __init__(self, max_entries=MEMORY_SIZE, disk_path=DISK_PATH, ttls=None):
+        self.memory = LRUStore(max_entries)
+        self.disk = SQLiteStore(disk_path) if disk_path else None
+        self.ttls = dict(TOOL_TTLS, **(ttls or {}))
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        item = self.memory.get(key)
+        if item is not None:
+            self._count("hits")
+            return True, item[1]
+        if self.disk is not None:
+            item = self.disk.get(key)
+            if item is not None:
+                self._count("disk_hits")
+                self.memory.set(key, item[1], item[0])
+                return True, item[1]
+        self._count("misses")
+        return False, None
+
+    def set(self, tool_name, key, value):
+        expires_at = time.time() + self.ttls.get(tool_name, DEFAULT_TTL)
+        self.memory.set(key, value, expires_at)
+        if self.disk is not None:
+            self.disk.set(key, value, expires_at)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._counters)
+        out["evictions"] = self.memory.evictions
+        out["entries"] = len(self.memory)
+        return out
+
+
+cache = ToolCache()
+
+
+# --- Decorator ---
+def cached(tool_name):
+    """Serve `fn` from the shared cache under the TTL configured for `tool_name`."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                key = make_key(tool_name, fn, args, kwargs)
+                hit, value = cache.get(key)
+                telemetry.annotate(cache_hit=hit)
+                if hit:
+                    return value
+                value = await fn(*args, **kwargs)
+                if value is not None:
+                    cache.set(tool_name, key, value)
+                return value
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = make_key(tool_name, fn, args, kwargs)
+            hit, value = cache.get(key)
+            telemetry.annotate(cache_hit=hit)
+            if hit:
+                return value
+            value = fn(*args, **kwargs)
+            if value is not None:  # don't pin failed lookups for days
+                cache.set(tool_name, key, value)
+            return value
+        return wrapper
+    return decorator
+
+
+def stats():
+    return cache.stats()
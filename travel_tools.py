@@ -1,53 +1,45 @@
 # travel_tools.py
-import os
-import requests
-import googlemaps
-from dotenv import load_dotenv
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from collections import defaultdict
+from urllib.parse import urlencode
+import config
+import poi_store
+import telemetry
+import tool_cache
+from http_transport import aget_json, get_json
+from telemetry import traced
+from tool_cache import cached
 
-# --- Load API keys ---
-load_dotenv()
-GMAPS_KEY = os.getenv("GMAPS_KEY")
-gmaps = googlemaps.Client(key=GMAPS_KEY)
+# The googlemaps client is built on first use (see config.gmaps).
+MAPS_API = "https://maps.googleapis.com/maps/api"
 
 
-# --- Core Tools ---
-def geocode_place(place):
-    """Geocode a place name into latitude & longitude."""
-    res = gmaps.geocode(place)
-    return res[0]['geometry']['location'] if res else None
+# --- Shared request / response helpers (used by sync and async tools) ---
+def _parse_location(results):
+    return results[0]['geometry']['location'] if results else None
 
 
-def search_hotels(lat, lng, radius=1500, limit=5):
-    """Search nearby hotels given coordinates."""
-    resp = gmaps.places_nearby(location=(lat, lng), radius=radius, type="lodging")
-    hotels = []
-    for h in resp.get('results', [])[:limit]:
-        hotels.append({
-            "name": h.get("name"),
-            "rating": h.get("rating", "N/A"),
-            "lat": h["geometry"]["location"]["lat"],
-            "lng": h["geometry"]["location"]["lng"]
-        })
-    return hotels
+def _parse_place(p):
+    return {
+        "name": p.get("name"),
+        "rating": p.get("rating", "N/A"),
+        "lat": p["geometry"]["location"]["lat"],
+        "lng": p["geometry"]["location"]["lng"]
+    }
 
 
-def search_attractions(lat, lng, radius=2000, limit=5):
-    """Search nearby tourist attractions given coordinates."""
-    resp = gmaps.places_nearby(location=(lat, lng), radius=radius, type="tourist_attraction")
-    attractions = []
-    for a in resp.get('results', [])[:limit]:
-        attractions.append({
-            "name": a.get("name"),
-            "rating": a.get("rating", "N/A"),
-            "lat": a["geometry"]["location"]["lat"],
-            "lng": a["geometry"]["location"]["lng"]
-        })
-    return attractions
+def _local_places(kind, lat, lng, radius, limit):
+    """Answer a nearby search from the POI store when the area was already fetched."""
+    places = poi_store.store.nearby(kind, lat, lng, radius, limit)
+    telemetry.annotate(poi_store_hit=places is not None)
+    return places
 
 
-def get_walk_info(origin, dest):
-    """Get walking distance and duration between two places."""
-    routes = gmaps.directions(origin, dest, mode="walking")
+def _parse_walk(routes):
     if not routes:
         return None
     leg = routes[0]['legs'][0]
@@ -57,37 +49,503 @@ def get_walk_info(origin, dest):
     }
 
 
+# --- Walking distance matrix ---
+# Distance Matrix API limits per request.
+MATRIX_MAX_SIDE = 25         # origins, and destinations
+MATRIX_MAX_ELEMENTS = 100    # origins x destinations
+# Pairs further apart than this in a straight line are not worth a walking route.
+MAX_WALK_STRAIGHT_M = 5000
+
+
+def _coords(p):
+    if isinstance(p, dict):
+        return float(p["lat"]), float(p["lng"])
+    return float(p[0]), float(p[1])
+
+
+def haversine_matrix(origins, dests):
+    """Great-circle metres between every origin and destination ((lat, lng) sequences), as a NumPy array."""
+    import numpy as np
+
+    o = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+    d = np.radians(np.asarray(dests, dtype=float).reshape(-1, 2))
+    dlat = d[None, :, 0] - o[:, None, 0]
+    dlng = d[None, :, 1] - o[:, None, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(o[:, None, 0]) * np.cos(d[None, :, 0]) * np.sin(dlng / 2) ** 2
+    return 2 * poi_store.EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def _rectangles(pairs):
+    """(rows, cols) blocks covering exactly `pairs`: rows needing the same cols share blocks, cut to the API limits."""
+    by_row = defaultdict(list)
+    for i, j in sorted(pairs):
+        by_row[i].append(j)
+    by_cols = defaultdict(list)
+    for i, cols in by_row.items():
+        by_cols[tuple(cols)].append(i)
+
+    blocks = []
+    for cols, rows in sorted(by_cols.items()):
+        for k in range(0, len(cols), MATRIX_MAX_SIDE):
+            chunk = list(cols[k:k + MATRIX_MAX_SIDE])
+            per_request = min(MATRIX_MAX_SIDE, MATRIX_MAX_ELEMENTS // len(chunk))
+            for n in range(0, len(rows), per_request):
+                blocks.append((rows[n:n + per_request], chunk))
+    return blocks
+
+
+def _matrix_batches(pairs):
+    """
+    Group (origin, dest) index pairs into requests that fetch exactly those
+    pairs (elements are billed, and pruned pairs must stay None): origins
+    needing the same destinations share requests, or destinations needing
+    the same origins, whichever takes fewer.
+    """
+    pairs = list(pairs)
+    by_origin = _rectangles(pairs)
+    by_dest = [(origins, dests) for dests, origins in _rectangles((j, i) for i, j in pairs)]
+    return min(by_origin, by_dest, key=len)
+
+
+def _parse_element(el):
+    if el.get("status") != "OK":
+        return None
+    return {
+        "distance": el["distance"]["text"],
+        "duration": el["duration"]["text"],
+        "meters": el["distance"]["value"],
+        "seconds": el["duration"]["value"],
+    }
+
+
+class _WalkMatrix:
+    """
+    One get_walk_matrix call: prunes far pairs, serves cached pairs, and plans
+    the requests for the rest (shared by the sync and async tools).
+    """
+
+    def __init__(self, origins, dests, max_straight_m):
+        self.origins = [_coords(p) for p in origins]
+        self.dests = [_coords(p) for p in dests]
+        self.rows = [[None] * len(self.dests) for _ in self.origins]
+        straight = haversine_matrix(self.origins, self.dests) if self.origins and self.dests else []
+        pending = []
+        for i, row in enumerate(straight):
+            for j in (row <= max_straight_m).nonzero()[0]:
+                hit, value = tool_cache.cache.get(self._key(i, j))
+                if hit:
+                    self.rows[i][j] = value
+                else:
+                    pending.append((i, int(j)))
+        self.pending = set(pending)
+        self.batches = _matrix_batches(pending)
+        telemetry.annotate(pairs=len(self.origins) * len(self.dests), fetched_pairs=len(pending),
+                           requests=len(self.batches))
+
+    def _key(self, i, j):
+        return tool_cache.coord_key("walk_pair", self.origins[i], self.dests[j])
+
+    def request(self, batch):
+        """(origin points, destination points) of one batch."""
+        origins, dests = batch
+        return [self.origins[i] for i in origins], [self.dests[j] for j in dests]
+
+    def add(self, batch, resp):
+        """Record a batch's response; only pairs that were asked for (not pruned or cached) are taken."""
+        origins, dests = batch
+        for i, row in zip(origins, resp.get("rows", [])):
+            for j, el in zip(dests, row.get("elements", [])):
+                if (i, j) not in self.pending:
+                    continue
+                walk = _parse_element(el)
+                self.rows[i][j] = walk
+                if walk is not None:
+                    tool_cache.cache.set("walk_pair", self._key(i, j), walk)
+
+
+# --- Weather (Open-Meteo) ---
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+DAILY_FIELDS = ("temperature_2m_max", "temperature_2m_min", "precipitation_probability_mean")
+MAX_FORECAST_DAYS = 16
+# Forecasts are shared per grid cell (degrees, ~11 km, about the resolution of
+# the global models behind Open-Meteo) and per model-update hour.
+WEATHER_GRID_DEG = 0.1
+# Coordinates per multi-location request (they all go in the query string).
+WEATHER_MAX_LOCATIONS = 50
+
+
+def _weather_cell(lat, lon):
+    return round(float(lat) / WEATHER_GRID_DEG), round(float(lon) / WEATHER_GRID_DEG)
+
+
+def _parse_weather(data):
+    daily = data["daily"]
+    return [{
+        "day": f"Day {i+1}",
+        "max_temp": high,
+        "min_temp": low,
+        "rain": round(rain) if rain is not None else None,
+    } for i, (high, low, rain) in enumerate(zip(*(daily[field] for field in DAILY_FIELDS)))]
+
+
+class _Forecasts:
+    """
+    Forecasts for a list of points: cells cached this hour (with a long
+    enough horizon) are answered at once, the rest are grouped into
+    multi-location requests for exactly `days` days.
+    """
+
+    def __init__(self, points, days):
+        self.days = max(1, min(int(days), MAX_FORECAST_DAYS))
+        self.hour = int(time.time() // 3600)
+        self.cells = [_weather_cell(*_coords(p)) for p in points]
+        self.found = {}
+        missing = []
+        for cell in dict.fromkeys(self.cells):
+            hit, forecast = tool_cache.cache.get(self._key(cell))
+            if hit and len(forecast) >= self.days:
+                self.found[cell] = forecast
+            else:
+                missing.append(cell)
+        telemetry.annotate(cache_hit=not missing)
+        self.batches = [missing[i:i + WEATHER_MAX_LOCATIONS] for i in range(0, len(missing), WEATHER_MAX_LOCATIONS)]
+
+    def _key(self, cell):
+        return "get_weather:" + json.dumps([cell[0], cell[1], self.hour])
+
+    def params(self, cells):
+        # Every point in a cell gets the forecast for the cell's centre.
+        return {
+            "latitude": ",".join(str(round(x * WEATHER_GRID_DEG, 4)) for x, _ in cells),
+            "longitude": ",".join(str(round(y * WEATHER_GRID_DEG, 4)) for _, y in cells),
+            "daily": ",".join(DAILY_FIELDS),
+            "forecast_days": self.days,
+            "timezone": "auto",
+        }
+
+    def add(self, cells, data):
+        # One location comes back as an object, several as a list in request order.
+        for cell, item in zip(cells, data if isinstance(data, list) else [data]):
+            forecast = _parse_weather(item)
+            self.found[cell] = forecast
+            tool_cache.cache.set("get_weather", self._key(cell), forecast)
+
+    def results(self):
+        return [self.found[cell][:self.days] for cell in self.cells]
+
+
+def _latlng_param(value):
+    if isinstance(value, dict):
+        return f"{value['lat']},{value['lng']}"
+    if isinstance(value, (list, tuple)):
+        return f"{value[0]},{value[1]}"
+    return value
+
+
+async def _maps_aget(path, params):
+    """Async Maps web-service call; mirrors googlemaps' status handling."""
+    data = await aget_json("maps", f"{MAPS_API}/{path}/json", dict(params, key=config.settings().gmaps_key))
+    status = data.get("status")
+    if status not in ("OK", "ZERO_RESULTS"):
+        from googlemaps.exceptions import ApiError
+        raise ApiError(status, data.get("error_message"))
+    return data
+
+
+# --- Paginated place search ---
+# Places serves up to 3 pages of 20 results. A next_page_token only becomes
+# valid a couple of seconds after it is issued; fetching it earlier fails
+# with INVALID_REQUEST.
+PLACES_PAGE_SIZE = 20
+PLACES_MAX_PAGES = 3
+PAGE_TOKEN_DELAY = 2.0      # seconds
+PAGE_TOKEN_RETRIES = 3
+
+
+class _PlacePages:
+    """Dedupe and store-keeping for one paginated search (shared by the sync and async generators)."""
+
+    def __init__(self, kind, lat, lng, radius):
+        self.kind, self.lat, self.lng, self.radius = kind, lat, lng, radius
+        self.seen = set()
+        self.pages = 0
+        self.area = None
+        self.token_issued = None
+
+    def page(self, resp):
+        """Parse a page: record it in the POI store, return its new places and the next token (or None)."""
+        results = resp.get("results", [])
+        self.pages += 1
+        token = resp.get("next_page_token")
+        token = token if token and self.pages < PLACES_MAX_PAGES else None
+        # Until the last page is in, the store only answers searches for as many places as were fetched.
+        if self.area is None:
+            self.area = poi_store.store.add_area(self.kind, self.lat, self.lng, self.radius, results,
+                                                 complete=token is None)
+        else:
+            poi_store.store.add_places(self.kind, results, area=self.area, complete=token is None)
+        fresh = []
+        for raw in results:
+            key = poi_store.place_key(raw)
+            if key not in self.seen:
+                self.seen.add(key)
+                fresh.append(_parse_place(raw))
+        self.token_issued = time.monotonic()
+        return fresh, token
+
+    def retry_later(self):
+        """The token was not active yet: try again after half the activation delay."""
+        self.token_issued = time.monotonic() - PAGE_TOKEN_DELAY / 2
+
+    def token_wait(self):
+        """Seconds until the last token is active; time the caller spent on the page already counts."""
+        return max(0.0, self.token_issued + PAGE_TOKEN_DELAY - time.monotonic())
+
+
+def _token_not_ready(e, attempt):
+    return getattr(e, "status", None) == "INVALID_REQUEST" and attempt < PAGE_TOKEN_RETRIES
+
+
+def iter_places(kind, lat, lng, radius=1500):
+    """
+    Places of `kind` (e.g. "lodging") near a point, yielded as each page
+    arrives. The next page is only requested once the caller consumes past
+    the current one, so taking the first few never pays for later pages.
+    Places repeated across pages are skipped.
+    """
+    from googlemaps.exceptions import ApiError
+
+    pages = _PlacePages(kind, lat, lng, radius)
+    fresh, token = pages.page(config.gmaps().places_nearby(location=(lat, lng), radius=radius, type=kind))
+    yield from fresh
+    while token:
+        for attempt in range(PAGE_TOKEN_RETRIES + 1):
+            time.sleep(pages.token_wait())
+            try:
+                resp = config.gmaps().places_nearby(page_token=token)
+                break
+            except ApiError as e:
+                if not _token_not_ready(e, attempt):
+                    raise
+                pages.retry_later()
+        fresh, token = pages.page(resp)
+        yield from fresh
+
+
+async def aiter_places(kind, lat, lng, radius=1500):
+    """Async iter_places; waiting for a page token only suspends this task."""
+    from googlemaps.exceptions import ApiError
+
+    pages = _PlacePages(kind, lat, lng, radius)
+    fresh, token = pages.page(await _maps_aget("place/nearbysearch", {
+        "location": f"{lat},{lng}", "radius": radius, "type": kind,
+    }))
+    for place in fresh:
+        yield place
+    while token:
+        for attempt in range(PAGE_TOKEN_RETRIES + 1):
+            await asyncio.sleep(pages.token_wait())
+            try:
+                resp = await _maps_aget("place/nearbysearch", {"pagetoken": token})
+                break
+            except ApiError as e:
+                if not _token_not_ready(e, attempt):
+                    raise
+                pages.retry_later()
+        fresh, token = pages.page(resp)
+        for place in fresh:
+            yield place
+
+
+def _rating(place):
+    return place["rating"] if isinstance(place["rating"], (int, float)) else 0
+
+
+def best_rated(places, limit):
+    """The `limit` best rated of `places`; every page of a search is consumed to rank across them."""
+    return heapq.nlargest(limit, places, key=_rating)
+
+
+def _search(kind, lat, lng, radius, limit):
+    places = _local_places(kind, lat, lng, radius, limit)
+    if places is not None:
+        return places
+    return list(itertools.islice(iter_places(kind, lat, lng, radius), limit))
+
+
+async def _search_async(kind, lat, lng, radius, limit):
+    places = _local_places(kind, lat, lng, radius, limit)
+    if places is not None:
+        return places
+    places = []
+    pages = aiter_places(kind, lat, lng, radius)
+    try:
+        async for place in pages:
+            places.append(place)
+            if len(places) >= limit:
+                break
+    finally:
+        await pages.aclose()
+    return places
+
+
+# --- Core Tools ---
+# Results are cached per tool TTL (see tool_cache.TOOL_TTLS); every call is
+# traced (see telemetry.traced). Place searches over areas already fetched
+# are answered from the POI store (see poi_store.py).
+@traced("geocode_place")
+@cached("geocode_place")
+def geocode_place(place):
+    """Geocode a place name into latitude & longitude."""
+    return _parse_location(config.gmaps().geocode(place))
+
+
+@traced("search_hotels")
+@cached("search_hotels")
+def search_hotels(lat, lng, radius=1500, limit=5):
+    """Search nearby hotels given coordinates (more than one page when `limit` > 20)."""
+    return _search("lodging", lat, lng, radius, limit)
+
+
+@traced("search_attractions")
+@cached("search_attractions")
+def search_attractions(lat, lng, radius=2000, limit=5):
+    """Search nearby tourist attractions given coordinates (more than one page when `limit` > 20)."""
+    return _search("tourist_attraction", lat, lng, radius, limit)
+
+
+@traced("get_walk_info")
+def get_walk_info(origin, dest):
+    """Get walking distance and duration between two places."""
+    return _parse_walk(config.gmaps().directions(origin, dest, mode="walking"))
+
+
+@traced("get_walk_matrix")
+def get_walk_matrix(origins, dests, max_straight_m=MAX_WALK_STRAIGHT_M):
+    """
+    Walking distance and duration for every origin x destination (place dicts
+    or (lat, lng) pairs): rows[i][j] is like get_walk_info plus meters/seconds,
+    or None for pairs more than `max_straight_m` apart or without a route.
+    """
+    matrix = _WalkMatrix(origins, dests, max_straight_m)
+    for batch in matrix.batches:
+        o, d = matrix.request(batch)
+        matrix.add(batch, config.gmaps().distance_matrix(o, d, mode="walking"))
+    return matrix.rows
+
+
+def _fetch_weather(points, days):
+    forecasts = _Forecasts(points, days)
+    for cells in forecasts.batches:
+        forecasts.add(cells, get_json("open-meteo", FORECAST_URL, forecasts.params(cells)))
+    return forecasts.results()
+
+
+@traced("get_weather")
 def get_weather(lat, lon, days=5):
     """Fetch daily weather forecast for given coordinates."""
-    url = (
-        f"https://api.open-meteo.com/v1/forecast?"
-        f"latitude={lat}&longitude={lon}&daily=temperature_2m_max,"
-        f"temperature_2m_min,precipitation_probability_mean,weathercode&timezone=auto"
-    )
-    resp = requests.get(url)
-    data = resp.json()
-
-    weather = []
-    for i in range(min(days, len(data["daily"]["temperature_2m_max"]))):
-        weather.append({
-            "day": f"Day {i+1}",
-            "max_temp": data["daily"]["temperature_2m_max"][i],
-            "min_temp": data["daily"]["temperature_2m_min"][i],
-            "rain": f"{data['daily']['precipitation_probability_mean'][i]}%"
+    return _fetch_weather([(lat, lon)], days)[0]
+
+
+@traced("get_weather_many")
+def get_weather_many(points, days=5):
+    """
+    get_weather for several points (dicts with lat/lng or (lat, lon) pairs),
+    in one list per point; points are fetched together, one request per
+    WEATHER_MAX_LOCATIONS uncached grid cells.
+    """
+    return _fetch_weather(points, days)
+
+
+# --- Async Tools ---
+# Same results (and cache entries) as the sync tools, over the async HTTP client.
+@traced("geocode_place")
+@cached("geocode_place")
+async def geocode_place_async(place):
+    """Async geocode_place."""
+    data = await _maps_aget("geocode", {"address": place})
+    return _parse_location(data.get("results", []))
+
+
+@traced("search_hotels")
+@cached("search_hotels")
+async def search_hotels_async(lat, lng, radius=1500, limit=5):
+    """Async search_hotels."""
+    return await _search_async("lodging", lat, lng, radius, limit)
+
+
+@traced("search_attractions")
+@cached("search_attractions")
+async def search_attractions_async(lat, lng, radius=2000, limit=5):
+    """Async search_attractions."""
+    return await _search_async("tourist_attraction", lat, lng, radius, limit)
+
+
+@traced("get_walk_info")
+async def get_walk_info_async(origin, dest):
+    """Async get_walk_info."""
+    data = await _maps_aget("directions", {
+        "origin": _latlng_param(origin), "destination": _latlng_param(dest), "mode": "walking",
+    })
+    return _parse_walk(data.get("routes", []))
+
+
+@traced("get_walk_matrix")
+async def get_walk_matrix_async(origins, dests, max_straight_m=MAX_WALK_STRAIGHT_M):
+    """Async get_walk_matrix; the batches are fetched concurrently."""
+    matrix = _WalkMatrix(origins, dests, max_straight_m)
+
+    async def fetch(batch):
+        o, d = matrix.request(batch)
+        return await _maps_aget("distancematrix", {
+            "origins": "|".join(map(_latlng_param, o)),
+            "destinations": "|".join(map(_latlng_param, d)),
+            "mode": "walking",
         })
-    return weather
+
+    for batch, resp in zip(matrix.batches, await asyncio.gather(*(fetch(b) for b in matrix.batches))):
+        matrix.add(batch, resp)
+    return matrix.rows
 
 
-def show_route_map(origin_lat, origin_lng, dest_lat, dest_lng):
-    """Return an iframe embed code for walking directions between two points."""
+async def _fetch_weather_async(points, days):
+    forecasts = _Forecasts(points, days)
+    responses = await asyncio.gather(*(
+        aget_json("open-meteo", FORECAST_URL, forecasts.params(cells)) for cells in forecasts.batches
+    ))
+    for cells, data in zip(forecasts.batches, responses):
+        forecasts.add(cells, data)
+    return forecasts.results()
+
+
+@traced("get_weather")
+async def get_weather_async(lat, lon, days=5):
+    """Async get_weather."""
+    return (await _fetch_weather_async([(lat, lon)], days))[0]
+
+
+@traced("get_weather_many")
+async def get_weather_many_async(points, days=5):
+    """Async get_weather_many; the requests are sent concurrently."""
+    return await _fetch_weather_async(points, days)
+
+
+def show_route_map(origin_lat, origin_lng, dest_lat, dest_lng, height=250):
+    """
+    Return an iframe embed code for walking directions between two points.
+    The iframe loads lazily, i.e. only once it is actually visible.
+    """
+    src = "https://www.google.com/maps/embed/v1/directions?" + urlencode({
+        "key": config.settings().gmaps_key,
+        "origin": f"{origin_lat},{origin_lng}",
+        "destination": f"{dest_lat},{dest_lng}",
+        "mode": "walking",
+    })
     iframe = f"""
     <iframe
-      width="100%" height="250"
-      frameborder="0" style="border:0"
-      src="https://www.google.com/maps/embed/v1/directions?key={GMAPS_KEY}
-        &origin={origin_lat},{origin_lng}
-        &destination={dest_lat},{dest_lng}
-        &mode=walking" allowfullscreen>
+      width="100%" height="{height}"
+      frameborder="0" style="border:0" loading="lazy"
+      src="{src}" allowfullscreen>
     </iframe>
     """
     return iframe
@@ -0,0 +1,180 @@
+# trip_planner.py
+import queue
+
+import gazetteer
+import resilience
+import telemetry
+
+# Import shared tools + dispatchers
+from multiagent_dispatcher import run_multiagent_dispatcher
+from function_dispatcher import run_gemini_dispatcher
+from singleshot_dispatcher import run_singleshot_dispatcher
+from pipeline import (
+    SharedToolResults,
+    StageTimer,
+    cached_plan,
+    plan_events,
+    plan_key,
+    plan_mode,
+    store_plan,
+    submit_dispatch,
+)
+from template_plan import template_itinerary
+
+# Seconds the fallback itinerary waits for fetches still in flight (within the deadline).
+FALLBACK_DATA_WAIT = 1.0
+
+
+# --- Agent Logic ---
+def _dispatch(query, lat, lng, days, use_multiagent, toolset, on_token=None, single_shot=False):
+    prompt = f"Plan a {days}-day trip to {query} with hotels, attractions, and weather."
+    with telemetry.span("dispatch", single_shot=single_shot, multiagent=use_multiagent) as span:
+        try:
+            if single_shot:
+                return run_singleshot_dispatcher(
+                    prompt, lat=lat, lng=lng, days=days, toolset=toolset, on_token=on_token
+                )
+            if use_multiagent:
+                return run_multiagent_dispatcher(
+                    prompt, lat=lat, lng=lng, days=days, toolset=toolset, on_token=on_token
+                )
+            return run_gemini_dispatcher(
+                prompt, lat=lat, lng=lng, days=days, toolset=toolset, on_token=on_token
+            )
+        except Exception as e:
+            span.fail(e)
+            reason = "out of time" if isinstance(e, resilience.DeadlineExceeded) else "the AI planner failed"
+            return fallback_itinerary(query, days, toolset, reason)
+
+
+def fallback_itinerary(query, days, shared, reason):
+    """The template itinerary from whatever hotels / attractions / weather `shared` has fetched."""
+    wait = min(FALLBACK_DATA_WAIT, resilience.remaining() or 0)
+    data = shared.available(wait)
+    telemetry.annotate(fallback=reason, **{f"fallback.{k}": len(v) for k, v in data.items()})
+    return template_itinerary(query, days, data["hotels"], data["attractions"], data["weather"], reason)
+
+
+def travel_agent_events(query, days=3, use_multiagent=False, stream=False, timings=None, single_shot=False,
+                        budget=None):
+    """
+    Yield (kind, payload) as each part of the plan becomes available:
+    "location", then "hotels" / "attractions" / "weather" in completion order,
+    "token" chunks of the itinerary when `stream` is set, and finally
+    "itinerary". An unknown destination yields a single "error".
+
+    Place lists are full pages and the forecast covers the whole horizon;
+    callers slice them to the limits they display. Completed plans are
+    memoized per (destination, days, mode) and replayed without any network.
+
+    Hotels/attractions/weather are fetched concurrently once geocoding is done;
+    dispatcher tool calls for the destination are served from those same
+    in-flight results, so nothing is fetched twice. Pass a dict as `timings`
+    to receive per-stage wall-clock seconds. `single_shot` skips the tool-calling
+    loop and writes the plan from the prefetched data in one Gemini call.
+
+    Every tool and LLM step runs under one deadline of `budget` seconds
+    (PLAN_BUDGET by default). When it passes, or the dispatcher fails, the
+    itinerary is a template built locally from the data already fetched.
+    """
+    deadline = resilience.Deadline(budget or resilience.PLAN_BUDGET)
+    timer = StageTimer()
+    mode = plan_mode(use_multiagent, single_shot)
+    key = plan_key(query, days, mode)
+    outcome = "error"
+    with telemetry.span("plan", destination=query, days=days, mode=mode) as span:
+        try:
+            plan = cached_plan(key)
+            if plan is not None:
+                timer.mark("plan_cache_hit")
+                outcome = "cache_hit"
+                yield from plan_events(plan)
+                return
+
+            with timer.stage("geocode"), resilience.deadline(deadline):
+                loc = gazetteer.locate(query)
+            if not loc:
+                outcome = "not_found"
+                yield "error", "❌ Could not find destination."
+                return
+            yield "location", loc
+
+            lat, lng = loc['lat'], loc['lng']
+            # Tokens, finished fetches and the finished writer all land on one
+            # queue, so each is yielded the moment it happens.
+            events = queue.Queue()
+            on_token = (lambda token: events.put(("token", token))) if stream else None
+            # Submitted work copies the context, so fetches and dispatch share the deadline.
+            with resilience.deadline(deadline):
+                shared = SharedToolResults(lat, lng, days, timer=timer)
+                writer = submit_dispatch(
+                    timer.timed, "dispatcher", _dispatch,
+                    query, lat, lng, days, use_multiagent, shared, on_token, single_shot,
+                )
+
+            plan = {"location": loc}
+            pending = shared.futures()
+            for name, fut in pending.items():
+                fut.add_done_callback(lambda f, name=name: events.put((name, f)))
+            # The writer emits all its tokens before it returns, so this comes after the last one.
+            writer.add_done_callback(lambda f: events.put(("written", f)))
+            written, failed = False, []
+            while (pending or not written) and not deadline.expired():
+                try:
+                    kind, payload = events.get(timeout=deadline.remaining())
+                except queue.Empty:
+                    break
+                if kind == "token":
+                    timer.mark("first_token")
+                    yield "token", payload
+                elif kind == "written":
+                    written = True
+                else:
+                    # A failed fetch leaves its section empty; the dispatcher falls back without it.
+                    del pending[kind]
+                    timer.mark("first_content")
+                    error = payload.exception()
+                    if error is not None:
+                        failed.append(kind)
+                        span.set(**{f"failed.{kind}": type(error).__name__})
+                    plan[kind] = [] if error else payload.result()
+                    yield kind, plan[kind]
+
+            if writer.done():
+                plan["itinerary"] = writer.result()
+            else:
+                # Out of time: the dispatcher's remaining calls fail fast on the same deadline.
+                with resilience.deadline(deadline):
+                    plan["itinerary"] = fallback_itinerary(query, days, shared, "out of time")
+            for name, fut in pending.items():
+                plan[name] = fut.result() if fut.done() and fut.exception() is None else []
+                yield name, plan[name]
+            outcome = "fallback" if plan["itinerary"].startswith("⚠️") else "ok"
+            if outcome == "ok" and not pending and not failed:
+                store_plan(key, plan)
+            yield "itinerary", plan["itinerary"]
+        except GeneratorExit:
+            outcome = "abandoned"   # the caller stopped reading (e.g. a Streamlit rerun)
+            raise
+        finally:
+            stages = timer.as_dict()
+            span.set(outcome=outcome, **{f"stage.{k}": v for k, v in stages.items()})
+            telemetry.PLANS.inc(mode=mode, outcome=outcome)
+            telemetry.PLAN_SECONDS.observe(stages["total"], mode=mode)
+            if timings is not None:
+                timings.update(stages)
+
+
+def travel_agent(query, days=3, hotel_limit=5, attraction_limit=5, use_multiagent=False, timings=None,
+                 single_shot=False, budget=None):
+    """Blocking travel_agent_events: returns (plan, hotels, attractions, weather, location)."""
+    out = {"hotels": [], "attractions": [], "weather": [], "location": None}
+    for kind, payload in travel_agent_events(
+        query, days, use_multiagent, timings=timings, single_shot=single_shot, budget=budget
+    ):
+        out[kind] = payload
+    reply = out.get("itinerary", out.get("error"))
+    return (
+        reply, out["hotels"][:hotel_limit], out["attractions"][:attraction_limit],
+        out["weather"][:days], out["location"],
+    )